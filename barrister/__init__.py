@@ -14,8 +14,15 @@
 __version__ = '0.1.7'
 
 from barrister.runtime import contract_from_file, idgen_uuid, idgen_seq
-from barrister.runtime import RpcException, Server, Filter, HttpTransport, InProcTransport
+from barrister.runtime import current_context, deadline_after
+from barrister.runtime import JsonCodec, OrjsonCodec, fastest_codec
+from barrister.runtime import RpcException, ValidationError, Server, Filter, HttpTransport, InProcTransport
+from barrister.runtime import ValidationPolicy, ValidationStats, StructObject, ResponseCache, Singleflight
+from barrister.runtime import Metrics, Bulkheads
 from barrister.runtime import Client, Batch
 from barrister.runtime import Contract, Interface, Enum, Struct, Function
 from barrister.docco import docco_html
 from barrister.graphviz import to_dotfile
+from barrister.codegen import to_python
+from barrister.aio import AsyncServer, make_asgi_app
+from barrister.httpd import serve
@@ -0,0 +1,385 @@
+"""
+    Barrister server for asyncio.  Handlers may define their functions with
+    `async def`, and requests can be served by any ASGI server using make_asgi_app().
+
+    :copyright: 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from barrister.runtime import Server, ProcessCall, RpcException, ERR_INVALID_REQ
+from barrister.runtime import ERR_DEADLINE_EXCEEDED, TIMEOUT_HEADER, STREAM_CONTENT_TYPE
+from barrister.runtime import deadline_after, err_response
+from barrister.runtime import _current_context, _without_notifications
+
+async def _resolve(val):
+    """
+    Awaits val if it is awaitable, otherwise returns it unchanged.  Allows handlers,
+    pre hooks and filters to be either regular or async functions.
+    """
+    if inspect.isawaitable(val):
+        return await val
+    return val
+
+class AsyncServer(Server):
+    """
+    Server whose call() and call_json() methods are coroutines.  Uses the same Contract,
+    dispatch table, ValidationPolicy and filters as Server, and accepts the same
+    constructor arguments apart from batch_executor.
+
+    Handler functions, `barrister_pre` hooks and Filter pre/post methods may be regular
+    functions or coroutine functions.  Regular functions run on the event loop, so
+    handlers that block should be async or hand their work off to an executor.
+
+    The requests in a batch are run concurrently on the event loop, at most
+    batch_concurrency at a time if it is set, and the responses are returned in
+    request order.
+
+    If a request has a deadline (see Server.call) the call is cancelled when it passes,
+    and the request fails with ERR_DEADLINE_EXCEEDED.
+    """
+
+    def __init__(self, contract, **kwargs):
+        """
+        Creates a new AsyncServer.  See Server for the arguments.  Raises ValueError if
+        batch_executor is given, as batches run on the event loop.
+        """
+        if kwargs.get("batch_executor") is not None:
+            raise ValueError("AsyncServer runs batches on the event loop and does not "
+                             "support batch_executor")
+        Server.__init__(self, contract, **kwargs)
+
+    async def call_json(self, req_json, props=None):
+        """
+        Deserializes req_json as JSON, awaits self.call(), and serializes result to JSON.
+        Returns JSON encoded string.
+
+        :Parameters:
+          req_json
+            JSON-RPC request serialized as JSON string or bytes
+          props
+            Application defined properties to set on RequestContext for use with filters.
+            For example: authentication headers.  Must be a dict.
+        """
+        return (await self.call_bytes(req_json, props)).decode("utf-8")
+
+    async def call_bytes(self, req_bytes, props=None):
+        """
+        Decodes req_bytes with the server's codec, awaits self.call(), and returns the
+        response encoded with the codec as bytes.
+
+        :Parameters:
+          req_bytes
+            JSON-RPC request serialized as JSON bytes, bytearray or string
+          props
+            Application defined properties to set on RequestContext for use with filters.
+            For example: authentication headers.  Must be a dict.
+        """
+        try:
+            req = self._loads(req_bytes)
+        except:
+            return self._parse_error(req_bytes)
+        if self._is_idl_request(req):
+            resp = self._idl_response(req)
+        else:
+            resp = self._dumps(await self.call(req, props))
+        if self.metrics is not None:
+            self._record_bytes(req, len(req_bytes), len(resp))
+        return resp
+
+    async def call_stream(self, req, props=None):
+        """
+        Async generator version of call().  Yields the response to each request in a batch
+        as soon as it completes, in completion order.  See Server.call_stream()
+
+        :Parameters:
+          req
+            The request. Either a list of dicts, or a single dict.
+          props
+            Application defined properties to set on RequestContext for use with filters.
+            Must be a dict.
+        """
+        if isinstance(req, list):
+            if len(req) < 1:
+                yield err_response(None, ERR_INVALID_REQ, "Invalid Request. Empty batch.")
+                return
+            tasks = [ asyncio.ensure_future(c) for c in self._batch_calls(req, props) ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    resp = await task
+                    if resp is not None:
+                        yield resp
+            finally:
+                for task in tasks:
+                    task.cancel()
+        else:
+            resp = await self._call_and_record(req, props)
+            if resp is not None:
+                yield resp
+
+    async def call_stream_bytes(self, req_bytes, props=None):
+        """
+        Async generator version of Server.call_stream_bytes()
+        """
+        try:
+            req = self._loads(req_bytes)
+        except:
+            yield self._parse_error(req_bytes) + b"\n"
+            return
+        size = 0
+        async for resp in self.call_stream(req, props):
+            line = self.codec.dumps(resp) + b"\n"
+            size += len(line)
+            yield line
+        if self.metrics is not None:
+            self._record_bytes(req, len(req_bytes), size)
+
+    async def call(self, req, props=None):
+        """
+        Executes a Barrister request and returns a response.  If the request is a list, then the
+        response will also be a list.
+
+        :Parameters:
+          req
+            The request. Either a list of dicts, or a single dict.
+          props
+            Application defined properties to set on RequestContext for use with filters.
+            For example: authentication headers.  Must be a dict.
+        """
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Request: %s" % str(req))
+
+        if isinstance(req, list):
+            if len(req) < 1:
+                resp = err_response(None, ERR_INVALID_REQ, "Invalid Request. Empty batch.")
+            else:
+                resp = _without_notifications(await asyncio.gather(
+                    *self._batch_calls(req, props)))
+        else:
+            resp = await self._call_and_record(req, props)
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Response: %s" % str(resp))
+        return resp
+
+    def _batch_calls(self, req, props):
+        """
+        Returns a coroutine for each request in the batch.  If batch_concurrency is set,
+        at most that many of them run their request at once.
+        """
+        if not self.batch_concurrency:
+            return [ self._call_and_record(r, props) for r in req ]
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        async def call(r):
+            async with semaphore:
+                return await self._call_and_record(r, props)
+        return [ call(r) for r in req ]
+
+    async def _call_and_record(self, req, props=None):
+        if self.metrics is None:
+            return await self._call_and_format(req, props)
+        start = time.perf_counter()
+        resp = await self._call_and_format(req, props)
+        self.metrics.record(self._metric_name(req), resp, time.perf_counter() - start)
+        return resp
+
+    async def _call_and_format(self, req, props=None):
+        context, resp = self._new_context(req, props)
+        if context is None:
+            return resp
+
+        if self.filters:
+            for f in self.filters:
+                await _resolve(f.pre(context))
+
+        if context.error:
+            return None if context.notification else context.error
+
+        token = _current_context.set(context)
+        try:
+            if context.deadline is None:
+                result = await self._call(context)
+            else:
+                result = await self._call_with_deadline(context)
+            if not context.notification:
+                resp = { "jsonrpc": "2.0", "id": req.get("id"), "result": result }
+        except asyncio.CancelledError:
+            raise
+        except:
+            resp = self._exc_response(req)
+            if context.notification:
+                resp = None
+        finally:
+            _current_context.reset(token)
+
+        if self.filters:
+            context.response = resp
+            for f in self.filters:
+                await _resolve(f.post(context))
+
+        return resp
+
+    async def _call_with_deadline(self, context):
+        """
+        Awaits _call(context), cancelling it if the request's deadline passes first
+        """
+        context.check_deadline()
+        try:
+            return await asyncio.wait_for(self._call(context), context.remaining())
+        except asyncio.TimeoutError:
+            raise RpcException(ERR_DEADLINE_EXCEEDED, "Deadline exceeded")
+
+    async def _call(self, context):
+        req = context.request
+        context.check_deadline()
+        method = self._method(req)
+        if method == "barrister-idl":
+            return self._idl_result(req)
+        elif method == "barrister-metrics" and self.metrics is not None and self.metrics.expose:
+            return self.metrics_snapshot()
+
+        func, function, pre_hook, params = self._prepare(method, req)
+
+        if pre_hook:
+            await _resolve(pre_hook(context, params))
+
+        notification = context.notification
+        cache = None if notification else self.response_cache
+        cache_key = cache and cache.key(function, params)
+        if cache_key is not None:
+            hit, result = cache.get(cache_key)
+            if hit:
+                return result
+
+        flight = None if notification else self.singleflight
+        flight_key = flight and flight.key(function, params)
+        if flight_key is not None:
+            result = await flight.do_async(flight_key, self._invoke, context, func, function, 
+                                           params)
+        else:
+            result = await self._invoke(context, func, function, params, not notification)
+
+        if cache_key is not None:
+            cache.put(cache_key, result)
+        return result
+
+    async def _invoke(self, context, func, function, params, validate=True):
+        bulkheads = self.bulkheads
+        chain = bulkheads and await bulkheads.enter_async(function, context.deadline)
+        try:
+            if chain:
+                context.check_deadline()
+            if isinstance(func, ProcessCall):
+                result = await asyncio.wrap_future(func.submit(*params))
+            else:
+                result = await _resolve(func(*params))
+        finally:
+            if chain:
+                bulkheads.exit(chain)
+        if validate:
+            self.validation.validate_response(function, result)
+        return result
+
+def make_asgi_app(server, max_body_size=None):
+    """
+    Returns an ASGI application that serves JSON-RPC requests POSTed to any path
+    using the given AsyncServer.  The ASGI scope is passed to filters as the
+    `scope` property on the RequestContext.
+
+    The X-Barrister-Timeout request header sets the deadline of the request.  If the
+    client disconnects before the response is ready, the call is cancelled.
+
+    If the Accept header contains application/x-ndjson, the responses to a batch are
+    streamed as newline delimited JSON in the order they complete.  See
+    AsyncServer.call_stream()
+
+    :Parameters:
+      server
+        AsyncServer to dispatch requests to
+      max_body_size
+        Optional maximum request body size in bytes.  Larger requests are rejected
+        with a 413 response.
+    """
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({ "type" : "lifespan.startup.complete" })
+                elif message["type"] == "lifespan.shutdown":
+                    await send({ "type" : "lifespan.shutdown.complete" })
+                    return
+
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] != "POST":
+            await _send_response(send, 405, b"Method not allowed", "text/plain")
+            return
+
+        chunks = [ ]
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if max_body_size is not None and size > max_body_size:
+                await _send_response(send, 413, b"Request body too large", "text/plain")
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+
+        props = { "scope" : scope }
+        stream = False
+        timeout_header = TIMEOUT_HEADER.lower().encode("ascii")
+        for name, value in scope.get("headers", [ ]):
+            if name == timeout_header:
+                props["deadline"] = deadline_after(value.decode("latin-1"))
+            elif name == b"accept" and STREAM_CONTENT_TYPE.encode("ascii") in value:
+                stream = True
+
+        if stream:
+            await send({ "type" : "http.response.start", "status" : 200,
+                         "headers" : [ (b"content-type", STREAM_CONTENT_TYPE.encode("ascii")) ] })
+            async for line in server.call_stream_bytes(b"".join(chunks), props):
+                await send({ "type" : "http.response.body", "body" : line, "more_body" : True })
+            await send({ "type" : "http.response.body", "body" : b"" })
+            return
+
+        call = asyncio.ensure_future(server.call_bytes(b"".join(chunks), props))
+        disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            await asyncio.wait([ call, disconnect ], return_when=asyncio.FIRST_COMPLETED)
+            disconnected = disconnect.done() and disconnect.exception() is None
+            if disconnected and not call.done():
+                return
+            resp = await call
+        finally:
+            call.cancel()
+            disconnect.cancel()
+        if not resp:
+            await _send_response(send, 204, b"", None)
+        else:
+            await _send_response(send, 200, resp, "application/json")
+    return app
+
+async def _wait_disconnect(receive):
+    """
+    Returns when the client disconnects
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def _send_response(send, status, body, content_type):
+    headers = [ (b"content-length", str(len(body)).encode("ascii")) ]
+    if content_type:
+        headers.append((b"content-type", content_type.encode("ascii")))
+    await send({ "type" : "http.response.start", "status" : status, "headers" : headers })
+    await send({ "type" : "http.response.body", "body" : body })
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+"""
+    Module for generating an importable Python module from Barrister IDL JSON.
+
+    The generated module contains the IDL, straight-line validator functions for
+    every type used in the IDL, and client stub classes for each interface.
+    Loading a Contract from the generated module skips compiling validators at
+    runtime.
+
+    :copyright: 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+
+import keyword
+import pprint
+
+primitive_types = {
+    "int"    : ("(int,)", "frozenset([int, bool])", "int"),
+    "float"  : ("(float, int)", "frozenset([float, int, bool])", "float"),
+    "bool"   : ("(bool,)", "frozenset([bool])", "bool"),
+    "string" : ("(str,)", "frozenset([str])", "str")
+}
+
+HEADER = '''# -*- coding: utf-8 -*-
+"""
+    Generated by barrister %(version)s from IDL with checksum %(checksum)s
+    Do not edit.  Regenerate with: barrister --python
+"""
+from typing import Any, Dict, List, Optional
+from barrister.runtime import Contract, Client, Server, StructObject, ValidationError, preview
+
+GENERATOR_VERSION = %(version)r
+CHECKSUM = %(checksum)r
+
+class _Preview(object):
+    """
+    Wraps a value so that it is formatted with preview() when its message is built
+    """
+
+    def __init__(self, val):
+        self.val = val
+
+    def __str__(self):
+        return preview(self.val)
+
+def _null_err():
+    return False, ValidationError("Value cannot be null")
+
+def _type_err(val, expected):
+    return False, ValidationError("%%s is of type %%s, expected %%s", _Preview(val), type(val), expected)
+
+'''
+
+FOOTER = '''
+_contract = None
+
+def contract():
+    """
+    Returns the Contract for this IDL, using the precompiled validators in VALIDATORS.
+    The Contract is created on the first call and shared by later calls.
+    """
+    global _contract
+    if _contract is None:
+        _contract = Contract(IDL, validators=VALIDATORS)
+    return _contract
+
+def new_server(handlers=None, **kwargs):
+    """
+    Returns a barrister.Server for this IDL.
+
+    :Parameters:
+      handlers
+        Optional dict of interface name to handler instance
+      kwargs
+        Passed to the Server constructor
+    """
+    server = Server(contract(), **kwargs)
+    if handlers:
+        for iface_name, handler in handlers.items():
+            server.add_handler(iface_name, handler)
+    return server
+
+def new_client(transport, **kwargs):
+    """
+    Returns a barrister.Client for this IDL that does not load the IDL from the server.
+
+    :Parameters:
+      transport
+        Transport object to use to make requests
+      kwargs
+        Passed to the Client constructor
+    """
+    return Client(transport, contract=contract(), **kwargs)
+'''
+
+def ident(name):
+    """
+    Returns name converted to a valid Python identifier
+    """
+    name = name.replace(".", "_")
+    if keyword.iskeyword(name):
+        name += "_"
+    return name
+
+def validator_name(key):
+    type_name, optional, is_array = key
+    s = "_v_" + ident(type_name)
+    if optional:
+        s += "_opt"
+    if is_array:
+        s += "_arr"
+    return s
+
+def type_key(t):
+    return (t["type"], t.get("optional", False), t["is_array"])
+
+def flatten_fields(structs, s):
+    """
+    Returns the fields of struct s followed by the fields of its ancestors
+    """
+    fields = list(s["fields"])
+    if s["extends"]:
+        fields.extend(flatten_fields(structs, structs[s["extends"]]))
+    return fields
+
+def collect_keys(idl_parsed):
+    """
+    Returns a sorted list of every (type, optional, is_array) combination used
+    by struct fields, function params and return types, plus the element type of
+    each array and the non-optional form of each struct.
+    """
+    keys = set()
+    for e in idl_parsed:
+        types = [ ]
+        if e["type"] == "struct":
+            types = e["fields"]
+        elif e["type"] == "interface":
+            for f in e["functions"]:
+                types.extend(f["params"])
+                if f.get("returns"):
+                    types.append(f["returns"])
+        for t in types:
+            keys.add(type_key(t))
+
+    for type_name, optional, is_array in list(keys):
+        keys.add((type_name, optional, False))
+        keys.add((type_name, False, False))
+    return sorted(keys)
+
+def gen_primitive(key):
+    type_name, optional, is_array = key
+    py_types = primitive_types[type_name][0]
+    if optional:
+        null_ret = "True, None"
+    else:
+        null_ret = "_null_err()"
+    lines = [ "def %s(val):" % validator_name(key),
+              "    if isinstance(val, %s):" % py_types,
+              "        return True, None",
+              "    elif val is None:",
+              "        return %s" % null_ret,
+              "    return _type_err(val, %r)" % type_name ]
+    return lines
+
+def gen_enum(key, enum):
+    type_name, optional, is_array = key
+    values = [ v["value"] for v in enum["values"] ]
+    if optional:
+        null_ret = "True, None"
+    else:
+        null_ret = "_null_err()"
+    lines = [ "def %s(val):" % validator_name(key),
+              "    try:",
+              "        if val in _enum_%s:" % ident(type_name),
+              "            return True, None",
+              "    except TypeError:",
+              "        pass",
+              "    if val is None:",
+              "        return %s" % null_ret,
+              "    return False, ValidationError(\"%%s is not in enum: %%s\", _Preview(val), %r)" % values ]
+    return lines
+
+def gen_struct(key, struct):
+    type_name, optional, is_array = key
+    name = validator_name(key)
+    if optional:
+        return [ "def %s(val):" % name,
+                 "    if val is None:",
+                 "        return True, None",
+                 "    return %s(val)" % validator_name((type_name, False, False)) ]
+
+    tid = ident(type_name)
+    return [ "def %s(val):" % name,
+             "    if type(val) is not dict:",
+             "        if val is None:",
+             "            return _null_err()",
+             "        if isinstance(val, StructObject) and val._struct_name == %r:" % type_name,
+             "            return contract().struct(%r)._validate_object(val)" % type_name,
+             "        return False, ValidationError(\"%s is not a dict\", _Preview(val))",
+             "    fields = _fields_%s" % tid,
+             "    for k, v in val.items():",
+             "        check = fields.get(k)",
+             "        if check is None:",
+             "            return False, ValidationError(\"field %%s not found in struct %%s\", _Preview(k), %r)" % type_name,
+             "        ok, err = check(v)",
+             "        if not ok:",
+             "            return False, err.at(k)",
+             "    if not val.keys() >= _required_%s:" % tid,
+             "        for name in _required_list_%s:" % tid,
+             "            if name not in val:",
+             "                return False, ValidationError(\"field '%s' missing from: %s\", name, _Preview(val))",
+             "    return True, None" ]
+
+def gen_array(key, bulk, catch_type_error=False):
+    type_name, optional, is_array = key
+    elem = validator_name((type_name, optional, False))
+    lines = [ "def %s(val):" % validator_name(key) ]
+    if bulk and catch_type_error:
+        # unhashable elements raise TypeError in issuperset
+        lines += [ "    try:",
+                   "        if type(val) is list and %s:" % bulk,
+                   "            return True, None",
+                   "    except TypeError:",
+                   "        pass" ]
+    elif bulk:
+        lines += [ "    if type(val) is list and %s:" % bulk,
+                   "        return True, None" ]
+    lines += [ "    if val is None:",
+               "        return %s" % ("True, None" if optional else "_null_err()"),
+               "    if not isinstance(val, list):",
+               "        return _type_err(val, \"list\")",
+               "    i = 0",
+               "    for v in val:",
+               "        ok, err = %s(v)" % elem,
+               "        if not ok:",
+               "            return ok, err.at(i)",
+               "        i += 1",
+               "    return True, None" ]
+    return lines
+
+def py_type(t, enums):
+    """
+    Returns the Python type annotation for the given IDL type dict
+    """
+    type_name = t["type"]
+    if type_name in primitive_types:
+        s = primitive_types[type_name][2]
+    elif type_name in enums:
+        s = "str"
+    else:
+        s = "Dict[str, Any]"
+    if t["is_array"]:
+        s = "List[%s]" % s
+    if t.get("optional"):
+        s = "Optional[%s]" % s
+    return s
+
+def type_str(t):
+    s = t["type"]
+    if t["is_array"]:
+        s = "[]" + s
+    if t.get("optional"):
+        s += " [optional]"
+    return s
+
+def gen_stub(iface, enums):
+    cls = "%sClient" % ident(iface["name"])
+    lines = [ "class %s(object):" % cls,
+              "    \"\"\"",
+              "    Client stub for interface %s" % iface["name"] ]
+    if iface.get("comment"):
+        lines.append("")
+        lines.extend([ ("    " + l).rstrip() for l in iface["comment"].split("\n") ])
+    lines += [ "    \"\"\"",
+               "",
+               "    def __init__(self, client):",
+               "        \"\"\"",
+               "        :Parameters:",
+               "          client",
+               "            barrister.Client to make requests with. Usually created by new_client()",
+               "        \"\"\"",
+               "        self._client = client",
+               "        iface = client.contract.interface(%r)" % iface["name"] ]
+    for f in iface["functions"]:
+        lines.append("        self._f_%s = iface.function(%r)" % (f["name"], f["name"]))
+
+    for f in iface["functions"]:
+        method = "%s.%s" % (iface["name"], f["name"])
+        args = [ "self" ]
+        names = [ ]
+        for p in f["params"]:
+            pname = ident(p["name"])
+            names.append(pname)
+            args.append("%s: %s" % (pname, py_type(p, enums)))
+        ret = ""
+        if f.get("returns"):
+            ret = " -> %s" % py_type(f["returns"], enums)
+        lines += [ "",
+                   "    def %s(%s)%s:" % (ident(f["name"]), ", ".join(args), ret),
+                   "        \"\"\"" ]
+        if f.get("comment"):
+            lines.extend([ ("        " + l).rstrip() for l in f["comment"].split("\n") ])
+            lines.append("")
+        lines.append("        %s(%s)%s" % (method,
+                                           ", ".join([ "%s %s" % (p["name"], type_str(p)) for p in f["params"] ]),
+                                           f.get("returns") and " " + type_str(f["returns"]) or ""))
+        lines += [ "        \"\"\"",
+                   "        return self._client.invoke(self._f_%s, %r, [ %s ])" % (f["name"], method, ", ".join(names)) ]
+    return lines
+
+def to_python(idl_parsed, version=""):
+    """
+    Returns the source of a Python module for the given parsed IDL.
+
+    :Parameters:
+      idl_parsed
+        Barrister parsed IDL as a list of dicts
+      version
+        Barrister version to record in the generated module
+    """
+    structs = { }
+    enums = { }
+    ifaces = [ ]
+    checksum = ""
+    for e in idl_parsed:
+        if e["type"] == "struct":
+            structs[e["name"]] = e
+        elif e["type"] == "enum":
+            enums[e["name"]] = e
+        elif e["type"] == "interface":
+            ifaces.append(e)
+        elif e["type"] == "meta":
+            checksum = e.get("checksum", "")
+
+    out = [ HEADER % { "version" : version, "checksum" : checksum } ]
+    out.append("IDL = %s\n" % pprint.pformat(idl_parsed, width=100))
+
+    out.append("\n# exact element types accepted by the bulk array checks\n")
+    for name in sorted(primitive_types.keys()):
+        allowed = primitive_types[name][1]
+        out.append("_types_%s = %s\n" % (name, allowed))
+        out.append("_types_%s_opt = _types_%s | frozenset([type(None)])\n" % (name, name))
+
+    out.append("\n# enum values\n")
+    for name in sorted(enums.keys()):
+        values = [ v["value"] for v in enums[name]["values"] ]
+        out.append("_enum_%s = frozenset(%r)\n" % (ident(name), values))
+        out.append("_enum_%s_opt = _enum_%s | frozenset([None])\n" % (ident(name), ident(name)))
+
+    out.append("\n# validators. Each returns (True, None) or (False, ValidationError)\n")
+    keys = collect_keys(idl_parsed)
+    for key in keys:
+        type_name, optional, is_array = key
+        if is_array:
+            suffix = optional and "_opt" or ""
+            if type_name in primitive_types:
+                allowed = "_types_%s%s" % (type_name, suffix)
+                lines = gen_array(key, "%s.issuperset(map(type, val))" % allowed)
+            elif type_name in enums:
+                allowed = "_enum_%s%s" % (ident(type_name), suffix)
+                lines = gen_array(key, "%s.issuperset(val)" % allowed, True)
+            else:
+                lines = gen_array(key, None)
+        elif type_name in primitive_types:
+            lines = gen_primitive(key)
+        elif type_name in enums:
+            lines = gen_enum(key, enums[type_name])
+        elif type_name in structs:
+            lines = gen_struct(key, structs[type_name])
+        else:
+            continue
+        out.append("\n".join(lines) + "\n\n")
+
+    out.append("# struct field tables\n")
+    for name in sorted(structs.keys()):
+        field_list = flatten_fields(structs, structs[name])
+        all_fields = { }
+        for f in reversed(field_list):
+            all_fields[f["name"]] = validator_name(type_key(f))
+        required = [ ]
+        for f in field_list:
+            if not f["optional"] and f["name"] not in required:
+                required.append(f["name"])
+        tid = ident(name)
+        items = ", ".join([ "%r : %s" % (k, v) for k, v in sorted(all_fields.items()) ])
+        out.append("_fields_%s = { %s }\n" % (tid, items))
+        out.append("_required_%s = frozenset(%r)\n" % (tid, required))
+        out.append("_required_list_%s = %r\n" % (tid, tuple(required)))
+
+    out.append("\n# (type name, optional, is_array) -> validator. Passed to Contract()\n")
+    out.append("VALIDATORS = {\n")
+    for key in keys:
+        if key[0] in primitive_types or key[0] in enums or key[0] in structs:
+            out.append("    %r : %s,\n" % (key, validator_name(key)))
+    out.append("}\n")
+
+    out.append(FOOTER)
+
+    for iface in ifaces:
+        out.append("\n" + "\n".join(gen_stub(iface, enums)) + "\n")
+
+    return "".join(out)
@@ -0,0 +1,324 @@
+"""
+    Multi-threaded HTTP/1.1 server for a Barrister Server, using only the standard library.
+
+    :copyright: 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+import concurrent.futures
+import http.server
+import logging
+import queue
+import selectors
+import signal
+import socket
+import threading
+import time
+from barrister.wsgi import make_app
+
+log = logging.getLogger("barrister.httpd")
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles the requests on a single connection by passing them to the WSGI app
+    returned by barrister.wsgi.make_app().
+
+    Unlike BaseRequestHandler, creating a RequestHandler does not serve the connection.
+    HttpServer calls handle_one_request() on a worker thread each time the connection
+    becomes readable, and finish() once the connection is closed.  `timeout` is the
+    number of seconds to wait for the rest of a request that has started to arrive.
+
+    Responses without a Content-Length, such as streamed batch responses, are sent
+    with chunked transfer encoding, one chunk per item yielded by the app.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "barrister"
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.close_connection = True
+        self.setup()
+
+    def has_buffered_request(self):
+        """
+        Returns True if the start of another request has already been received
+        """
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_POST(self):
+        self._run_app()
+
+    def do_GET(self):
+        self._run_app()
+
+    def do_HEAD(self):
+        self._run_app()
+
+    def _run_app(self):
+        environ = { "REQUEST_METHOD" : self.command,
+                    "PATH_INFO" : self.path,
+                    "SERVER_PROTOCOL" : self.request_version,
+                    "REMOTE_ADDR" : self.client_address[0],
+                    "CONTENT_LENGTH" : self.headers.get("Content-Length", ""),
+                    "CONTENT_TYPE" : self.headers.get("Content-Type", ""),
+                    "wsgi.input" : self.rfile }
+        for k, v in self.headers.items():
+            environ["HTTP_" + k.upper().replace("-", "_")] = v
+
+        chunked = [ ]
+
+        def start_response(status, headers):
+            code, reason = status.split(" ", 1)
+            code = int(code)
+            self.send_response(code, reason)
+            for k, v in headers:
+                self.send_header(k, v)
+            if (code not in (204, 304) and self.command != "HEAD" and
+                    not [ k for k, v in headers if k.lower() == "content-length" ]):
+                if self.request_version == "HTTP/1.1":
+                    self.send_header("Transfer-Encoding", "chunked")
+                    chunked.append(True)
+                else:
+                    # the end of the response is marked by closing the connection
+                    self.close_connection = True
+            self.end_headers()
+            if code >= 400:
+                # the request body may not have been read, so the connection can't be reused
+                self.close_connection = True
+
+        for chunk in self.server.app(environ, start_response):
+            if not chunked:
+                self.wfile.write(chunk)
+            elif chunk:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s %s" % (self.address_string(), format % args))
+
+class HttpServer(http.server.HTTPServer):
+    """
+    HTTPServer that handles requests on a bounded thread pool.  A worker thread is only
+    used while a request is being served.  Idle keep-alive connections are watched by a
+    single thread with a selector, and are handed back to the pool when the next request
+    arrives, so idle clients never keep other clients waiting for a thread.
+
+    Connections with a request ready to be served wait in the pool's queue.  If
+    `max_pending` connections are already waiting, new connections are answered
+    with 503 Service Unavailable and closed.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server, host, port, threads=16, max_body_size=10*1024*1024,
+                 keepalive_timeout=15, max_pending=None):
+        """
+        Creates a new HttpServer and binds it to host and port
+
+        :Parameters:
+          server
+            barrister.Server to dispatch requests to
+          host
+            Address to listen on
+          port
+            Port to listen on.  0 picks a free port, which can be read from `server_address`
+          threads
+            Number of worker threads.  This is the maximum number of requests
+            that are served at once
+          max_body_size
+            Maximum request body size in bytes
+          keepalive_timeout
+            Seconds an idle keep-alive connection is held open before it is closed
+          max_pending
+            Maximum number of connections waiting for a worker thread before new
+            connections are rejected.  Defaults to 4 * threads
+        """
+        self.app = make_app(server, max_body_size)
+        self.keepalive_timeout = keepalive_timeout
+        if max_pending is None:
+            max_pending = 4 * threads
+        self.max_pending = max_pending
+        handler = type("RequestHandler", (RequestHandler,), { "timeout" : keepalive_timeout })
+        http.server.HTTPServer.__init__(self, (host, port), handler)
+
+        self.pool = concurrent.futures.ThreadPoolExecutor(threads, "barrister-httpd")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closing = False
+        self._parked = queue.SimpleQueue()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._watcher = threading.Thread(target=self._watch_idle, name="barrister-httpd-idle",
+                                         daemon=True)
+        self._watcher.start()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            overloaded = self._pending >= self.max_pending
+            if not overloaded:
+                self._pending += 1
+        if overloaded:
+            log.warning("Rejecting connection from %s: %d connections pending" % 
+                        (client_address[0], self.max_pending))
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                                b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self._serve, handler)
+
+    def _serve(self, handler):
+        """
+        Serves the requests that are ready on the handler's connection, then either
+        closes the connection or hands it to the idle watcher
+        """
+        with self._lock:
+            self._pending -= 1
+        try:
+            while True:
+                handler.handle_one_request()
+                if handler.close_connection or not handler.has_buffered_request():
+                    break
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+
+        with self._lock:
+            if not handler.close_connection and not self._closing:
+                self._parked.put(handler)
+                self._wakeup()
+                return
+        self._close(handler)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b"\0")
+        except BlockingIOError:
+            # the watcher has not yet read the previous wakeups
+            pass
+
+    def _close(self, handler):
+        handler.finish()
+        self.shutdown_request(handler.request)
+
+    def _watch_idle(self):
+        """
+        Waits for idle keep-alive connections to become readable and submits them to
+        the pool.  Connections idle for longer than keepalive_timeout are closed.
+        """
+        while True:
+            keys = [ key for key in self._selector.get_map().values() if key.data ]
+            timeout = None
+            if keys:
+                timeout = max(0, min(key.data[1] for key in keys) - time.monotonic())
+            for key, events in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_r:
+                    self._wakeup_r.recv(4096)
+                else:
+                    self._selector.unregister(key.fileobj)
+                    with self._lock:
+                        self._pending += 1
+                    self.pool.submit(self._serve, key.data[0])
+
+            while True:
+                try:
+                    handler = self._parked.get_nowait()
+                except queue.Empty:
+                    break
+                if handler is None:
+                    for key in list(self._selector.get_map().values()):
+                        if key.data:
+                            self._close(key.data[0])
+                    self._selector.close()
+                    return
+                expires = time.monotonic() + self.keepalive_timeout
+                self._selector.register(handler.connection, selectors.EVENT_READ, 
+                                        (handler, expires))
+
+            now = time.monotonic()
+            for key in list(self._selector.get_map().values()):
+                if key.data and key.data[1] <= now:
+                    self._selector.unregister(key.fileobj)
+                    self._close(key.data[0])
+
+    def server_close(self):
+        """
+        Stops accepting connections, closes idle keep-alive connections, waits for the
+        requests in progress to finish, and closes the listening socket
+        """
+        http.server.HTTPServer.server_close(self)
+        with self._lock:
+            self._closing = True
+            self._parked.put(None)
+            self._wakeup()
+        self._watcher.join()
+        self.pool.shutdown(wait=True)
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+def serve(server, host="127.0.0.1", port=8080, threads=16, max_body_size=10*1024*1024,
+          keepalive_timeout=15, max_pending=None):
+    """
+    Serves the given Server over HTTP until SIGINT or SIGTERM is received, then waits for
+    requests in progress to finish and returns.  JSON-RPC requests are POSTed to any
+    path, and a GET returns the IDL.  See barrister.wsgi.make_app for details.
+
+    :Parameters:
+      server
+        barrister.Server to dispatch requests to
+      host
+        Address to listen on
+      port
+        Port to listen on
+      threads
+        Number of worker threads.  This is the maximum number of requests that are
+        served at once
+      max_body_size
+        Maximum request body size in bytes
+      keepalive_timeout
+        Seconds an idle keep-alive connection is held open before it is closed
+      max_pending
+        Maximum number of connections waiting for a worker thread before new
+        connections are rejected.  Defaults to 4 * threads
+    """
+    httpd = HttpServer(server, host, port, threads, max_body_size, keepalive_timeout,
+                       max_pending)
+
+    def stop(signum, frame):
+        threading.Thread(target=httpd.shutdown).start()
+
+    old_handlers = { }
+    if threading.current_thread() is threading.main_thread():
+        for sig in [ signal.SIGINT, signal.SIGTERM ]:
+            old_handlers[sig] = signal.signal(sig, stop)
+
+    log.info("Serving on http://%s:%d/" % httpd.server_address[:2])
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        for sig, handler in old_handlers.items():
+            signal.signal(sig, handler)
@@ -103,6 +103,9 @@ def elem_checksum(elem):
                 ret = f["returns"]
                 fs = (ret["type"], ret["is_array"], ret["optional"])
                 s += "(%s\t%s\t%s)]" % fs
+            if "cache" in f:
+                # only present if set, so checksums of IDL without it are unchanged
+                s += "\tcache=%s" % f["cache"].get("ttl", "")
         s += "\n"
         return s
     return None
@@ -132,6 +135,7 @@ class IdlScanner(Scanner):
         self.imports = { }
         self.comment = None
         self.cur = None
+        self.type_function = None
         self.namespace = None
         self.searchPath = None
         self.idl_text = idl_text
@@ -434,6 +438,7 @@ class IdlScanner(Scanner):
         self.field["comment"] = self.get_comment()
         self.field["optional"] = False
         self.type = self.field
+        self.type_function = None
         self.cur["fields"].append(self.field)
         self.validate_struct_field(self.cur)
         self.field = None
@@ -483,6 +488,7 @@ class IdlScanner(Scanner):
                 "is_array" : is_array, 
                 "optional" : False }
             self.type = self.function["returns"]
+            self.type_function = self.function
             self.next_state = "functions"
             self.cur["functions"].append(self.function)
             self.function = None
@@ -492,15 +498,35 @@ class IdlScanner(Scanner):
         text = text.strip()
         if text.startswith("[") and text.endswith("]"):
             text = text[1:-1]
-        if text != "":
-            if text == "optional":
+        for opt in text.split(","):
+            opt = opt.strip()
+            if opt == "":
+                continue
+            elif opt == "optional":
                 self.type["optional"] = True
+            elif self.type_function and (opt == "cache" or opt.startswith("cache=")):
+                self.type_function["cache"] = self.parse_cache_opt(opt)
             else:
-                raise Exception("Invalid type option: %s" % text)
+                raise Exception("Invalid type option: %s" % opt)
         self.type = None
+        self.type_function = None
         self.begin(self.next_state)
         self.next_state = None
 
+    def parse_cache_opt(self, opt):
+        """
+        Parses the 'cache' or 'cache=SECONDS' return type option, which marks the function's
+        responses as cacheable by the server
+        """
+        cache = { }
+        if "=" in opt:
+            ttl = opt.split("=", 1)[1].strip()
+            try:
+                cache["ttl"] = int(ttl)
+            except ValueError:
+                raise Exception("Invalid cache ttl: %s" % ttl)
+        return cache
+
     def end_type_opts_and_block(self, text):
         self.end_type_opts(text)
         self.end_block(text)
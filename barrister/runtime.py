@@ -5,13 +5,33 @@
     :license: MIT, see LICENSE for more details.
 """
 import urllib.request, urllib.error, urllib.parse
+import asyncio
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
+import contextvars
+import socket
 import uuid
 import itertools
 import logging
+import mmap
+import os
+import pickle
+import random
+import re
+import reprlib
+import sys
+import threading
+import time
 try:
     import json
 except: 
     import simplejson as json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # JSON-RPC standard error codes
 ERR_PARSE = -32700
@@ -23,19 +43,72 @@ ERR_INTERNAL = -32603
 # Our extensions
 ERR_UNKNOWN = -32000
 ERR_INVALID_RESP = -32001
+ERR_OVERLOADED = -32002
+ERR_DEADLINE_EXCEEDED = -32003
+
+# HTTP header carrying the number of seconds the client will wait for a response
+TIMEOUT_HEADER = "X-Barrister-Timeout"
+
+# Content type of streamed batch responses: one JSON-RPC response per line, in the order
+# the requests complete.  Clients request a stream by sending it in the Accept header.
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+
+# Upper bounds in seconds of the Metrics latency histogram buckets: 100us doubling up to ~6.5s.
+# Calls slower than the last bound are counted in a final overflow bucket.
+_latency_buckets = tuple([ 0.0001 * 2 ** i for i in range(17) ])
+
+# Header tag and format version of files written by Contract.save_cached
+_cache_magic = "barrister-contract"
+_cache_version = 1
+
+# Barrister primitive type name -> (python types accepted, description used in errors)
+_primitive_types = {
+    "int"    : ((int,), "int"),
+    "float"  : ((float, int), "float"),
+    "bool"   : ((bool,), "bool"),
+    "string" : ((str,), "string")
+}
+
+# Barrister primitive type name -> exact python types accepted by the bulk array check.
+# Values of other types (e.g. subclasses) fall back to the per-element isinstance() check.
+_primitive_exact_types = {
+    "int"    : frozenset([int, bool]),
+    "float"  : frozenset([float, int, bool]),
+    "bool"   : frozenset([bool]),
+    "string" : frozenset([str])
+}
+
+# Limits applied when a value is included in an error message, so the cost and size of
+# the message does not grow with the size of the payload
+_preview_repr = reprlib.Repr()
+_preview_repr.maxlevel  = 3
+_preview_repr.maxdict   = 5
+_preview_repr.maxlist   = 5
+_preview_repr.maxstring = 60
+_preview_repr.maxother  = 60
+_preview_repr.maxlong   = 40
+
+def preview(val):
+    """
+    Returns a truncated repr() of val whose length is bounded regardless of the size
+    of val.  Used when including request and response values in error messages.
+    """
+    return _preview_repr.repr(val)
 
-def contract_from_file(fname):
+def contract_from_file(fname, codec=None):
     """
     Loads a Barrister IDL JSON from the given file and returns a Contract class
 
     :Parameters:
       fname
         Filename containing Barrister IDL JSON to load
+      codec
+        Optional codec used to decode the file. Defaults to JsonCodec
     """
-    f = open(fname)
+    f = open(fname, "rb")
     j = f.read()
     f.close()
-    return Contract(json.loads(j))
+    return Contract((codec or JsonCodec()).loads(j))
 
 def unpack_method(method):
     """
@@ -91,6 +164,88 @@ def safe_get(d, key, def_val=None):
     else:
         return def_val
 
+class LazyMessage(object):
+    """
+    A message that is formatted using the % operator the first time str() is called
+    on it.  Any args that are LazyMessage or ValidationError instances are formatted
+    at the same time.
+    """
+
+    def __init__(self, fmt, *args):
+        self.fmt  = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt % self.args
+
+class _Preview(object):
+    """
+    Wraps a value so that it is formatted with preview() when its message is built
+    """
+
+    def __init__(self, val):
+        self.val = val
+
+    def __str__(self):
+        return preview(self.val)
+
+class ValidationError(LazyMessage):
+    """
+    Describes why a value failed Contract validation.  Contract, Struct and Enum
+    validators return this as the second element of their (bool, error) tuple.
+
+    The location of the invalid value is stored as a list of path segments (field
+    names and list indexes) that are appended as the error propagates out of nested
+    structs and lists.  The human readable message is only built when str() is
+    called, and only includes a truncated preview of the offending value.
+    """
+
+    def __init__(self, fmt, *args):
+        LazyMessage.__init__(self, fmt, *args)
+        self.segments = [ ]
+
+    def at(self, segment):
+        """
+        Appends a path segment to this error and returns self.  Segments are added from
+        the innermost value outwards, so `path` reads them in reverse order.
+
+        :Parameters:
+          segment
+            Either a string field name, or an int list index
+        """
+        self.segments.append(segment)
+        return self
+
+    @property
+    def path(self):
+        """
+        Location of the invalid value.  For example: `params[0].items[1532].count`
+        Returns an empty string if the error is for the value that was validated.
+        """
+        s = ""
+        for seg in reversed(self.segments):
+            if isinstance(seg, int):
+                s += "[%d]" % seg
+            elif s:
+                s += "." + seg
+            else:
+                s = seg
+        return s
+
+    @property
+    def reason(self):
+        """
+        Description of the error without the path
+        """
+        return self.fmt % self.args
+
+    def __str__(self):
+        path = self.path
+        if path:
+            return "%s: %s" % (path, self.reason)
+        else:
+            return self.reason
+
 class RpcException(Exception, json.JSONEncoder):
     """
     Represents a JSON-RPC style exception.  Server implementations should raise this
@@ -105,7 +260,8 @@ class RpcException(Exception, json.JSONEncoder):
           code
             Integer representing the error type. Applications may use any positive integer.
           msg
-            Human readable description of the error
+            Human readable description of the error.  May also be a LazyMessage, in which
+            case the string is built the first time the msg property is read.
           data
             Optional extra info about the error. Should be a string, int, or list or dict of strings/ints
         """
@@ -113,16 +269,158 @@ class RpcException(Exception, json.JSONEncoder):
         self.msg  = msg
         self.data = data
 
+    @property
+    def msg(self):
+        if not isinstance(self._msg, str):
+            self._msg = str(self._msg)
+        return self._msg
+
+    @msg.setter
+    def msg(self, msg):
+        self._msg = msg
+
     def __str__(self):
         s = "RpcException: code=%d msg=%s" % (self.code, self.msg)
         if self.data:
             s += "%s data=%s" % (s, str(self.data))
         return s
 
+class StructObject(object):
+    """
+    Base class for the lightweight classes generated for IDL structs by 
+    Contract.struct_class().  Generated classes define one __slots__ entry per 
+    field, including fields inherited via 'extends', so instances are much smaller
+    than the equivalent dict.  Optional fields that were not provided are left unset.
+
+    For example:
+
+    ::
+
+      Person = contract.struct_class("Person")
+      p = Person(personId="123", firstName="Bob", lastName="Smith")
+
+    """
+    __slots__ = ( )
+    _struct_name = None
+
+    def __init__(self, **fields):
+        for k, v in fields.items():
+            setattr(self, k, v)
+
+    def _asdict(self):
+        """
+        Returns a dict of the fields that are set on this instance.  Nested
+        StructObject values are not converted.
+        """
+        d = { }
+        for name in self.__slots__:
+            try:
+                d[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return d
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._asdict() == other._asdict()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        fields = [ "%s=%r" % (k, v) for k, v in self._asdict().items() ]
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(fields))
+
+def struct_to_dict(obj):
+    """
+    Converts a StructObject to a dict for JSON serialization.  Suitable for use as
+    the `default` argument to json.dumps()
+    """
+    if isinstance(obj, StructObject):
+        return obj._asdict()
+    raise TypeError("%s is not JSON serializable" % preview(obj))
+
+class JsonCodec(object):
+    """
+    Serializes requests and responses with the standard library json module.
+    A codec is any object with these two methods:
+
+    * `dumps(obj)` - returns obj encoded as UTF-8 JSON bytes
+    * `loads(data)` - decodes JSON from bytes, bytearray or str
+
+    The encoder and decoder are created once, and output uses compact separators.
+    StructObject instances are encoded as objects.
+    """
+
+    def __init__(self):
+        self.encoder = json.JSONEncoder(separators=(",", ":"), default=struct_to_dict)
+        self.decoder = json.JSONDecoder()
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        if not isinstance(data, str):
+            data = data.decode("utf-8")
+        return self.decoder.decode(data)
+
+class OrjsonCodec(object):
+    """
+    Codec that uses the orjson C extension.  Raises ImportError if orjson is not installed.
+    See JsonCodec for the codec methods.
+    """
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires the orjson package")
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=struct_to_dict)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+def fastest_codec():
+    """
+    Returns an OrjsonCodec if orjson is installed, otherwise a JsonCodec
+    """
+    if orjson is None:
+        return JsonCodec()
+    return OrjsonCodec()
+
+_current_context = contextvars.ContextVar("barrister_context", default=None)
+
+def current_context():
+    """
+    Returns the RequestContext of the request being processed by the calling thread or
+    asyncio task, or None if not called while processing a request.  Handler functions
+    can use this to read request properties, e.g. `current_context().remaining()`
+    """
+    return _current_context.get()
+
+def deadline_after(timeout):
+    """
+    Returns the deadline, in time.monotonic() seconds, for a request that may take timeout
+    seconds.  Returns None if timeout is None, or if it is a string (e.g. the value of
+    the TIMEOUT_HEADER) that is not a number.
+    """
+    if timeout is None:
+        return None
+    try:
+        return time.monotonic() + float(timeout)
+    except ValueError:
+        return None
+
 class RequestContext(object):
     """
     Stores state about a single request, including properties passed
     into Server.call
+
+    If the props contain a `deadline`, in time.monotonic() seconds, the Server rejects
+    the request with ERR_DEADLINE_EXCEEDED once it has passed, rather than starting work
+    the caller will not wait for.
+
+    `notification` is True if the request has no `id`.  No response is sent for
+    notifications, so `response` is None when post filters are called.
     """
 
     def __init__(self, props, req):
@@ -139,6 +437,25 @@ class RequestContext(object):
         self.request  = req
         self.response = None
         self.error    = None
+        self.deadline = props.get("deadline")
+        self.notification = "id" not in req
+
+    def remaining(self):
+        """
+        Returns the number of seconds left before the request's deadline, which is
+        negative if it has passed, or None if the request has no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self):
+        """
+        Raises RpcException with code ERR_DEADLINE_EXCEEDED if the request's deadline has
+        passed.  Long running handlers may call this between steps to stop early.
+        """
+        if self.deadline is not None and self.deadline <= time.monotonic():
+            raise RpcException(ERR_DEADLINE_EXCEEDED, "Deadline exceeded")
 
     def func_name(self):
         return unpack_method(self.request["method"])[1]
@@ -173,7 +490,7 @@ class RequestContext(object):
             Optional additional info about the error. Should be a primitive, or a list or
             dict of primitives to avoid serialization issues.
         """
-        self.error = err_response(self.request["id"], code, msg, data)
+        self.error = err_response(self.request.get("id"), code, msg, data)
 
 class Filter(object):
     """
@@ -204,6 +521,946 @@ class Filter(object):
         """
         pass
 
+class ValidationStats(object):
+    """
+    Validation counters for a single function.  Has the following properties:
+
+    * `request_checked` / `response_checked` - Number of times validation ran
+    * `request_skipped` / `response_skipped` - Number of times validation was skipped by the policy
+    * `request_failed` / `response_failed` - Number of times validation rejected a value
+    * `request_seconds` / `response_seconds` - Total time spent validating
+    """
+
+    def __init__(self):
+        self.request_checked  = 0
+        self.request_skipped  = 0
+        self.request_failed   = 0
+        self.request_seconds  = 0.0
+        self.response_checked = 0
+        self.response_skipped = 0
+        self.response_failed  = 0
+        self.response_seconds = 0.0
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+class ValidationPolicy(object):
+    """
+    Decides whether requests and responses should be validated against the Contract,
+    per interface and per function, and optionally keeps ValidationStats for each function.
+
+    A validation mode may be:
+
+    * `True` or `1` - always validate
+    * `False` or `0` - never validate
+    * A number between 0 and 100 - validate that percentage of calls, chosen at random
+
+    The ints 0 and 1 keep their meaning from before sampling was added, when the modes
+    were boolean flags.  To validate 1% of calls, pass the float `1.0`.
+
+    For example, to validate all requests but only 5% of responses from a hot function:
+
+    ::
+
+      policy = barrister.ValidationPolicy(collect_stats=True)
+      policy.set("OrderService.getOrderStatus", response=5)
+      server = barrister.Server(contract, validation_policy=policy)
+
+    """
+
+    def __init__(self, request=True, response=True, collect_stats=False):
+        """
+        Creates a new ValidationPolicy
+
+        :Parameters:
+          request
+            Default validation mode for requests
+          response
+            Default validation mode for responses
+          collect_stats
+            If True, the time spent validating and the number of checked, skipped and
+            failed validations are recorded per function.  See get_stats().  Off by 
+            default, as it times every validation and takes a lock shared by all threads.
+        """
+        self.collect_stats = collect_stats
+        self.lock  = threading.Lock()
+        self.rules = { }
+        self.stats = { }
+        self._rates = { }
+        self.set_default(request, response)
+
+    def set_default(self, request=None, response=None):
+        """
+        Sets the validation modes used for functions with no interface or function
+        specific mode.  Modes that are None are left unchanged.
+        """
+        if request is not None:
+            self.request = request
+        if response is not None:
+            self.response = response
+        self._rates = { }
+
+    def set(self, target, request=None, response=None):
+        """
+        Sets the validation modes for an interface or a single function.  Function modes
+        take precedence over interface modes, which take precedence over the defaults.
+        Modes that are None are inherited.
+
+        :Parameters:
+          target
+            Interface name (e.g. "UserService") or function name (e.g. "UserService.get")
+          request
+            Validation mode for requests
+          response
+            Validation mode for responses
+        """
+        self.rules[target] = (request, response)
+        self._rates = { }
+
+    def mode(self, iface_name, func_name):
+        """
+        Returns a tuple of the (request, response) validation modes that apply to
+        the given function
+        """
+        request, response = self.request, self.response
+        for target in (iface_name, "%s.%s" % (iface_name, func_name)):
+            if target in self.rules:
+                req_mode, resp_mode = self.rules[target]
+                if req_mode is not None:
+                    request = req_mode
+                if resp_mode is not None:
+                    response = resp_mode
+        return request, response
+
+    def validate_request(self, func, params):
+        """
+        Validates params against the given Function if the policy selects this call.
+        Raises RpcException if the params are invalid.
+        """
+        if self._should_validate(func, 0):
+            self._validate(func, func.validate_params, params, "request")
+        elif self.collect_stats:
+            self._skipped(func, "request")
+
+    def validate_response(self, func, result):
+        """
+        Validates result against the given Function if the policy selects this call.
+        Raises RpcException if the result is invalid.
+        """
+        if self._should_validate(func, 1):
+            self._validate(func, func.validate_response, result, "response")
+        elif self.collect_stats:
+            self._skipped(func, "response")
+
+    def get_stats(self, full_name):
+        """
+        Returns the ValidationStats for the given function name (e.g. "UserService.get"),
+        or None if no calls to that function have been seen or collect_stats is off.
+        """
+        return self.stats.get(full_name)
+
+    def _should_validate(self, func, pos):
+        rates = self._rates.get(func.full_name)
+        if rates is None:
+            iface_name, func_name = unpack_method(func.full_name)
+            rates = tuple([ _mode_to_rate(m) for m in self.mode(iface_name, func_name) ])
+            self._rates[func.full_name] = rates
+        rate = rates[pos]
+        if rate >= 1.0:
+            return True
+        elif rate <= 0.0:
+            return False
+        else:
+            return random.random() < rate
+
+    def _validate(self, func, validate, val, kind):
+        if not self.collect_stats:
+            validate(val)
+            return
+        failed = False
+        start = time.perf_counter()
+        try:
+            validate(val)
+        except RpcException:
+            failed = True
+            raise
+        finally:
+            self._record(func, kind, time.perf_counter() - start, failed)
+
+    def _record(self, func, kind, elapsed, failed):
+        with self.lock:
+            stats = self._get_stats(func)
+            if kind == "request":
+                stats.request_checked += 1
+                stats.request_seconds += elapsed
+                if failed:
+                    stats.request_failed += 1
+            else:
+                stats.response_checked += 1
+                stats.response_seconds += elapsed
+                if failed:
+                    stats.response_failed += 1
+
+    def _skipped(self, func, kind):
+        with self.lock:
+            stats = self._get_stats(func)
+            if kind == "request":
+                stats.request_skipped += 1
+            else:
+                stats.response_skipped += 1
+
+    def _get_stats(self, func):
+        stats = self.stats.get(func.full_name)
+        if stats is None:
+            stats = ValidationStats()
+            self.stats[func.full_name] = stats
+        return stats
+
+class ResponseCache(object):
+    """
+    Bounded LRU cache of function results, used by a Server to answer repeated calls to
+    idempotent functions without calling the handler.  Entries are keyed by the
+    function name and the params, canonicalized as sorted key JSON.
+
+    A function is cacheable if it was configured with set(), or if its return type
+    has the `cache` option in the IDL, e.g.:  `get(id string) User [cache=30]`
+
+    Cached results are shared between calls and must not be modified by callers.
+    Only successful results are cached.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, functions=None):
+        """
+        Creates a new ResponseCache
+
+        :Parameters:
+          max_entries
+            Maximum number of results to hold.  The least recently used result is evicted
+            when a new result is added to a full cache.
+          ttl
+            Default number of seconds a result is cached for.  None to cache results until
+            they are evicted.
+          functions
+            Optional dict of function name (e.g. "UserService.get") to ttl, as accepted by
+            set()
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.rules = { }
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._ttls = { }
+        if functions:
+            for name, ttl in functions.items():
+                self.set(name, ttl)
+
+    def set(self, full_name, ttl=True):
+        """
+        Sets whether results of the given function are cached, overriding the IDL.
+
+        :Parameters:
+          full_name
+            Function name, e.g. "UserService.get"
+          ttl
+            True to cache with the default ttl, False to never cache, or a number of 
+            seconds to cache results for
+        """
+        with self.lock:
+            self.rules[full_name] = ttl
+            self._ttls.clear()
+
+    def key(self, func, params):
+        """
+        Returns the cache key for a call to func with params, or None if func is not
+        cacheable or the params cannot be canonicalized.
+        """
+        ttl = self._ttls.get(func.full_name, _unset)
+        if ttl is _unset:
+            ttl = self._ttl_for(func)
+        if ttl is None:
+            return None
+        return _call_key(func, params)
+
+    def get(self, key):
+        """
+        Returns a tuple of (True, result) if key is cached, otherwise (False, None)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        """
+        Adds result to the cache under key, which must have been returned by key()
+        """
+        ttl = self._ttls.get(key[0])
+        if ttl is None:
+            return
+        expires = None
+        if ttl:
+            expires = time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (result, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all cached results
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Returns a dict of counters with keys: hits, misses, evictions, expirations, size
+        """
+        with self.lock:
+            return { "hits" : self.hits, "misses" : self.misses, 
+                     "evictions" : self.evictions, "expirations" : self.expirations,
+                     "size" : len(self.entries) }
+
+    def _ttl_for(self, func):
+        """
+        Returns the ttl to cache func's results for (0 for no expiry), or None if they are
+        not cacheable
+        """
+        rule = self.rules.get(func.full_name, func.cache)
+        if rule is None or rule is False:
+            ttl = None
+        elif rule is True:
+            ttl = self.ttl or 0
+        elif isinstance(rule, dict):
+            ttl = rule.get("ttl", self.ttl) or 0
+        else:
+            ttl = rule
+        self._ttls[func.full_name] = ttl
+        return ttl
+
+_unset = object()
+
+# Method names handled by the Server itself rather than a handler
+_reserved_methods = frozenset([ "barrister-idl", "barrister-metrics" ])
+
+_key_encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=True, default=struct_to_dict)
+
+def _call_key(func, params):
+    """
+    Returns a hashable key identifying a call to func with params, or None if the params
+    cannot be encoded.  Params that are equal after JSON encoding have the same key.
+    """
+    try:
+        return (func.full_name, _key_encoder.encode(params))
+    except (TypeError, ValueError):
+        return None
+
+class _Flight(object):
+    """
+    A handler call in progress that other callers are waiting on
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class Singleflight(object):
+    """
+    Coalesces concurrent calls to the same function with the same params, so the handler
+    runs once and every caller gets its result or exception.  Calls that arrive after the
+    handler finishes run it again.  Functions must be enabled with set() or the functions
+    constructor argument.
+
+    Used by Server and AsyncServer.  Calls are only coalesced with other calls made
+    through the same kind of server.
+    """
+
+    def __init__(self, functions=None):
+        """
+        Creates a new Singleflight
+
+        :Parameters:
+          functions
+            Optional list of function names (e.g. "UserService.get") to coalesce
+        """
+        self.lock = threading.Lock()
+        self.enabled = set()
+        self.flights = { }
+        self.async_flights = { }
+        self.leaders = 0
+        self.followers = 0
+        if functions:
+            for name in functions:
+                self.set(name)
+
+    def set(self, full_name, enabled=True):
+        """
+        Enables or disables coalescing for the given function name, e.g. "UserService.get"
+        """
+        with self.lock:
+            if enabled:
+                self.enabled.add(full_name)
+            else:
+                self.enabled.discard(full_name)
+
+    def key(self, func, params):
+        """
+        Returns the key for a call to func with params, or None if func is not coalesced
+        """
+        if func.full_name not in self.enabled:
+            return None
+        return _call_key(func, params)
+
+    def do(self, key, fn, *args, timeout=None):
+        """
+        Returns fn(*args), unless a call with the same key is already running, in which
+        case waits for it and returns its result or raises its exception.  If the call
+        does not finish within timeout seconds, raises RpcException with code
+        ERR_DEADLINE_EXCEEDED.  timeout only limits the wait for another caller's call.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self.flights[key] = flight
+                self.leaders += 1
+                leader = True
+            else:
+                self.followers += 1
+                leader = False
+
+        if leader:
+            try:
+                flight.result = fn(*args)
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+            return flight.result
+
+        if not flight.done.wait(timeout):
+            with self.lock:
+                self.followers -= 1
+            raise RpcException(ERR_DEADLINE_EXCEEDED, "Deadline exceeded")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    async def do_async(self, key, fn, *args):
+        """
+        Coroutine version of do().  fn must be a coroutine function.  Waiting callers
+        share an asyncio Future, so this must only be used from a single event loop.
+
+        If the call running fn is cancelled (e.g. by its deadline) the waiting callers
+        are not cancelled with it.  One of them runs fn again for the others.
+        """
+        while True:
+            future = self.async_flights.get(key)
+            if future is None:
+                break
+            self.followers += 1
+            result = await asyncio.shield(future)
+            if result is not _unset:
+                return result
+            # the leader was cancelled
+            self.followers -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self.async_flights[key] = future
+        self.leaders += 1
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            future.set_result(_unset)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark the exception retrieved, in case there are no waiting callers
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.async_flights[key]
+
+    def stats(self):
+        """
+        Returns a dict with the number of calls that ran the handler (`leaders`) and the
+        number that shared another call's result (`followers`)
+        """
+        with self.lock:
+            return { "leaders" : self.leaders, "followers" : self.followers }
+
+class _Waiter(object):
+    """
+    A call waiting in a _Bulkhead queue.  Threads wait on event, coroutines on future.
+    """
+
+    __slots__ = [ "granted", "event", "loop", "future" ]
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.future is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_wake, self.future)
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+class _Bulkhead(object):
+    """
+    Concurrency limit for a single interface or function.  Calls over the limit wait in
+    a FIFO queue.  A released slot is handed directly to the first waiting call.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.running = 0
+        self.waiters = collections.deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def acquire(self, deadline=None):
+        """
+        Returns True once a slot is held, or False if the call is rejected.  A queued call
+        waits until queue_timeout or the deadline (in time.monotonic() seconds), whichever
+        comes first.
+        """
+        waiter = self._enter(None)
+        if waiter is None or waiter is False:
+            return waiter is None
+        waiter.event.wait(self._wait_time(deadline))
+        return self._waited(waiter)
+
+    async def acquire_async(self, deadline=None):
+        """
+        Coroutine version of acquire()
+        """
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is None or waiter is False:
+            return waiter is None
+        try:
+            await asyncio.wait_for(waiter.future, self._wait_time(deadline))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if self._waited(waiter):
+                self.release()
+            raise
+        return self._waited(waiter)
+
+    def release(self):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().grant()
+            else:
+                self.running -= 1
+
+    def stats(self):
+        with self.lock:
+            return { "max_concurrent" : self.max_concurrent, "max_queue" : self.max_queue,
+                     "running" : self.running, "queue_depth" : len(self.waiters),
+                     "admitted" : self.admitted, "queued" : self.queued,
+                     "rejected" : self.rejected, "timeouts" : self.timeouts }
+
+    def _wait_time(self, deadline):
+        """
+        Returns the number of seconds a queued call may wait, or None for no limit
+        """
+        timeout = self.queue_timeout
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.0)
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        return timeout
+
+    def _enter(self, loop):
+        """
+        Takes a slot and returns None if one is free, returns False if the queue is full,
+        otherwise queues and returns a _Waiter
+        """
+        with self.lock:
+            if self.running < self.max_concurrent:
+                self.running += 1
+                self.admitted += 1
+                return None
+            if len(self.waiters) >= self.max_queue:
+                self.rejected += 1
+                return False
+            waiter = _Waiter(loop)
+            self.waiters.append(waiter)
+            self.queued += 1
+            return waiter
+
+    def _waited(self, waiter):
+        """
+        Returns True if waiter was granted a slot, otherwise removes it from the queue
+        """
+        with self.lock:
+            if waiter.granted:
+                self.admitted += 1
+                return True
+            self.waiters.remove(waiter)
+            self.rejected += 1
+            self.timeouts += 1
+            return False
+
+class Bulkheads(object):
+    """
+    Per interface and per function concurrency limits, used by a Server to keep a slow
+    interface from tying up every worker thread.  Calls over a limit wait in a bounded
+    FIFO queue, and are rejected with ERR_OVERLOADED when the queue is full or they have
+    waited for queue_timeout seconds.  A call to a function that has both an interface
+    and a function limit must be admitted by both.
+
+    For example, to allow at most 8 concurrent calls to OrderService, 2 of which may be
+    OrderService.export, with up to 16 and 4 calls waiting:
+
+    ::
+
+      bulkheads = barrister.Bulkheads()
+      bulkheads.set("OrderService", 8, max_queue=16)
+      bulkheads.set("OrderService.export", 2, max_queue=4)
+      server = barrister.Server(contract, bulkheads=bulkheads)
+
+    Limits apply to the handler call and response validation.  Calls answered from a
+    ResponseCache are not limited.
+    """
+
+    def __init__(self, limits=None, queue_timeout=None):
+        """
+        Creates a new Bulkheads
+
+        :Parameters:
+          limits
+            Optional dict of interface or function name to max_concurrent, or to a tuple of
+            (max_concurrent, max_queue), as accepted by set()
+          queue_timeout
+            Default number of seconds a call may wait in a queue before it is rejected.
+            None to wait until a slot is free.
+        """
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.bulkheads = { }
+        self._chains = { }
+        if limits:
+            for target, limit in limits.items():
+                if isinstance(limit, tuple):
+                    self.set(target, *limit)
+                else:
+                    self.set(target, limit)
+
+    def set(self, target, max_concurrent, max_queue=0, queue_timeout=_unset):
+        """
+        Sets the concurrency limit of an interface or a single function.  Calls that are
+        running or queued when the limit is replaced are counted against the old limit.
+
+        :Parameters:
+          target
+            Interface name (e.g. "UserService") or function name (e.g. "UserService.get")
+          max_concurrent
+            Maximum number of calls that may run at once, or None to remove the limit
+          max_queue
+            Maximum number of calls that may wait for a slot.  Calls beyond this are
+            rejected immediately.
+          queue_timeout
+            Seconds a call may wait in the queue.  Defaults to the constructor's
+            queue_timeout.
+        """
+        if queue_timeout is _unset:
+            queue_timeout = self.queue_timeout
+        with self.lock:
+            if max_concurrent is None:
+                self.bulkheads.pop(target, None)
+            else:
+                self.bulkheads[target] = _Bulkhead(target, max_concurrent, max_queue, 
+                                                   queue_timeout)
+            self._chains = { }
+
+    def enter(self, func, deadline=None):
+        """
+        Waits for a slot in each bulkhead that applies to func.  Returns a tuple of the
+        bulkheads entered, which must be passed to exit() when the call completes.  Raises
+        RpcException with code ERR_OVERLOADED if the call is rejected, or with code
+        ERR_DEADLINE_EXCEEDED if the deadline (in time.monotonic() seconds) passes while
+        the call is queued.
+        """
+        chain = self._chain(func)
+        for i, bulkhead in enumerate(chain):
+            if not bulkhead.acquire(deadline):
+                self.exit(chain[:i])
+                self._reject(bulkhead, deadline)
+        return chain
+
+    async def enter_async(self, func, deadline=None):
+        """
+        Coroutine version of enter()
+        """
+        chain = self._chain(func)
+        for i, bulkhead in enumerate(chain):
+            try:
+                admitted = await bulkhead.acquire_async(deadline)
+            except asyncio.CancelledError:
+                self.exit(chain[:i])
+                raise
+            if not admitted:
+                self.exit(chain[:i])
+                self._reject(bulkhead, deadline)
+        return chain
+
+    def exit(self, chain):
+        """
+        Releases the slots returned by enter()
+        """
+        for bulkhead in reversed(chain):
+            bulkhead.release()
+
+    def stats(self):
+        """
+        Returns a dict of interface or function name to a dict of its limits and counters:
+        running, queue_depth, admitted, queued, rejected (including timeouts) and timeouts
+        """
+        with self.lock:
+            bulkheads = list(self.bulkheads.values())
+        return dict([ (b.name, b.stats()) for b in bulkheads ])
+
+    def _chain(self, func):
+        chain = self._chains.get(func.full_name)
+        if chain is None:
+            iface_name, func_name = unpack_method(func.full_name)
+            # the function limit is entered first, so calls queued on it do not hold a
+            # slot of the interface
+            with self.lock:
+                chain = tuple([ self.bulkheads[t] for t in (func.full_name, iface_name)
+                                if t in self.bulkheads ])
+                self._chains[func.full_name] = chain
+        return chain
+
+    def _reject(self, bulkhead, deadline):
+        if deadline is not None and deadline <= time.monotonic():
+            raise RpcException(ERR_DEADLINE_EXCEEDED, "Deadline exceeded")
+        msg = "Server overloaded. Too many concurrent calls to '%s'" % bulkhead.name
+        raise RpcException(ERR_OVERLOADED, msg)
+
+class _FunctionMetrics(object):
+    """
+    Counters for a single function, owned by a single thread
+    """
+
+    __slots__ = [ "calls", "errors", "seconds", "latency", "request_bytes", "response_bytes" ]
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = { }
+        self.seconds = 0.0
+        self.latency = [ 0 ] * (len(_latency_buckets) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def add(self, m):
+        """
+        Adds the counters of m to this instance
+        """
+        self.calls += m.calls
+        self.seconds += m.seconds
+        self.request_bytes += m.request_bytes
+        self.response_bytes += m.response_bytes
+        for code, count in list(m.errors.items()):
+            self.errors[code] = self.errors.get(code, 0) + count
+        for i, count in enumerate(list(m.latency)):
+            self.latency[i] += count
+
+def _merge_metrics(merged, shard):
+    for name, m in list(shard.items()):
+        out = merged.get(name)
+        if out is None:
+            out = _FunctionMetrics()
+            merged[name] = out
+        out.add(m)
+
+class Metrics(object):
+    """
+    Per function call counts, error counts by code, latency histograms and payload sizes,
+    recorded by a Server for every request.  Pass an instance to the Server constructor
+    and read the counters with snapshot() or Server.metrics_snapshot().
+
+    Each thread records into its own set of counters, so recording never takes a lock
+    or contends with other threads.  snapshot() adds the counters of all threads together.
+    The counters of threads that have exited are folded into a shared set, so servers
+    that start a thread per request do not accumulate per thread counters.
+
+    Requests for methods that are not registered with the Server are counted under the
+    name "(unknown)".
+    """
+
+    def __init__(self, expose=False):
+        """
+        Creates a new Metrics
+
+        :Parameters:
+          expose
+            If True, the Server returns Server.metrics_snapshot() as the result of the
+            reserved `barrister-metrics` method.  Off by default as the snapshot may 
+            reveal information about the service to clients.
+        """
+        self.expose = expose
+        self.lock = threading.Lock()
+        self.shards = [ ]
+        self.retired = { }
+        self._local = threading.local()
+
+    def record(self, name, resp, elapsed):
+        """
+        Records a call to the given function name that took elapsed seconds.  If resp is
+        an error response its error code is counted.
+        """
+        m = self._get(name)
+        m.calls += 1
+        m.seconds += elapsed
+        m.latency[bisect.bisect_left(_latency_buckets, elapsed)] += 1
+        if resp is not None and "error" in resp:
+            code = resp["error"].get("code")
+            m.errors[code] = m.errors.get(code, 0) + 1
+
+    def record_bytes(self, name, request_bytes, response_bytes):
+        """
+        Records the encoded size of a request and its response.  name is the function
+        name for single requests, or None for batches, which are only included in the
+        totals.
+        """
+        totals = self._get(None)
+        totals.request_bytes += request_bytes
+        totals.response_bytes += response_bytes
+        if name is not None:
+            m = self._get(name)
+            m.request_bytes += request_bytes
+            m.response_bytes += response_bytes
+
+    def snapshot(self, validation=None):
+        """
+        Returns a dict of the counters recorded so far, combined across all threads:
+
+        ::
+
+          { "latency_buckets" : [ upper bound of each histogram bucket in seconds ],
+            "request_bytes"   : total encoded size of all requests,
+            "response_bytes"  : total encoded size of all responses,
+            "functions"       : {
+              "UserService.get" : {
+                "calls"          : number of calls,
+                "errors"         : { error code (as a string) : count },
+                "seconds"        : total seconds spent processing calls,
+                "latency"        : [ number of calls in each bucket, plus an overflow bucket ],
+                "request_bytes"  : encoded size of single (non-batch) requests,
+                "response_bytes" : encoded size of single (non-batch) responses,
+                "validation"     : ValidationStats.to_dict(), if validation is given
+              }
+            }
+          }
+
+        :Parameters:
+          validation
+            Optional ValidationPolicy whose per function stats are included
+        """
+        merged = { }
+        with self.lock:
+            self._retire_exited()
+            shards = [ shard for thread, shard in self.shards ]
+            _merge_metrics(merged, self.retired)
+        for shard in shards:
+            _merge_metrics(merged, shard)
+        totals = merged.pop(None, None) or _FunctionMetrics()
+
+        functions = { }
+        for name, m in merged.items():
+            functions[name] = { 
+                "calls" : m.calls, "seconds" : m.seconds, "latency" : m.latency,
+                "errors" : dict([ (str(code), count) for code, count in m.errors.items() ]),
+                "request_bytes" : m.request_bytes, "response_bytes" : m.response_bytes }
+            if validation is not None:
+                stats = validation.get_stats(name)
+                if stats is not None:
+                    functions[name]["validation"] = stats.to_dict()
+        return { "latency_buckets" : list(_latency_buckets), "functions" : functions,
+                 "request_bytes" : totals.request_bytes, 
+                 "response_bytes" : totals.response_bytes }
+
+    def _get(self, name):
+        """
+        Returns the calling thread's _FunctionMetrics for name, creating it if necessary
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = { }
+            self._local.shard = shard
+            with self.lock:
+                self._retire_exited()
+                self.shards.append((threading.current_thread(), shard))
+        m = shard.get(name)
+        if m is None:
+            m = _FunctionMetrics()
+            shard[name] = m
+        return m
+
+    def _retire_exited(self):
+        """
+        Folds the counters of threads that have exited into self.retired.  Must be
+        called with self.lock held.
+        """
+        live = [ ]
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge_metrics(self.retired, shard)
+        self.shards = live
+
+def _mode_to_rate(mode):
+    # the int 1 is the old True flag, not 1%
+    if mode is True or (type(mode) is int and mode == 1):
+        return 1.0
+    elif mode is False or mode is None:
+        return 0.0
+    else:
+        return float(mode) / 100.0
+
 class Server(object):
     """
     Dispatches requests to user created handler classes based on method name.
@@ -211,7 +1468,10 @@ class Server(object):
     IDL Contract.
     """
 
-    def __init__(self, contract, validate_request=True, validate_response=True):
+    def __init__(self, contract, validate_request=True, validate_response=True,
+                 validation_policy=None, streaming_decode=False, struct_classes=False,
+                 batch_executor=None, batch_concurrency=None, cpu_workers=None, codec=None,
+                 response_cache=None, singleflight=None, metrics=None, bulkheads=None):
         """
         Creates a new Server
 
@@ -219,34 +1479,207 @@ class Server(object):
           contract
             Contract instance that this server should use
           validate_request
-            If True, requests will be validated against the Contract and rejected if they are malformed
+            If True, requests will be validated against the Contract and rejected if they are malformed.
+            May also be a percentage of requests to validate.  See ValidationPolicy.
           validate_response
             If True, responses from handler methods will be validated against the Contract and rejected
-            if they are malformed
+            if they are malformed.  May also be a percentage of responses to validate.  See 
+            ValidationPolicy.
+          validation_policy
+            Optional ValidationPolicy that controls validation per interface and function. 
+            If provided, validate_request and validate_response are ignored.
+          streaming_decode
+            If True, call_json decodes requests incrementally.  The method is resolved as 
+            soon as it is read, and params are validated one at a time as they are decoded,
+            so requests for unknown methods, with the wrong number of params, or with
+            invalid params are rejected without decoding the rest of the payload.
+            Requests rejected this way are not passed to filters.
+          struct_classes
+            If True, struct values in params are converted to instances of the classes
+            returned by Contract.struct_class() before handlers are called.  Handlers may
+            return either dicts or StructObject instances.
+          batch_executor
+            Optional concurrent.futures.Executor used to run the requests in a batch
+            concurrently, or an int number of threads for a ThreadPoolExecutor created by
+            this Server, which is shut down by close().  Handlers and filters must be 
+            thread safe if this is set.
+          batch_concurrency
+            Maximum number of requests from a single batch that may run at once when 
+            batch_executor is set.  Defaults to no limit other than the executor's size.
+          cpu_workers
+            Number of worker processes used for functions registered with
+            add_handler(..., cpu_bound=...).  Defaults to the number of CPUs.
+          codec
+            Codec used by call_bytes and call_json.  Defaults to JsonCodec.  See JsonCodec
+          response_cache
+            Optional ResponseCache.  Calls to cacheable functions whose result is cached
+            return the cached result without calling the handler or validating the 
+            response.  Filters, request validation and `barrister_pre` still run.
+          singleflight
+            Optional Singleflight.  Concurrent calls to its functions with the same params
+            share a single handler call and response validation.
+          metrics
+            Optional Metrics that records the calls, errors, latency and payload sizes of
+            every request.  See metrics_snapshot().  If set and no validation_policy is
+            given, the Server's policy collects validation stats for the snapshot.
+          bulkheads
+            Optional Bulkheads that limit the number of concurrent calls per interface and
+            function.  Rejected calls return an ERR_OVERLOADED error.
         """
         logging.basicConfig()
         self.log = logging.getLogger("barrister")
-        self.validate_req  = validate_request
-        self.validate_resp = validate_response
+        self._own_executor = None
+        if isinstance(batch_executor, int):
+            batch_executor = concurrent.futures.ThreadPoolExecutor(batch_executor, 
+                                                                   "barrister-batch")
+            self._own_executor = batch_executor
+        self.batch_executor = batch_executor
+        self.batch_concurrency = batch_concurrency
+        self.codec = codec or JsonCodec()
+        self.response_cache = response_cache
+        self.singleflight = singleflight
+        self.metrics = metrics
+        self.bulkheads = bulkheads
+        self._idl_cache = None
+        self.cpu_workers = cpu_workers
+        self.cpu_handlers = { }
+        self._cpu_pool = None
+        self._cpu_lock = threading.Lock()
+        if validation_policy is None:
+            validation_policy = ValidationPolicy(validate_request, validate_response,
+                                                 collect_stats=metrics is not None)
+        self.validation = validation_policy
+        self.streaming_decode = streaming_decode
+        self.struct_classes = struct_classes
         self.contract = contract
         self.handlers = { }
+        self.dispatch = { }
         self.filters = None
 
-    def add_handler(self, iface_name, handler):
+    @property
+    def validate_req(self):
+        return self.validation.request
+
+    @validate_req.setter
+    def validate_req(self, mode):
+        self.validation.set_default(request=mode)
+
+    @property
+    def validate_resp(self):
+        return self.validation.response
+
+    @validate_resp.setter
+    def validate_resp(self, mode):
+        self.validation.set_default(response=mode)
+
+    def add_handler(self, iface_name, handler, cpu_bound=False):
         """
         Associates the given handler with the interface name.  If the interface does not exist in
-        the Contract, an RpcException is raised.
+        the Contract, or the handler does not implement every function on the interface, an
+        RpcException is raised.
+
+        The handler's methods (and its optional `barrister_pre` hook) are looked up once and
+        stored in the `dispatch` table, so attributes assigned on the handler afterwards
+        are not seen until add_handler is called again.
 
         :Parameters:
           iface_name
             Name of interface that this handler implements
           handler
             Instance of a class that implements all functions defined on the interface
-        """
-        if self.contract.has_interface(iface_name):
-            self.handlers[iface_name] = handler
-        else:
-            raise RpcException(ERR_INVALID_REQ, "Unknown interface: '%s'", iface_name)
+          cpu_bound
+            True to run all functions of this interface in worker processes, or a list of
+            function names to run in worker processes.  Each worker holds its own copy of
+            the handler, so it must be picklable and must not rely on state shared with
+            the server process.  Only params and results are sent to the workers.
+            Validation and the `barrister_pre` hook run in the server process.
+        """
+        if not self.contract.has_interface(iface_name):
+            raise RpcException(ERR_INVALID_REQ, "Unknown interface: '%s'" % iface_name)
+
+        iface = self.contract.interface(iface_name)
+        if cpu_bound is True:
+            cpu_bound = list(iface.functions)
+        elif not cpu_bound:
+            cpu_bound = [ ]
+        for func_name in cpu_bound:
+            if func_name not in iface.functions:
+                raise RpcException(ERR_METHOD_NOT_FOUND, 
+                                   "%s: Unknown function: '%s'" % (iface_name, func_name))
+        if cpu_bound and self.struct_classes:
+            raise RpcException(ERR_INVALID_REQ, 
+                               "cpu_bound functions cannot be used with struct_classes")
+
+        pre_hook = getattr(handler, "barrister_pre", None)
+        entries = { }
+        for func_name in iface.functions:
+            func = getattr(handler, func_name, None)
+            if not callable(func):
+                msg = "Handler for '%s' does not implement function: '%s'" % (iface_name, func_name)
+                raise RpcException(ERR_INVALID_REQ, msg)
+            if func_name in cpu_bound:
+                func = ProcessCall(self, iface_name, func_name)
+            function = iface.functions[func_name]
+            entries[function.full_name] = (func, function, pre_hook)
+
+        self.handlers[iface_name] = handler
+        self.dispatch.update(entries)
+        if cpu_bound:
+            self.cpu_handlers[iface_name] = handler
+            self.stop_cpu_workers()
+        elif iface_name in self.cpu_handlers:
+            del self.cpu_handlers[iface_name]
+            self.stop_cpu_workers()
+
+    def start_cpu_workers(self):
+        """
+        Starts the worker processes for cpu_bound functions and waits until each has 
+        loaded the handlers.  Called automatically by the first cpu_bound call, so calling 
+        it directly is only needed to avoid the startup cost on that call.  Restarts the
+        workers if handlers were added after they were started.
+        """
+        with self._cpu_lock:
+            if self._cpu_pool is None:
+                workers = self.cpu_workers or os.cpu_count() or 1
+                pool = concurrent.futures.ProcessPoolExecutor(workers, 
+                                                              initializer=_init_cpu_worker, 
+                                                              initargs=(dict(self.cpu_handlers),))
+                for f in [ pool.submit(os.getpid) for i in range(workers) ]:
+                    f.result()
+                self._cpu_pool = pool
+            return self._cpu_pool
+
+    def stop_cpu_workers(self):
+        """
+        Shuts down the worker processes for cpu_bound functions, if they are running
+        """
+        with self._cpu_lock:
+            pool = self._cpu_pool
+            self._cpu_pool = None
+        if pool:
+            pool.shutdown(wait=False)
+
+    def close(self):
+        """
+        Shuts down the thread pool this Server created for an int batch_executor, and the
+        worker processes for cpu_bound functions.  An Executor passed to the constructor
+        is left running.  Batches are run sequentially after the Server is closed.
+
+        A Server may also be used as a context manager, which calls close() on exit.
+        """
+        executor = self._own_executor
+        self._own_executor = None
+        if executor is not None:
+            if self.batch_executor is executor:
+                self.batch_executor = None
+            executor.shutdown(wait=True)
+        self.stop_cpu_workers()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def set_filters(self, filters):
         """
@@ -269,29 +1702,207 @@ class Server(object):
 
         :Parameters:
           req_json
-            JSON-RPC request serialized as JSON string
+            JSON-RPC request serialized as JSON string or UTF-8 bytes
+          props
+            Application defined properties to set on RequestContext for use with filters. 
+            For example: authentication headers.  Must be a dict.
+        """
+        return self.call_bytes(req_json, props).decode("utf-8")
+
+    def call_bytes(self, req_bytes, props=None):
+        """
+        Decodes req_bytes with the Server's codec, invokes self.call(), and returns the
+        response encoded with the codec as bytes.  Use this rather than call_json when
+        the transport reads and writes bytes, to avoid converting to and from str.
+        Returns empty bytes if the request only contained notifications.
+
+        :Parameters:
+          req_bytes
+            JSON-RPC request serialized as JSON bytes, bytearray or string
           props
             Application defined properties to set on RequestContext for use with filters. 
             For example: authentication headers.  Must be a dict.
         """
         try:
-            req = json.loads(req_json)
+            req = self._loads(req_bytes)
         except:
-            msg = "Unable to parse JSON: %s" % req_json
-            return json.dumps(err_response(None, -32700, msg))
-        return json.dumps(self.call(req, props))
+            return self._parse_error(req_bytes)
+        if self._is_idl_request(req):
+            resp = self._idl_response(req)
+        else:
+            resp = self._dumps(self.call(req, props))
+        if self.metrics is not None:
+            self._record_bytes(req, len(req_bytes), len(resp))
+        return resp
+
+    def call_stream(self, req, props=None):
+        """
+        Generator version of call().  Yields the response to each request in a batch as
+        soon as it completes, so the first results are available before the slowest
+        request in the batch finishes.  The requests run concurrently if the Server has a
+        batch_executor, and responses are yielded in completion order rather than request
+        order.  Nothing is yielded for notifications.
+
+        Closing the generator early cancels the batch requests that have not started.
+
+        :Parameters:
+          req
+            The request. Either a list of dicts, or a single dict.
+          props
+            Application defined properties to set on RequestContext for use with filters. 
+            Must be a dict.
+        """
+        if isinstance(req, list):
+            if len(req) < 1:
+                yield err_response(None, ERR_INVALID_REQ, "Invalid Request. Empty batch.")
+                return
+            for i, resp in self._iter_batch(req, props):
+                if resp is not None:
+                    yield resp
+        else:
+            resp = self._call_and_record(req, props)
+            if resp is not None:
+                yield resp
+
+    def call_stream_bytes(self, req_bytes, props=None):
+        """
+        Decodes req_bytes like call_bytes(), and yields each response from call_stream()
+        encoded with the Server's codec as a line of newline delimited JSON.
+
+        :Parameters:
+          req_bytes
+            JSON-RPC request serialized as JSON bytes, bytearray or string
+          props
+            Application defined properties to set on RequestContext for use with filters. 
+            Must be a dict.
+        """
+        try:
+            req = self._loads(req_bytes)
+        except:
+            yield self._parse_error(req_bytes) + b"\n"
+            return
+        size = 0
+        for resp in self.call_stream(req, props):
+            line = self.codec.dumps(resp) + b"\n"
+            size += len(line)
+            yield line
+        if self.metrics is not None:
+            self._record_bytes(req, len(req_bytes), size)
+
+    def _dumps(self, resp):
+        """
+        Encodes resp with the Server's codec.  Returns empty bytes if there is no response
+        because the request only contained notifications.
+        """
+        if resp is None:
+            return b""
+        return self.codec.dumps(resp)
+
+    def metrics_snapshot(self):
+        """
+        Returns Metrics.snapshot() for this Server's metrics, including the validation
+        stats of its ValidationPolicy and Bulkheads.stats() under the key "bulkheads",
+        or None if the Server has no Metrics
+        """
+        if self.metrics is None:
+            return None
+        snapshot = self.metrics.snapshot(self.validation)
+        if self.bulkheads is not None:
+            snapshot["bulkheads"] = self.bulkheads.stats()
+        return snapshot
+
+    def _metric_name(self, req):
+        """
+        Returns the name that calls of req are recorded under in the Server's Metrics
+        """
+        method = req.get("method") if isinstance(req, dict) else None
+        if isinstance(method, str) and (method in self.dispatch or method in _reserved_methods):
+            return method
+        return "(unknown)"
+
+    def _record_bytes(self, req, request_size, response_size):
+        name = None
+        if isinstance(req, dict):
+            name = self._metric_name(req)
+        self.metrics.record_bytes(name, request_size, response_size)
+
+    def idl_bytes(self):
+        """
+        Returns the Contract's parsed IDL encoded with the Server's codec.  The encoded
+        IDL is cached until the Server's contract or its checksum changes.
+        """
+        cached = self._idl_cache
+        checksum = self.contract.checksum
+        if cached is None or cached[0] != checksum or cached[1] is not self.contract:
+            cached = (checksum, self.contract, self.codec.dumps(self.contract.idl_parsed))
+            self._idl_cache = cached
+        return cached[2]
+
+    def _idl_result(self, req):
+        """
+        Returns the result of a barrister-idl request.  If the request params contain the
+        checksum of the Server's contract a short 'unchanged' result is returned instead
+        of the IDL.
+        """
+        checksum = self.contract.checksum
+        params = req.get("params")
+        if checksum and isinstance(params, list) and params and params[0] == checksum:
+            return { "checksum" : checksum, "unchanged" : True }
+        return self.contract.idl_parsed
+
+    def _is_idl_request(self, req):
+        """
+        True if req is a single barrister-idl request that can be answered by
+        _idl_response(), bypassing filters and metrics
+        """
+        return (not self.filters and self.metrics is None and isinstance(req, dict) and 
+                req.get("method") == "barrister-idl" and "id" in req and 
+                not getattr(req, "error", None))
+
+    def _idl_response(self, req):
+        """
+        Returns the encoded response to a barrister-idl request, embedding the cached
+        result of idl_bytes() rather than encoding the IDL again
+        """
+        result = self._idl_result(req)
+        if result is not self.contract.idl_parsed:
+            return self.codec.dumps({ "jsonrpc": "2.0", "id": req.get("id"), "result": result })
+        reqid = self.codec.dumps(req.get("id"))
+        return b'{"jsonrpc":"2.0","id":' + reqid + b',"result":' + self.idl_bytes() + b'}'
+
+    def _loads(self, req_json):
+        """
+        Decodes req_json, using the StreamingRequestDecoder if streaming_decode is enabled
+        """
+        if self.streaming_decode:
+            return StreamingRequestDecoder(self).decode(req_json)
+        else:
+            return self.codec.loads(req_json)
+
+    def _parse_error(self, req_json):
+        """
+        Returns the encoded error response for a request that could not be decoded
+        """
+        msg = "Unable to parse JSON: %s" % preview(req_json)
+        return self.codec.dumps(err_response(None, ERR_PARSE, msg))
 
     def call(self, req, props=None):
         """
         Executes a Barrister request and returns a response.  If the request is a list, then the
         response will also be a list.  If the request is an empty list, a RpcException is raised.
 
+        Requests without an `id` are JSON-RPC notifications.  They are executed, but the
+        handler's result is not validated and no response is returned for them.  If every
+        request is a notification, None is returned.
+
         :Parameters:
           req
             The request. Either a list of dicts, or a single dict.
           props
             Application defined properties to set on RequestContext for use with filters. 
-            For example: authentication headers.  Must be a dict.
+            For example: authentication headers.  Must be a dict.  The `deadline` property
+            is the time.monotonic() time after which requests (including the remaining 
+            requests in a batch) are rejected with ERR_DEADLINE_EXCEEDED.  See deadline_after()
         """
         resp = None
 
@@ -301,17 +1912,87 @@ class Server(object):
         if isinstance(req, list):
             if len(req) < 1:
                 resp = err_response(None, ERR_INVALID_REQ, "Invalid Request. Empty batch.")
+            elif self.batch_executor and len(req) > 1:
+                resp = self._call_batch(req, props)
             else:
                 resp = [ ]
                 for r in req:
-                    resp.append(self._call_and_format(r, props))
+                    resp.append(self._call_and_record(r, props))
+                resp = _without_notifications(resp)
         else:
-            resp = self._call_and_format(req, props)
+            resp = self._call_and_record(req, props)
 
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug("Response: %s" % str(resp))
         return resp
     
+    def _call_batch(self, req, props):
+        """
+        Runs the requests in a batch on the batch_executor and returns the responses in
+        request order
+        """
+        resp = [ None ] * len(req)
+        for i, r in self._iter_batch(req, props):
+            resp[i] = r
+        return _without_notifications(resp)
+
+    def _iter_batch(self, req, props):
+        """
+        Yields a tuple of (index, response) for each request in a batch as it completes.
+        The response is None for notifications.
+
+        If the Server has a batch_executor the requests run on it, with at most
+        batch_concurrency running at once.  An exception raised while processing one
+        request (e.g. by a filter) becomes the error response for that request only.
+        Otherwise the requests run one at a time on the calling thread.
+        """
+        if not self.batch_executor or len(req) < 2:
+            for i, r in enumerate(req):
+                yield i, self._call_and_record(r, props)
+            return
+
+        pending = { }
+        todo = iter(enumerate(req))
+        limit = self.batch_concurrency or len(req)
+
+        def submit():
+            entry = next(todo, None)
+            if entry is not None:
+                i, r = entry
+                pending[self.batch_executor.submit(self._call_and_record, r, props)] = i
+
+        for i in range(min(limit, len(req))):
+            submit()
+
+        try:
+            while pending:
+                done, not_done = concurrent.futures.wait(list(pending.keys()), 
+                                                         return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    i = pending.pop(f)
+                    try:
+                        resp = f.result()
+                    except:
+                        resp = None
+                        if isinstance(req[i], dict) and "id" in req[i]:
+                            resp = self._exc_response(req[i])
+                    submit()
+                    yield i, resp
+        finally:
+            for f in pending:
+                f.cancel()
+
+    def _call_and_record(self, req, props=None):
+        """
+        Calls _call_and_format() and records the call in the Server's Metrics, if any
+        """
+        if self.metrics is None:
+            return self._call_and_format(req, props)
+        start = time.perf_counter()
+        resp = self._call_and_format(req, props)
+        self.metrics.record(self._metric_name(req), resp, time.perf_counter() - start)
+        return resp
+
     def _call_and_format(self, req, props=None):
         """
         Invokes a single request against a handler using _call() and traps any errors,
@@ -325,100 +2006,461 @@ class Server(object):
             Application defined properties to set on RequestContext for use with filters. 
             For example: authentication headers.  Must be a dict.
         """
-        if not isinstance(req, dict):
-            return err_response(None, ERR_INVALID_REQ, 
-                             "Invalid Request. %s is not an object." % str(req))
-
-        reqid = None
-        if "id" in req:
-            reqid = req["id"]
-
-        if props == None:
-            props = { }
-        context = RequestContext(props, req)
+        context, resp = self._new_context(req, props)
+        if context is None:
+            return resp
 
         if self.filters:
             for f in self.filters:
                 f.pre(context)
 
         if context.error:
-            return context.error
+            return None if context.notification else context.error
 
         resp = None
+        token = _current_context.set(context)
         try:
             result = self._call(context)
-            resp = { "jsonrpc": "2.0", "id": reqid, "result": result }
-        except RpcException as e:
-            resp = err_response(reqid, e.code, e.msg, e.data)
+            if not context.notification:
+                resp = { "jsonrpc": "2.0", "id": req.get("id"), "result": result }
         except:
-            self.log.exception("Error processing request: %s" % str(req))
-            resp = err_response(reqid, ERR_UNKNOWN, "Server error. Check logs for details.")
+            resp = self._exc_response(req)
+            if context.notification:
+                resp = None
+        finally:
+            _current_context.reset(token)
         
         if self.filters:
             context.response = resp
             for f in self.filters:
                 f.post(context)
 
-        return resp
+        return resp
+
+    def _new_context(self, req, props):
+        """
+        Returns a tuple of (RequestContext, None) for a well formed single request, or
+        (None, error response) if the request is rejected before it reaches the filters.
+        """
+        if not isinstance(req, dict):
+            return None, err_response(None, ERR_INVALID_REQ, 
+                                      "Invalid Request. %s is not an object." % preview(req))
+
+        if isinstance(req, DecodedRequest) and req.error:
+            return None, (req.error if "id" in req else None)
+
+        if props == None:
+            props = { }
+        return RequestContext(props, req), None
+
+    def _exc_response(self, req):
+        """
+        Formats the exception currently being handled as a JSON-RPC error response for req.
+        RpcExceptions are passed to the client.  Other exceptions are logged and reported
+        as a generic server error.
+        """
+        e = sys.exc_info()[1]
+        reqid = req.get("id")
+        if isinstance(e, RpcException):
+            return err_response(reqid, e.code, e.msg, e.data)
+        self.log.exception("Error processing request: %s" % preview(req))
+        return err_response(reqid, ERR_UNKNOWN, "Server error. Check logs for details.")
+
+    def _call(self, context):
+        """
+        Executes a single request against a handler.  If the req.method == 'barrister-idl', the
+        Contract IDL JSON structure is returned.  Otherwise the method is resolved to a handler
+        based on the interface name, and the appropriate function is called on the handler.
+
+        :Parameter:
+          req
+            A dict representing a valid JSON-RPC 2.0 request.  'method' must be provided.
+        """
+        req = context.request
+        context.check_deadline()
+        method = self._method(req)
+        if method == "barrister-idl":
+            return self._idl_result(req)
+        elif method == "barrister-metrics" and self.metrics is not None and self.metrics.expose:
+            return self.metrics_snapshot()
+
+        func, function, pre_hook, params = self._prepare(method, req)
+
+        if pre_hook:
+            pre_hook(context, params)
+
+        # notifications have no response to cache, share or validate
+        notification = context.notification
+        cache = None if notification else self.response_cache
+        cache_key = cache and cache.key(function, params)
+        if cache_key is not None:
+            hit, result = cache.get(cache_key)
+            if hit:
+                return result
+
+        # callers sharing another call's result do not hold a bulkhead slot
+        flight = None if notification else self.singleflight
+        flight_key = flight and flight.key(function, params)
+        if flight_key is not None:
+            result = flight.do(flight_key, self._invoke, context, func, function, params,
+                               timeout=context.remaining())
+        else:
+            result = self._invoke(context, func, function, params, not notification)
+
+        if cache_key is not None:
+            cache.put(cache_key, result)
+        return result
+
+    def _invoke(self, context, func, function, params, validate=True):
+        """
+        Enters the bulkheads for function, then calls the handler method func and 
+        validates its result
+        """
+        bulkheads = self.bulkheads
+        chain = bulkheads and bulkheads.enter(function, context.deadline)
+        try:
+            if chain:
+                # the call may have waited in a bulkhead queue
+                context.check_deadline()
+            result = func(*params)
+        finally:
+            if chain:
+                bulkheads.exit(chain)
+        if validate:
+            self.validation.validate_response(function, result)
+        return result
+
+    def _method(self, req):
+        """
+        Returns the 'method' member of req, or raises RpcException if it is missing
+        """
+        if "method" not in req:
+            raise RpcException(ERR_INVALID_REQ, "Invalid Request. No 'method'.")
+        return req["method"]
+
+    def _prepare(self, method, req):
+        """
+        Resolves method using the dispatch table, validates the request params according
+        to the ValidationPolicy, and converts them to struct classes if enabled.
+
+        Returns a tuple of (handler method, Function, pre hook or None, params list)
+        """
+        entry = self.dispatch.get(method)
+        if entry is None:
+            entry = self._resolve_function(method)
+        func, function, pre_hook = entry
+
+        params = req.get("params")
+        if params is None:
+            params = [ ]
+
+        if not getattr(req, "params_checked", False):
+            self.validation.validate_request(function, params)
+
+        if self.struct_classes:
+            params = function.decode_params(params)
+
+        return func, function, pre_hook, params
+
+    def _resolve_function(self, method):
+        """
+        Returns the dispatch table entry for the given JSON-RPC method name: a tuple of 
+        (handler method, Function, pre hook or None).  Raises RpcException if the method 
+        does not exist, or if no handler has been registered for its interface.
+        """
+        entry = self.dispatch.get(method)
+        if entry is not None:
+            return entry
+        iface_name, func_name = unpack_method(method)
+        if iface_name not in self.handlers:
+            msg = "No implementation of '%s' found" % (iface_name)
+            raise RpcException(ERR_METHOD_NOT_FOUND, msg)
+        self.contract.interface(iface_name).function(func_name)
+        msg = "Method '%s' not found" % (method)
+        raise RpcException(ERR_METHOD_NOT_FOUND, msg)
+
+def _without_notifications(resp):
+    """
+    Removes the None entries left by notifications from a batch response list.  Returns
+    None if the batch only contained notifications.
+    """
+    resp = [ r for r in resp if r is not None ]
+    return resp or None
+
+_cpu_worker_handlers = { }
+
+def _init_cpu_worker(handlers):
+    _cpu_worker_handlers.update(handlers)
+
+def _call_cpu_worker(iface_name, func_name, params):
+    return getattr(_cpu_worker_handlers[iface_name], func_name)(*params)
+
+class ProcessCall(object):
+    """
+    Stored in a Server's dispatch table in place of the handler method for cpu_bound
+    functions.  Calling it runs the function in one of the Server's worker processes
+    and returns the result, or raises the exception raised by the function.
+    """
+
+    def __init__(self, server, iface_name, func_name):
+        self.server = server
+        self.iface_name = iface_name
+        self.func_name = func_name
 
-    def _call(self, context):
+    def submit(self, *params):
         """
-        Executes a single request against a handler.  If the req.method == 'barrister-idl', the
-        Contract IDL JSON structure is returned.  Otherwise the method is resolved to a handler
-        based on the interface name, and the appropriate function is called on the handler.
-
-        :Parameter:
-          req
-            A dict representing a valid JSON-RPC 2.0 request.  'method' must be provided.
+        Submits the call to a worker process and returns a concurrent.futures.Future
         """
-        req = context.request
-        if "method" not in req:
-            raise RpcException(ERR_INVALID_REQ, "Invalid Request. No 'method'.")
+        pool = self.server._cpu_pool or self.server.start_cpu_workers()
+        return pool.submit(_call_cpu_worker, self.iface_name, self.func_name, list(params))
 
-        method = req["method"]
+    def __call__(self, *params):
+        return self.submit(*params).result()
 
-        if method == "barrister-idl":
-            return self.contract.idl_parsed
+class DecodedRequest(dict):
+    """
+    A JSON-RPC request dict produced by StreamingRequestDecoder.  In addition to the
+    request members it has the following properties:
 
-        iface_name, func_name = unpack_method(method)
+    * `params_checked` - True if the decoder already applied the Server's request 
+      ValidationPolicy to the params
+    * `error` - JSON-RPC error response dict if the decoder rejected the request, 
+      otherwise None
+    """
 
-        if iface_name in self.handlers:
-            iface_impl = self.handlers[iface_name]
-            func = getattr(iface_impl, func_name)
-            if func:
-                if "params" in req:
-                    params = req["params"]
-                else:
-                    params = [ ]
+    def __init__(self):
+        dict.__init__(self)
+        self.params_checked = False
+        self.error = None
 
-                if self.validate_req:
-                    self.contract.validate_request(iface_name, func_name, params)
+_ws_re   = re.compile(r'[ \t\n\r]*')
+_skip_re = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.DOTALL)
 
-                if hasattr(iface_impl, "barrister_pre"):
-                    pre_hook = getattr(iface_impl, "barrister_pre")
-                    pre_hook(context, params)
+class StreamingRequestDecoder(object):
+    """
+    Incrementally decodes a JSON-RPC request (or batch of requests) for a Server.
+
+    Each request object is scanned member by member.  As soon as the 'method' member
+    is read it is resolved against the Server's handlers and Contract.  Params are
+    decoded one element at a time and each element is validated as soon as it is
+    decoded.  Once a request is rejected, the rest of it is skipped over without
+    being converted to Python objects, apart from the 'id' member, which is needed
+    for the error response.
+    """
 
-                if params:
-                    result = func(*params)
-                else:
-                    result = func()
+    def __init__(self, server):
+        """
+        Creates a new StreamingRequestDecoder
 
-                if self.validate_resp:
-                    self.contract.validate_response(iface_name, func_name, result)
-                return result
+        :Parameters:
+          server
+            Server instance used to resolve methods and validate params
+        """
+        self.server  = server
+        self.decoder = json.JSONDecoder()
+
+    def decode(self, s):
+        """
+        Decodes s and returns either a DecodedRequest, or a list for a batch request.
+        Raises ValueError if s is not valid JSON.
+
+        :Parameters:
+          s
+            JSON-RPC request serialized as a JSON string, or UTF-8 bytes or bytearray
+        """
+        if isinstance(s, (bytes, bytearray)):
+            s = s.decode("utf-8")
+        i = self._ws(s, 0)
+        if s.startswith("{", i):
+            req, i = self._request(s, i)
+        elif s.startswith("[", i):
+            req = [ ]
+            i = self._ws(s, i+1)
+            if s.startswith("]", i):
+                i += 1
             else:
-                msg = "Method '%s' not found" % (method)
-                raise RpcException(ERR_METHOD_NOT_FOUND, msg)
+                while True:
+                    if s.startswith("{", i):
+                        entry, i = self._request(s, i)
+                    else:
+                        entry, i = self.decoder.raw_decode(s, i)
+                    req.append(entry)
+                    i = self._next(s, i, "]")
+                    if i < 0:
+                        i = -i
+                        break
         else:
-            msg = "No implementation of '%s' found" % (iface_name)
-            raise RpcException(ERR_METHOD_NOT_FOUND, msg)        
+            req, i = self.decoder.raw_decode(s, i)
+        if self._ws(s, i) != len(s):
+            raise ValueError("Extra data at position %d" % i)
+        return req
+
+    def _request(self, s, i):
+        req = DecodedRequest()
+        function = None
+        params_pos = None
+        error = None
+        i = self._ws(s, i+1)
+        if s.startswith("}", i):
+            return req, i+1
+
+        while True:
+            key, i = self.decoder.raw_decode(s, i)
+            if not isinstance(key, str):
+                raise ValueError("Expected object key at position %d" % i)
+            i = self._ws(s, i)
+            if not s.startswith(":", i):
+                raise ValueError("Expected ':' at position %d" % i)
+            i = self._ws(s, i+1)
+
+            if error and key != "id":
+                i = self._skip(s, i)
+            elif key == "method" and key in req:
+                # params may already have been checked against the first method
+                error = RpcException(ERR_INVALID_REQ, "Invalid Request. Duplicate 'method'.")
+                i = self._skip(s, i)
+            elif key == "method":
+                req[key], i = self.decoder.raw_decode(s, i)
+                try:
+                    function = self._resolve(req[key])
+                except RpcException as e:
+                    error = e
+            elif key == "params" and function is None:
+                # method not seen yet. skip params now and decode them once it is known
+                params_pos = i
+                i = self._skip(s, i)
+            elif key == "params":
+                try:
+                    req[key], req.params_checked, i = self._params(s, i, function)
+                except RpcException as e:
+                    error = e
+                    i = self._skip(s, i)
+            else:
+                req[key], i = self.decoder.raw_decode(s, i)
+
+            i = self._next(s, i, "}")
+            if i < 0:
+                i = -i
+                break
+
+        if params_pos is not None and not error:
+            if function:
+                try:
+                    req["params"], req.params_checked = self._params(s, params_pos, function)[:2]
+                except RpcException as e:
+                    error = e
+            else:
+                req["params"] = self.decoder.raw_decode(s, params_pos)[0]
+
+        if error:
+            req.error = err_response(req.get("id"), error.code, error.msg, error.data)
+        return req, i
+
+    def _resolve(self, method):
+        if isinstance(method, str) and method not in _reserved_methods:
+            return self.server._resolve_function(method)[1]
+        return None
+
+    def _params(self, s, i, function):
+        """
+        Decodes the params list starting at s[i], validating each element as it
+        is decoded.  Returns a tuple of (params, params_checked, index after params).
+        """
+        if not s.startswith("[", i):
+            params, i = self.decoder.raw_decode(s, i)
+            return params, False, i
+
+        policy = self.server.validation
+        validate = policy._should_validate(function, 0)
+        timed = validate and policy.collect_stats
+        expected = len(function.params)
+        params = [ ]
+        elapsed = 0.0
+        i = self._ws(s, i+1)
+        if s.startswith("]", i):
+            i += 1
+        else:
+            while True:
+                if len(params) == expected:
+                    function.check_arity(self._count_rest(s, i) + expected)
+                val, i = self.decoder.raw_decode(s, i)
+                if timed:
+                    start = time.perf_counter()
+                    try:
+                        function.validate_param(len(params), val)
+                    except RpcException:
+                        policy._record(function, "request", 
+                                       elapsed + time.perf_counter() - start, True)
+                        raise
+                    elapsed += time.perf_counter() - start
+                elif validate:
+                    function.validate_param(len(params), val)
+                params.append(val)
+                i = self._next(s, i, "]")
+                if i < 0:
+                    i = -i
+                    break
+
+        function.check_arity(len(params))
+        if timed:
+            policy._record(function, "request", elapsed, False)
+        elif not validate and policy.collect_stats:
+            policy._skipped(function, "request")
+        return params, True, i
+
+    def _count_rest(self, s, i):
+        """
+        Returns the number of values remaining in the list that contains s[i]
+        """
+        count = 0
+        while True:
+            i = self._skip(s, i)
+            count += 1
+            i = self._next(s, i, "]")
+            if i < 0:
+                return count
+
+    def _next(self, s, i, close):
+        """
+        Consumes the separator after a list element or object member. Returns the
+        index of the next element, or the negated index after the closing bracket if
+        there are no more elements.
+        """
+        i = self._ws(s, i)
+        if s.startswith(",", i):
+            return self._ws(s, i+1)
+        elif s.startswith(close, i):
+            return -(i+1)
+        else:
+            raise ValueError("Expected ',' or '%s' at position %d" % (close, i))
+
+    def _ws(self, s, i):
+        return _ws_re.match(s, i).end()
+
+    def _skip(self, s, i):
+        """
+        Returns the index just past the JSON value starting at s[i] without
+        converting it to Python objects.
+        """
+        if not s.startswith(("{", "["), i):
+            return self.decoder.raw_decode(s, i)[1]
+        depth = 0
+        for m in _skip_re.finditer(s, i):
+            c = m.group()
+            if c == "[" or c == "{":
+                depth += 1
+            elif c == "]" or c == "}":
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+        raise ValueError("Unterminated value at position %d" % i)
 
 class HttpTransport(object):
     """
     A client transport that uses urllib2 to make requests against a HTTP server.
     """
 
-    def __init__(self, url, handlers=None, headers=None):
+    def __init__(self, url, handlers=None, headers=None, codec=None, timeout=None):
         """
         Creates a new HttpTransport
 
@@ -430,31 +2472,115 @@ class HttpTransport(object):
           headers
             Optional list of HTTP headers to set on requests.  Note that Content-Type will always be set
             automatically to "application/json"
+          codec
+            Codec used to encode requests and decode responses. Defaults to JsonCodec
+          timeout
+            Default number of seconds to wait for a response.  None to wait indefinitely.
         """
         if not headers:
             headers = { }
         headers['Content-Type'] = 'application/json'
         self.url = url
         self.headers = headers
+        self.codec = codec or JsonCodec()
+        self.timeout = timeout
         if handlers:
             self.opener = urllib.request.build_opener(*handlers)
         else:
             self.opener = urllib.request.build_opener()
         
-    def request(self, req):
+    def request(self, req, timeout=None):
+        """
+        Makes a request against the server and returns the deserialized result, or None
+        if the server sent an empty response because the request only contained
+        notifications.
+
+        :Parameters:
+          req
+            List or dict representing a JSON-RPC formatted request
+          timeout
+            Number of seconds to wait for the response.  Defaults to the transport's timeout.
+            The timeout is sent to the server in the X-Barrister-Timeout header, and a
+            RpcException with code ERR_DEADLINE_EXCEEDED is raised if it expires.
         """
-        Makes a request against the server and returns the deserialized result.
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            f = self._open(req, timeout)
+            resp = f.read()
+            f.close()
+        except (socket.timeout, urllib.error.URLError) as e:
+            _raise_timeout(e, timeout)
+        if not resp:
+            # the request only contained notifications
+            return None
+        return self.codec.loads(resp)
+
+    def request_stream(self, req, timeout=None):
+        """
+        Makes a request against the server, asking for a streamed response, and returns
+        an iterator of the deserialized responses in the order the server completes them.
+        If the server does not stream its response, the iterator yields the entries of the
+        complete response once it has been read.
 
         :Parameters:
           req
             List or dict representing a JSON-RPC formatted request
+          timeout
+            Number of seconds to wait for the whole response.  Defaults to the transport's
+            timeout.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            f = self._open(req, timeout, STREAM_CONTENT_TYPE)
+        except (socket.timeout, urllib.error.URLError) as e:
+            _raise_timeout(e, timeout)
+        return self._read_stream(f, timeout)
+
+    def _open(self, req, timeout, accept=None):
+        """
+        Sends req and returns the HTTP response
         """
-        data = json.dumps(req)
-        req = urllib.request.Request(self.url, data, self.headers)
-        f = self.opener.open(req)
-        resp = f.read()
-        f.close()
-        return json.loads(resp)
+        data = self.codec.dumps(req)
+        headers = self.headers
+        if timeout is not None or accept:
+            headers = dict(headers)
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        else:
+            headers[TIMEOUT_HEADER] = "%.3f" % timeout
+        if accept:
+            headers["Accept"] = accept
+        req = urllib.request.Request(self.url, data, headers)
+        return self.opener.open(req, timeout=timeout)
+
+    def _read_stream(self, f, timeout):
+        try:
+            if f.headers.get_content_type() != STREAM_CONTENT_TYPE:
+                body = f.read()
+                resp = self.codec.loads(body) if body else [ ]
+                if isinstance(resp, dict):
+                    resp = [ resp ]
+                for r in resp:
+                    yield r
+                return
+            for line in f:
+                if line.strip():
+                    yield self.codec.loads(line)
+        except (socket.timeout, urllib.error.URLError) as e:
+            _raise_timeout(e, timeout)
+        finally:
+            f.close()
+
+def _raise_timeout(e, timeout):
+    """
+    Raises RpcException with code ERR_DEADLINE_EXCEEDED if e is a socket timeout raised
+    by urllib, otherwise re-raises e
+    """
+    if isinstance(e, socket.timeout) or isinstance(getattr(e, "reason", None), socket.timeout):
+        raise RpcException(ERR_DEADLINE_EXCEEDED, "Request timed out after %ss" % timeout)
+    raise e
 
 class InProcTransport(object):
     """
@@ -471,15 +2597,37 @@ class InProcTransport(object):
         """
         self.server = server
 
-    def request(self, req):
+    def request(self, req, timeout=None):
         """
         Performs request against the given server.
 
         :Parameters:
           req
             List or dict representing a JSON-RPC formatted request
+          timeout
+            Optional number of seconds the request may take.  Passed to the server as the
+            `deadline` prop.
+        """
+        if timeout is None:
+            return self.server.call(req)
+        return self.server.call(req, { "deadline" : deadline_after(timeout) })
+
+    def request_stream(self, req, timeout=None):
+        """
+        Performs request against the given server and returns an iterator of the 
+        responses in the order the server completes them.  See Server.call_stream()
+
+        :Parameters:
+          req
+            List or dict representing a JSON-RPC formatted request
+          timeout
+            Optional number of seconds the request may take.  Passed to the server as the
+            `deadline` prop.
         """
-        return self.server.call(req)
+        props = None
+        if timeout is not None:
+            props = { "deadline" : deadline_after(timeout) }
+        return self.server.call_stream(req, props)
 
 class Client(object):
     """
@@ -500,39 +2648,86 @@ class Client(object):
     """
 
     def __init__(self, transport, validate_request=True, validate_response=True,
-                 id_gen=idgen_uuid):
+                 id_gen=idgen_uuid, validation_policy=None, struct_classes=False,
+                 contract=None, check_contract=False, timeout=None):
         """
         Creates a new Client for the given transport. When the constructor is called the
-        client immediately makes a request to the server to load the IDL.  It then creates
-        proxies for each interface in the IDL.  After constructing a client you can immediately
-        begin making requests against the proxies.
+        client immediately makes a request to the server to load the IDL, unless a contract
+        is provided.  It then creates proxies for each interface in the IDL.  After 
+        constructing a client you can immediately begin making requests against the proxies.
 
         :Parameters:
           transport
             Transport object to use to make requests
           validate_request
             If True, the request will be validated against the Contract and a RpcException raised if 
-            it does not match the IDL
+            it does not match the IDL.  May also be a percentage of requests to validate.  See 
+            ValidationPolicy.
           validate_response
             If True, the response will be validated against the Contract and a RpcException raised if 
-            it does not match the IDL
+            it does not match the IDL.  May also be a percentage of responses to validate.  See 
+            ValidationPolicy.
           id_gen
             A callable to use to create request IDs.  JSON-RPC request IDs are only used by Barrister
             to correlate requests with responses when using a batch, but your application may use them
             for logging or other purposes.  UUIDs are used by default, but you can substitute another
             function if you prefer something shorter.
+          validation_policy
+            Optional ValidationPolicy that controls validation per interface and function. 
+            If provided, validate_request and validate_response are ignored.
+          struct_classes
+            If True, struct values in results are converted to instances of the classes
+            returned by Contract.struct_class().  Params may be passed as either dicts
+            or StructObject instances.
+          contract
+            Optional Contract to use instead of loading the IDL from the server
+          check_contract
+            If True and a contract is provided, its checksum is sent to the server, which
+            only returns the IDL if the server's contract is different
+          timeout
+            Default number of seconds to wait for each call, sent to the server so it can
+            drop calls the client has given up on.  None to use the transport's default.
         """
         logging.basicConfig()
         self.log = logging.getLogger("barrister")
         self.transport = transport
-        self.validate_req  = validate_request
-        self.validate_resp = validate_response
+        self.struct_classes = struct_classes
+        if validation_policy is None:
+            validation_policy = ValidationPolicy(validate_request, validate_response)
+        self.validation = validation_policy
         self.id_gen = id_gen
-        req = {"jsonrpc": "2.0", "method": "barrister-idl", "id": "1"}
-        resp = transport.request(req)
-        self.contract = Contract(resp["result"])
-        for k, v in list(self.contract.interfaces.items()):
-            setattr(self, k, InterfaceClientProxy(self, v))
+        self.timeout = timeout
+        if contract is None or (check_contract and contract.checksum):
+            req = {"jsonrpc": "2.0", "method": "barrister-idl", "id": "1"}
+            if contract is not None:
+                req["params"] = [ contract.checksum ]
+            resp = self._request(req, timeout)
+            if "error" in resp:
+                e = resp["error"]
+                raise RpcException(e["code"], e["message"], safe_get(e, "data"))
+            result = resp["result"]
+            if not (isinstance(result, dict) and result.get("unchanged")):
+                contract = Contract(result)
+        self.contract = contract
+
+    def __getattr__(self, name):
+        return _interface_proxy(self, self.__dict__.get("contract"), name)
+
+    @property
+    def validate_req(self):
+        return self.validation.request
+
+    @validate_req.setter
+    def validate_req(self, mode):
+        self.validation.set_default(request=mode)
+
+    @property
+    def validate_resp(self):
+        return self.validation.response
+
+    @validate_resp.setter
+    def validate_resp(self, mode):
+        self.validation.set_default(response=mode)
 
     def get_meta(self):
         """
@@ -540,7 +2735,7 @@ class Client(object):
         """
         return self.contract.meta
 
-    def call(self, iface_name, func_name, params):
+    def call(self, iface_name, func_name, params, timeout=None):
         """
         Makes a single RPC request and returns the result.
 
@@ -551,21 +2746,92 @@ class Client(object):
             Function to call on the interface
           params
             List of parameters to pass to the function
+          timeout
+            Number of seconds to wait for the result.  Defaults to the Client's timeout.
         """
         req  = self.to_request(iface_name, func_name, params)
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug("Request: %s" % str(req))
-        resp = self.transport.request(req)
+        resp = self._request(req, timeout)
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug("Response: %s" % str(resp))
         return self.to_result(iface_name, func_name, resp)
 
+    def invoke(self, function, method, params, timeout=None):
+        """
+        Makes a single RPC request for a Function that has already been resolved from
+        the Contract, and returns the result.  Used by the client stubs generated by
+        `barrister --python`, which resolve the Function and method name once.
+
+        :Parameters:
+          function
+            Function instance from this Client's Contract
+          method
+            JSON-RPC method name.  e.g. "UserService.get"
+          params
+            List of parameters to pass to the function
+          timeout
+            Number of seconds to wait for the result.  Defaults to the Client's timeout.
+        """
+        self.validation.validate_request(function, params)
+        req = { "jsonrpc": "2.0", "id": self.id_gen(), "method": method, "params": params }
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Request: %s" % str(req))
+        resp = self._request(req, timeout)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Response: %s" % str(resp))
+        return self._result(function, resp)
+
+    def notify(self, iface_name, func_name, params, timeout=None):
+        """
+        Sends a JSON-RPC notification: a request without an id.  The server calls the
+        handler but sends no response, so the result and any error are discarded and
+        None is returned.  Useful for high volume calls, such as events or logging,
+        whose results the caller does not need.
+
+        :Parameters:
+          iface_name
+            Interface name to call
+          func_name
+            Function to call on the interface
+          params
+            List of parameters to pass to the function
+          timeout
+            Number of seconds to wait for the server to accept the notification.
+            Defaults to the Client's timeout.
+        """
+        self._request(self.to_notification(iface_name, func_name, params), timeout)
+
+    def _request(self, req, timeout):
+        """
+        Sends req using the transport.  The timeout is only passed to the transport if one
+        is set, so transports written before timeouts were supported keep working.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is None:
+            return self.transport.request(req)
+        return self.transport.request(req, timeout=timeout)
+
+    def _request_stream(self, req, timeout):
+        """
+        Sends req using the transport's request_stream() and returns an iterator of the
+        responses.  Transports without request_stream() return the complete response.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if not hasattr(self.transport, "request_stream"):
+            return iter(self._request(req, timeout) or [ ])
+        if timeout is None:
+            return self.transport.request_stream(req)
+        return self.transport.request_stream(req, timeout=timeout)
+
     def to_request(self, iface_name, func_name, params):
         """
         Converts the arguments to a JSON-RPC request dict.  The 'id' field is populated
         using the id_gen function passed to the Client constructor.
 
-        If validate_request==True on the Client constructor, the params are validated
+        If the Client's ValidationPolicy selects this call, the params are validated
         against the expected types for the function and a RpcException raised if they are
         invalid.
 
@@ -577,20 +2843,29 @@ class Client(object):
           params
             List of parameters to pass to the function
         """
-        if self.validate_req:
-            self.contract.validate_request(iface_name, func_name, params)
-            
+        function = self.contract.interface(iface_name).function(func_name)
+        self.validation.validate_request(function, params)
+
         method = "%s.%s" % (iface_name, func_name)
         reqid = self.id_gen()
         return { "jsonrpc": "2.0", "id": reqid, "method": method, "params": params }
 
+    def to_notification(self, iface_name, func_name, params):
+        """
+        Same as to_request(), but returns a JSON-RPC notification, which has no 'id'
+        """
+        function = self.contract.interface(iface_name).function(func_name)
+        self.validation.validate_request(function, params)
+        method = "%s.%s" % (iface_name, func_name)
+        return { "jsonrpc": "2.0", "method": method, "params": params }
+
     def to_result(self, iface_name, func_name, resp):
         """
         Takes a JSON-RPC response and checks for an "error" slot. If it exists,
         a RpcException is raised.  If no "error" slot exists, the "result" slot is 
         returned.
 
-        If validate_response==True on the Client constructor, the result is validated
+        If the Client's ValidationPolicy selects this call, the result is validated
         against the expected return type for the function and a RpcException raised if it is
         invalid.
 
@@ -602,6 +2877,10 @@ class Client(object):
           resp
             Dict formatted as a JSON-RPC response
         """
+        function = self.contract.interface(iface_name).function(func_name)
+        return self._result(function, resp)
+
+    def _result(self, function, resp):
         if "error" in resp:
             e = resp["error"]
             data = None
@@ -611,8 +2890,9 @@ class Client(object):
             
         result = resp["result"]
         
-        if self.validate_resp:
-            self.contract.validate_response(iface_name, func_name, result)
+        self.validation.validate_response(function, result)
+        if self.struct_classes:
+            result = function.decode_result(result)
         return result
 
     def start_batch(self):
@@ -622,10 +2902,22 @@ class Client(object):
         """
         return Batch(self)
 
+def _interface_proxy(owner, contract, name):
+    """
+    Creates the InterfaceClientProxy for the interface with the given name the first time
+    it is accessed as an attribute of a Client or Batch, and caches it on the owner.
+    Raises AttributeError if the Contract has no such interface.
+    """
+    if contract is None or name.startswith("__") or name not in contract.interfaces:
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(owner).__name__, name))
+    proxy = InterfaceClientProxy(owner, contract.interfaces[name])
+    setattr(owner, name, proxy)
+    return proxy
+
 class InterfaceClientProxy(object):
     """
-    Internal class used by the Client.  One instance is created per Client per interface found
-    on the IDL returned from the server.
+    Internal class used by the Client.  One instance is created per Client per interface
+    found on the IDL returned from the server, the first time the interface is used.
     """
 
     def __init__(self, client, iface):
@@ -636,13 +2928,19 @@ class InterfaceClientProxy(object):
           client
             Client instance to associate with this proxy
           iface
-            Dict interface from the parsed IDL.  All functions defined on this interface will
-            be defined on this proxy class as callables.
+            Interface from the Contract.  Each function defined on this interface is
+            available on this proxy as a callable, created when first accessed.
         """
         self.client = client
-        iface_name = iface.name
-        for func_name, func in list(iface.functions.items()):
-            setattr(self, func_name, self._caller(iface_name, func_name))
+        self._iface = iface
+
+    def __getattr__(self, name):
+        iface = self.__dict__.get("_iface")
+        if iface is None or name not in iface.functions:
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+        caller = self._caller(iface.name, name)
+        setattr(self, name, caller)
+        return caller
 
     def _caller(self, iface_name, func_name):
         """
@@ -681,8 +2979,10 @@ class Batch(object):
         self.client = client
         self.req_list = [ ]
         self.sent = False
-        for k, v in list(client.contract.interfaces.items()):
-            setattr(self, k, InterfaceClientProxy(self, v))
+
+    def __getattr__(self, name):
+        client = self.__dict__.get("client")
+        return _interface_proxy(self, client and client.contract, name)
 
     def call(self, iface_name, func_name, params):
         """
@@ -698,21 +2998,36 @@ class Batch(object):
             req = self.client.to_request(iface_name, func_name, params)
             self.req_list.append(req)
 
-    def send(self):
+    def notify(self, iface_name, func_name, params):
+        """
+        Adds a notification to the batch.  Notifications have no response, so they are
+        not included in the list returned by send().
+        """
+        if self.sent:
+            raise Exception("Batch already sent. Cannot add more calls.")
+        self.req_list.append(self.client.to_notification(iface_name, func_name, params))
+
+    def send(self, timeout=None):
         """
         Sends the batch request to the server and returns a list of RpcResponse
         objects.  The list will be in the order that the requests were made to
-        the batch.  Note that the RpcResponse objects may contain an error or a 
+        the batch, excluding notifications.  Note that the RpcResponse objects may contain an error or a 
         successful result.  When you iterate through the list, you must test for
         response.error.
         
         send() may not be called more than once.
+
+        :Parameters:
+          timeout
+            Number of seconds to wait for the whole batch.  Defaults to the Client's
+            timeout.  Requests the server has not started when it expires fail with
+            ERR_DEADLINE_EXCEEDED.
         """
         if self.sent:
             raise Exception("Batch already sent. Cannot send() again.")
         else:
             self.sent = True
-            results = self.client.transport.request(self.req_list)
+            results = self.client._request(self.req_list, timeout) or [ ]
             
             id_to_method = { }
             by_id = { }
@@ -722,21 +3037,60 @@ class Batch(object):
 
             in_req_order = [ ]
             for req in self.req_list:
-                reqid  = req["id"]
-                result = None
-                error  = None
-                resp   = safe_get(by_id, reqid)
-                if resp == None:
-                    msg = "Batch response missing result for request id: %s" % reqid
-                    error = RpcException(ERR_INVALID_RESP, msg)
-                else:
-                    r_err = safe_get(resp, "error")
-                    if r_err == None:
-                        result = resp["result"]
-                    else:
-                        error = RpcException(r_err["code"], r_err["message"], safe_get(r_err, "data"))
-                in_req_order.append(RpcResponse(req, result, error))
+                if "id" not in req:
+                    continue
+                in_req_order.append(self._to_response(req, safe_get(by_id, req["id"])))
             return in_req_order
+
+    def send_stream(self, timeout=None):
+        """
+        Sends the batch request to the server, asking it to stream the responses, and 
+        returns an iterator that yields a RpcResponse for each request as its response
+        arrives.  Responses are yielded in the order the server completes them, so a slow
+        request does not hold up the results of faster ones.  Test `response.request` to
+        see which request a response belongs to.  Requests the server did not respond to
+        are yielded last, with an error.
+
+        send_stream() and send() may not be called more than once.
+
+        :Parameters:
+          timeout
+            Number of seconds to wait for the whole batch.  Defaults to the Client's
+            timeout.
+        """
+        if self.sent:
+            raise Exception("Batch already sent. Cannot send() again.")
+        self.sent = True
+        results = self.client._request_stream(self.req_list, timeout)
+        return self._stream_responses(results)
+
+    def _stream_responses(self, results):
+        by_id = collections.OrderedDict([ (req["id"], req) for req in self.req_list 
+                                          if "id" in req ])
+        for resp in results:
+            req = by_id.pop(resp.get("id"), None)
+            if req is not None:
+                yield self._to_response(req, resp)
+        for req in by_id.values():
+            yield self._to_response(req, None)
+
+    def _to_response(self, req, resp):
+        """
+        Returns a RpcResponse for req from its JSON-RPC response, which is None if the
+        server did not return one
+        """
+        result = None
+        error  = None
+        if resp == None:
+            msg = "Batch response missing result for request id: %s" % req["id"]
+            error = RpcException(ERR_INVALID_RESP, msg)
+        else:
+            r_err = safe_get(resp, "error")
+            if r_err == None:
+                result = resp["result"]
+            else:
+                error = RpcException(r_err["code"], r_err["message"], safe_get(r_err, "data"))
+        return RpcResponse(req, result, error)
                 
 
 class RpcResponse(object):
@@ -758,40 +3112,181 @@ class Contract(object):
     Represents a single IDL file
     """
 
-    def __init__(self, idl_parsed):
+    def __init__(self, idl_parsed, validators=None):
         """
         Creates a new Contract from the parsed IDL JSON
 
         :Parameters:
           idl_parsed
             Barrister parsed IDL as a list of dicts
+          validators
+            Optional dict of precompiled validators, such as the VALIDATORS dict in a module
+            generated by `barrister --python`.  Keys are (type name, optional, is_array)
+            tuples and values are callables with the same behavior as those returned by
+            Contract.validator().  These are used instead of compiling validators at runtime.
         """
         self.idl_parsed = idl_parsed
-        self.interfaces = { }
-        self.structs = { }
-        self.enums = { }
         self.meta = { }
+        self._build_lock = threading.RLock()
+        self._build_depth = 0
+        self._pending = [ ]
+        self.interfaces = EntityMap(self, lambda e: Interface(e, self))
+        self.structs = EntityMap(self, lambda e: Struct(e, self), True)
+        self.enums = EntityMap(self, Enum)
         for e in idl_parsed:
             if e["type"] == "struct":
-                self.structs[e["name"]] = Struct(e, self)
+                self.structs.elems[e["name"]] = e
             elif e["type"] == "enum":
-                self.enums[e["name"]] = Enum(e)
+                self.enums.elems[e["name"]] = e
             elif e["type"] == "interface":
-                self.interfaces[e["name"]] = Interface(e, self)
+                self.interfaces.elems[e["name"]] = e
             elif e["type"] == "meta":
                 for k,v in list(e.items()):
                     if k != "type":
                         self.meta[k] = v
+        self._validators = { }
+        if validators:
+            self._validators.update(validators)
+        self._converters = { }
+
+    def compile(self):
+        """
+        Builds every Struct, Enum, Interface and Function in this Contract, along with
+        the validator callables for their fields, params and return types.
+
+        Entities are otherwise built the first time they are accessed, so a process
+        only pays for the parts of the Contract it uses.  Call this before forking
+        worker processes so they share the built Contract.
+        """
+        list(self.structs.values())
+        list(self.enums.values())
+        for iface in list(self.interfaces.values()):
+            list(iface.functions.values())
+
+    def _build(self, entities, name):
+        """
+        Creates the entity for name in the given EntityMap, compiling it if required.
+        Entities created while compiling another entity (e.g. the struct type of a field)
+        are only published once the outermost entity is compiled, so other threads never
+        see a partially compiled entity.
+        """
+        with self._build_lock:
+            obj = entities.built.get(name)
+            if obj is not None:
+                return obj
+            for pending_map, pending_name, pending_obj in self._pending:
+                if pending_map is entities and pending_name == name:
+                    return pending_obj
+
+            obj = entities.factory(entities.elems[name])
+            self._pending.append((entities, name, obj))
+            outermost = self._build_depth == 0
+            self._build_depth += 1
+            try:
+                if entities.compile:
+                    obj.compile()
+            finally:
+                self._build_depth -= 1
+                if outermost:
+                    pending = self._pending
+                    self._pending = [ ]
+            if outermost:
+                for pending_map, pending_name, pending_obj in pending:
+                    pending_map.built[pending_name] = pending_obj
+            return obj
+
+    @property
+    def checksum(self):
+        """
+        Returns the IDL checksum computed by the parser, or None if the IDL was parsed
+        without meta information
+        """
+        return self.meta.get("checksum")
+
+    def save_cached(self, path, format="pickle"):
+        """
+        Writes this Contract to a compiled contract file that can be loaded with
+        Contract.load_cached().  The file starts with a one line header containing the
+        format, cache version and IDL checksum, followed by the parsed IDL.
+
+        :Parameters:
+          path
+            Filename to write
+          format
+            "pickle" (default) for a binary payload, or "json" for minified JSON
+        """
+        if format == "pickle":
+            payload = pickle.dumps(self.idl_parsed, pickle.HIGHEST_PROTOCOL)
+        elif format == "json":
+            payload = json.dumps(self.idl_parsed, separators=(",", ":")).encode("utf-8")
+        else:
+            raise ValueError("Unknown compiled contract format: '%s'" % format)
+        header = "%s %s %d %s\n" % (_cache_magic, format, _cache_version, self.checksum or "-")
+        f = open(path, "wb")
+        try:
+            f.write(header.encode("ascii"))
+            f.write(payload)
+        finally:
+            f.close()
+
+    @classmethod
+    def load_cached(cls, path, checksum=None, validators=None):
+        """
+        Loads a Contract from a file written by Contract.save_cached().  The file is
+        memory mapped, so workers loading the same file share its pages in the OS cache.
+        Raises ValueError if the file is not a compiled contract, was written by an
+        incompatible version of barrister, or does not match checksum.
+
+        Pickle files must only be loaded from trusted locations.
+
+        :Parameters:
+          path
+            Filename to load
+          checksum
+            Optional IDL checksum the file is expected to contain, typically from the
+            `meta` of the IDL the process was deployed with
+          validators
+            Optional dict of precompiled validators. See Contract.__init__
+        """
+        f = open(path, "rb")
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            end = buf.find(b"\n")
+            header = buf[:end].decode("ascii", "replace").split(" ")
+            if len(header) != 4 or header[0] != _cache_magic:
+                raise ValueError("%s is not a compiled barrister contract" % path)
+            format, version, file_checksum = header[1:]
+            if version != str(_cache_version):
+                raise ValueError("%s has compiled contract version %s, expected %d" %
+                                 (path, version, _cache_version))
+            if checksum and checksum != file_checksum:
+                raise ValueError("%s has IDL checksum %s, expected %s" %
+                                 (path, file_checksum, checksum))
+            if format == "pickle":
+                view = memoryview(buf)[end+1:]
+                try:
+                    idl_parsed = pickle.loads(view)
+                finally:
+                    view.release()
+            elif format == "json":
+                idl_parsed = json.loads(buf[end+1:])
+            else:
+                raise ValueError("%s has unknown compiled contract format: '%s'" % (path, format))
+        finally:
+            buf.close()
+        return cls(idl_parsed, validators)
 
     def validate_request(self, iface_name, func_name, params):
         """
         Validates that the given params match the expected length and types for this 
         interface and function.  
 
-        Returns two element tuple: (bool, string)
-
-        - `bool` - True if valid, False if not
-        - `string` - Description of validation error, or None if valid
+        Raises RpcException with code ERR_INVALID_PARAMS if the params are invalid.  The
+        message is built from the ValidationError, and the error data contains its `path`,
+        e.g. `{ "path" : "params[0].email" }`
 
         :Parameters:
           iface_name
@@ -807,10 +3302,9 @@ class Contract(object):
         """
         Validates that the response matches the return type for the function  
 
-        Returns two element tuple: (bool, string)
-
-        - `bool` - True if valid, False if not
-        - `string` - Description of validation error, or None if valid
+        Raises RpcException with code ERR_INVALID_RESP if the response is invalid.  The
+        message is built from the ValidationError, and the error data contains its `path`,
+        e.g. `{ "path" : "result.user.email" }`
 
         :Parameters:
           iface_name
@@ -847,7 +3341,7 @@ class Contract(object):
         if struct_name in self.structs:
             return self.structs[struct_name]
         else:
-            raise RpcException(ERR_INVALID_PARAMS, "Unknown struct: '%s'", struct_name)
+            raise RpcException(ERR_INVALID_PARAMS, "Unknown struct: '%s'" % struct_name)
 
     def has_interface(self, iface_name):
         """
@@ -862,66 +3356,232 @@ class Contract(object):
         if self.has_interface(iface_name):
             return self.interfaces[iface_name]
         else:
-            raise RpcException(ERR_INVALID_PARAMS, "Unknown interface: '%s'", iface_name)
+            raise RpcException(ERR_INVALID_PARAMS, "Unknown interface: '%s'" % iface_name)
 
     def validate(self, expected_type, is_array, val):
         """
         Validates that the expected type matches the value
 
-        Returns two element tuple: (bool, string)
+        Returns two element tuple: (bool, ValidationError)
 
         - `bool` - True if valid, False if not
-        - `string` - Description of validation error, or None if valid
+        - `ValidationError` - Description of validation error, or None if valid
 
         :Parameters:
           expected_type
-            string name of the type expected. This may be a Barrister primitive, or a user defined type.
+            Type instance describing the expected type. This may be a Barrister primitive, 
+            or a user defined type.
           is_array
             If True then require that the val be a list
           val
             Value to validate against the expected type
         """
-        if val == None:
-            if expected_type.optional:
-                return True, None
-            else:
-                return False, "Value cannot be null"
-        elif is_array:
-            if not isinstance(val, list):
-                return self._type_err(val, "list")
-            else:
+        return self.validator(expected_type, is_array)(val)
+
+    def validator(self, expected_type, is_array):
+        """
+        Returns a callable that accepts a single value and returns the same
+        (bool, ValidationError) tuple as Contract.validate.  Validators are built once per
+        distinct (type, optional, is_array) combination and cached on the Contract.
+
+        :Parameters:
+          expected_type
+            Type instance describing the expected type
+          is_array
+            If True then the validator requires that the value be a list
+        """
+        key = (expected_type.type, expected_type.optional, is_array)
+        fn = self._validators.get(key)
+        if fn is None:
+            fn = self._compile_validator(expected_type.type, expected_type.optional, is_array)
+            self._validators[key] = fn
+        return fn
+
+    def _compile_validator(self, type_name, optional, is_array):
+        if optional:
+            null_check = _null_ok
+        else:
+            null_check = _null_err
+
+        type_err = _type_err
+
+        if is_array:
+            elem_check = self._compile_validator(type_name, optional, False)
+            bulk_check = self._compile_bulk_check(type_name, optional)
+            def check_array(val):
+                if bulk_check and type(val) is list and bulk_check(val):
+                    return True, None
+                if val is None:
+                    return null_check()
+                if not isinstance(val, list):
+                    return type_err(val, "list")
+                i = 0
                 for v in val:
-                    ok, msg = self.validate(expected_type, False, v)
+                    ok, err = elem_check(v)
                     if not ok:
-                        return ok, msg
-        elif expected_type.type == "int":
-            if not isinstance(val, int):
-                return self._type_err(val, "int")
-        elif expected_type.type == "float":
-            if not isinstance(val, (float, int)):
-                return self._type_err(val, "float")
-        elif expected_type.type == "bool":
-            if not isinstance(val, bool):
-                return self._type_err(val, "bool")
-        elif expected_type.type == "string":
-            if not isinstance(val, str):
-                return self._type_err(val, "string")
-        else:
-            return self.get(expected_type.type).validate(val)
-        return True, None
+                        return ok, err.at(i)
+                    i += 1
+                return True, None
+            return check_array
+
+        if type_name in _primitive_types:
+            py_types, type_desc = _primitive_types[type_name]
+            def check_primitive(val):
+                if isinstance(val, py_types):
+                    return True, None
+                elif val is None:
+                    return null_check()
+                else:
+                    return type_err(val, type_desc)
+            return check_primitive
+
+        try:
+            entity_validate = self.get(type_name).validate
+        except RpcException as e:
+            err = e
+            def check_unknown(val):
+                if val is None:
+                    return null_check()
+                raise err
+            return check_unknown
+
+        def check_entity(val):
+            if val is None:
+                return null_check()
+            return entity_validate(val)
+        return check_entity
+
+    def struct_class(self, struct_name):
+        """
+        Returns the StructObject subclass generated for the given struct. The class
+        has one slot per field on the struct and its ancestors.  Raises RpcException
+        if no struct matches.
+        """
+        return self.struct(struct_name).object_class()
+
+    def converter(self, expected_type, is_array):
+        """
+        Returns a callable that converts a decoded JSON value of the given type, 
+        replacing struct dicts with instances of the classes returned by struct_class().
+        Returns None if the type contains no structs, in which case values never need
+        converting.
+
+        :Parameters:
+          expected_type
+            Type instance describing the value
+          is_array
+            If True then the converter expects a list
+        """
+        key = (expected_type.type, is_array)
+        if key not in self._converters:
+            self._converters[key] = self._compile_converter(expected_type.type, is_array)
+        return self._converters[key]
+
+    def _compile_converter(self, type_name, is_array):
+        if type_name not in self.structs:
+            return None
+
+        from_dict = self.structs[type_name].from_dict
+        if not is_array:
+            return from_dict
+
+        def convert_array(val):
+            if type(val) is not list:
+                return val
+            return [ from_dict(v) for v in val ]
+        return convert_array
+
+    def _compile_bulk_check(self, type_name, optional):
+        """
+        Returns a callable that checks an entire list of primitive or enum values in
+        a single pass, or None if type_name is a struct.  The callable returns True
+        if every element is valid.  If it returns False the caller must run the
+        per-element validator to find and describe the first invalid element.
+        """
+        if type_name in _primitive_exact_types:
+            allowed = _primitive_exact_types[type_name]
+            if optional:
+                allowed = allowed | frozenset([type(None)])
+            def check_primitives(val):
+                return allowed.issuperset(map(type, val))
+            return check_primitives
+
+        if type_name in self.enums:
+            allowed = self.enums[type_name].value_set
+            if optional:
+                allowed = allowed | frozenset([None])
+            def check_enums(val):
+                try:
+                    return allowed.issuperset(val)
+                except TypeError:
+                    return False
+            return check_enums
+
+        return None
+
+def _type_err(val, expected):
+    return False, ValidationError("%s is of type %s, expected %s", 
+                                  _Preview(val), type(val), expected)
+
+def _null_ok():
+    return True, None
+
+def _null_err():
+    return False, ValidationError("Value cannot be null")
+
+class EntityMap(collections.abc.Mapping):
+    """
+    Read only dict of entity name to Struct, Enum, Interface or Function.  Holds the
+    parsed IDL for each entity and creates the entity object the first time it is
+    looked up.  Membership tests, len() and key iteration do not create entities.
+    """
+
+    __slots__ = ("contract", "factory", "compile", "elems", "built")
+
+    def __init__(self, contract, factory, compile=False):
+        """
+        Creates an empty EntityMap.  Parsed IDL dicts are added to `elems` by the owner.
+
+        :Parameters:
+          contract
+            Contract that builds the entities
+          factory
+            Callable that accepts an IDL dict and returns the entity object
+          compile
+            If True then compile() is called on each entity after it is created
+        """
+        self.contract = contract
+        self.factory = factory
+        self.compile = compile
+        self.elems = { }
+        self.built = { }
 
-    def _type_err(self, val, expected):
-        return False, "'%s' is of type %s, expected %s" % (val, type(val), expected)
+    def __getitem__(self, name):
+        obj = self.built.get(name)
+        if obj is None:
+            obj = self.contract._build(self, name)
+        return obj
+
+    def __contains__(self, name):
+        return name in self.elems
+
+    def __iter__(self):
+        return iter(self.elems)
+
+    def __len__(self):
+        return len(self.elems)
 
 class Interface(object):
     """
     Represents a Barrister IDL 'interface' entity.
     """
 
+    __slots__ = ("name", "functions")
+
     def __init__(self, iface, contract):
         """
-        Creates an Interface. Creates a 'functions' list of Function objects for
-        each function defined on the interface.
+        Creates an Interface. Creates a 'functions' EntityMap that builds a Function
+        object for each function defined on the interface when it is first used.
 
         :Parameters:
           iface
@@ -930,9 +3590,9 @@ class Interface(object):
             Contract instance to associate the interface instance with
         """
         self.name = iface["name"]
-        self.functions = { }
+        self.functions = EntityMap(contract, lambda f: Function(self.name, f, contract), True)
         for f in iface["functions"]:
-            self.functions[f["name"]] = Function(self.name, f, contract)
+            self.functions.elems[f["name"]] = f
 
     def function(self, func_name):
         """
@@ -943,13 +3603,15 @@ class Interface(object):
             return self.functions[func_name]
         else:
             raise RpcException(ERR_METHOD_NOT_FOUND, 
-                               "%s: Unknown function: '%s'", self.name, func_name)
+                               "%s: Unknown function: '%s'" % (self.name, func_name))
 
 class Enum(object):
     """
     Represents a Barrister IDL 'enum' entity.
     """
 
+    __slots__ = ("name", "values", "value_set")
+
     def __init__(self, enum):
         """
         Creates an Enum.
@@ -962,30 +3624,37 @@ class Enum(object):
         self.values = [ ]
         for v in enum["values"]:
             self.values.append(v["value"])
+        self.value_set = frozenset(self.values)
 
     def validate(self, val):
         """
         Validates that the val is in the list of values for this Enum.
 
-        Returns two element tuple: (bool, string)
+        Returns two element tuple: (bool, ValidationError)
 
         - `bool` - True if valid, False if not
-        - `string` - Description of validation error, or None if valid
+        - `ValidationError` - Description of validation error, or None if valid
 
         :Parameters:
           val
             Value to validate.  Should be a string.
         """
-        if val in self.values:
-            return True, None
-        else:
-            return False, "'%s' is not in enum: %s" % (val, str(self.values))
+        try:
+            if val in self.value_set:
+                return True, None
+        except TypeError:
+            pass
+        return False, ValidationError("%s is not in enum: %s", _Preview(val), self.values)
 
 class Struct(object):
     """
     Represents a Barrister IDL 'struct' entity.
     """
 
+    __slots__ = ("contract", "name", "extends", "parent", "fields", "all_fields", 
+                 "required_fields", "_required_list", "_field_list", "_cls", 
+                 "_field_converters")
+
     def __init__(self, s, contract):
         """
         Creates a Struct.
@@ -1003,6 +3672,52 @@ class Struct(object):
         self.fields = { }
         for f in s["fields"]:
             self.fields[f["name"]] = Type(f)
+        self.all_fields = None
+        self.required_fields = None
+        self._required_list = None
+        self._field_list = None
+        self._cls = None
+        self._field_converters = None
+
+    def compile(self):
+        """
+        Builds the validator for each field declared on this struct, and flattens
+        the extends chain into a merged field table and a set of required field names.
+        Called by the Contract when the struct is first used
+        """
+        for t in list(self.fields.values()):
+            t.validator = self.contract.validator(t, t.is_array)
+        self._flatten()
+
+    def _flatten(self):
+        """
+        Resolves the ancestors of this struct once, building:
+
+        * `_field_list` - tuple of this struct's fields followed by its ancestors' fields
+        * `all_fields` - dict of field name to Type. Fields declared on this struct take
+          precedence over ancestor fields with the same name
+        * `required_fields` - frozenset of the names of all non-optional fields
+        """
+        if self._field_list is None:
+            field_list = list(self.fields.values())
+            if self.extends:
+                self.parent = self.contract.struct(self.extends)
+                field_list.extend(self.parent._flatten())
+
+            all_fields = { }
+            for f in reversed(field_list):
+                all_fields[f.name] = f
+
+            required = [ ]
+            for f in field_list:
+                if not f.optional and f.name not in required:
+                    required.append(f.name)
+
+            self.all_fields = all_fields
+            self.required_fields = frozenset(required)
+            self._required_list = tuple(required)
+            self._field_list = tuple(field_list)
+        return self._field_list
 
     def field(self, name):
         """
@@ -1016,14 +3731,8 @@ class Struct(object):
           name
             string name of field to lookup
         """
-        if name in self.fields:
-            return self.fields[name]
-        elif self.extends:
-            if not self.parent:
-                self.parent = self.contract.struct(self.extends)
-            return self.parent.field(name)
-        else:
-            return None
+        self._flatten()
+        return self.all_fields.get(name)
 
     def validate(self, val):
         """
@@ -1031,54 +3740,108 @@ class Struct(object):
         val must be a dict, and must contain only fields represented by this struct and its
         ancestors.
 
-        Returns two element tuple: (bool, string)
+        Returns two element tuple: (bool, ValidationError)
 
         - `bool` - True if valid, False if not
-        - `string` - Description of validation error, or None if valid
+        - `ValidationError` - Description of validation error, or None if valid
 
         :Parameters:
           val
             Value to validate.  Must be a dict
         """
         if type(val) is not dict:
-            return False, "%s is not a dict" % (str(val))
-
-        for k, v in list(val.items()):
-            field = self.field(k)
-            if field:
-                ok, msg = self.contract.validate(field, field.is_array, v)
-                if not ok:
-                    return False, "field '%s': %s" % (field.name, msg)
-            else:
-                return False, "field '%s' not found in struct %s" % (k, self.name)
+            if isinstance(val, StructObject) and val._struct_name == self.name:
+                return self._validate_object(val)
+            return False, ValidationError("%s is not a dict", _Preview(val))
+
+        all_fields = self.all_fields
+        for k, v in val.items():
+            field = all_fields.get(k)
+            if field is None:
+                return False, ValidationError("field %s not found in struct %s", 
+                                              _Preview(k), self.name)
+            ok, err = field.validator(v)
+            if not ok:
+                return False, err.at(k)
+
+        if not val.keys() >= self.required_fields:
+            for name in self._required_list:
+                if name not in val:
+                    return False, ValidationError("field '%s' missing from: %s", 
+                                                  name, _Preview(val))
 
-        all_fields = self.get_all_fields([])
-        for field in all_fields:
-            if field.name not in val and not field.optional:
-                return False, "field '%s' missing from: %s" % (field.name, str(val))
+        return True, None
 
+    def _validate_object(self, val):
+        """
+        Validates a StructObject instance generated for this struct
+        """
+        required = self.required_fields
+        for name, field in self.all_fields.items():
+            try:
+                v = getattr(val, name)
+            except AttributeError:
+                if name in required:
+                    return False, ValidationError("field '%s' missing from: %s", 
+                                                  name, _Preview(val))
+                continue
+            ok, err = field.validator(v)
+            if not ok:
+                return False, err.at(name)
         return True, None
 
     def get_all_fields(self, arr):
         """
         Returns a list containing this struct's fields and all the fields of
-        its ancestors.  Used during validation.
+        its ancestors.
         """
-        for k, v in list(self.fields.items()):
-            arr.append(v)
-            
-        if self.extends:
-            parent = self.contract.get(self.extends)
-            if parent:
-                return parent.get_all_fields(arr)
-
+        arr.extend(self._flatten())
         return arr
 
+    def object_class(self):
+        """
+        Returns the StructObject subclass for this struct, generating it on first use
+        """
+        if self._cls is None:
+            self._flatten()
+            attrs = { "__slots__" : tuple(self.all_fields.keys()), 
+                      "_struct_name" : self.name }
+            self._cls = type(str(self.name.replace(".", "_")), (StructObject,), attrs)
+        return self._cls
+
+    def from_dict(self, val):
+        """
+        Converts a dict for this struct into an instance of object_class(), converting
+        nested struct values as well.  Values that are not dicts are returned unchanged.
+        """
+        if type(val) is not dict:
+            return val
+
+        converters = self._field_converters
+        if converters is None:
+            converters = { }
+            for name, f in self.all_fields.items():
+                conv = self.contract.converter(f, f.is_array)
+                if conv:
+                    converters[name] = conv
+            self._field_converters = converters
+
+        obj = object.__new__(self._cls or self.object_class())
+        for k, v in val.items():
+            conv = converters.get(k)
+            if conv is not None and v is not None:
+                v = conv(v)
+            setattr(obj, k, v)
+        return obj
+
 class Function(object):
     """
     Represents a function defined on an Interface
     """
 
+    __slots__ = ("contract", "name", "params", "returns", "full_name", "cache", 
+                 "_param_converters")
+
     def __init__(self, iface_name, f, contract):
         """
         Creates a new Function
@@ -1098,6 +3861,17 @@ class Function(object):
             self.params.append(Type(p))
         self.returns = Type(f["returns"])
         self.full_name = "%s.%s" % (iface_name, self.name)
+        self.cache = f.get("cache")
+        self._param_converters = None
+
+    def compile(self):
+        """
+        Builds the validators for this function's params and return type.  Called by
+        the Contract when the function is first used
+        """
+        for p in self.params:
+            p.validator = self.contract.validator(p, p.is_array)
+        self.returns.validator = self.contract.validator(self.returns, self.returns.is_array)
         
     def validate_params(self, params):
         """
@@ -1108,51 +3882,100 @@ class Function(object):
         if params != None:
             plen = len(params)
 
-        if len(self.params) != plen:
-            vals = (self.full_name, len(self.params), plen)
-            msg = "Function '%s' expects %d param(s). %d given." % vals
-            raise RpcException(ERR_INVALID_PARAMS, msg)
+        self.check_arity(plen)
         
         if params != None:
             i = 0
-            for p in self.params:
-                self._validate_param(p, params[i])
+            for p, param in zip(self.params, params):
+                self._validate_param(i, p, param)
                 i += 1
 
+    def decode_params(self, params):
+        """
+        Returns params with struct dicts converted to instances of the classes 
+        returned by Contract.struct_class()
+        """
+        converters = self._get_converters()
+        if not any(converters[:-1]) or not params:
+            return params
+        return [ conv(p) if conv and p is not None else p 
+                 for conv, p in zip(converters, params) ]
+
+    def decode_result(self, result):
+        """
+        Returns result with struct dicts converted to instances of the classes 
+        returned by Contract.struct_class()
+        """
+        conv = self._get_converters()[-1]
+        if conv and result is not None:
+            return conv(result)
+        return result
+
+    def _get_converters(self):
+        """
+        Returns a list of the converters for each param followed by the converter 
+        for the return type
+        """
+        if self._param_converters is None:
+            types = self.params + [ self.returns ]
+            self._param_converters = [ self.contract.converter(t, t.is_array) for t in types ]
+        return self._param_converters
+
+    def check_arity(self, plen):
+        """
+        Raises RpcException if plen is not the number of params this function expects.
+        """
+        if len(self.params) != plen:
+            vals = (self.full_name, len(self.params), plen)
+            msg = "Function '%s' expects %d param(s). %d given." % vals
+            raise RpcException(ERR_INVALID_PARAMS, msg)
+
+    def validate_param(self, index, param):
+        """
+        Validates a single param against the expected type for the param at the given
+        position.  Raises RpcException if the param is invalid.
+        """
+        self._validate_param(index, self.params[index], param)
+
     def validate_response(self, resp):
         """
         Validates resp against expected return type for this function.  
         Raises RpcException if the response is invalid.
         """
-        ok, msg = self.contract.validate(self.returns, 
-                                         self.returns.is_array, resp)
+        ok, err = self.returns.validator(resp)
         if not ok:
-            vals = (self.full_name, str(resp), msg)
-            msg = "Function '%s' invalid response: '%s'. %s" % vals
-            raise RpcException(ERR_INVALID_RESP, msg)
+            err.at("result")
+            msg = LazyMessage("Function '%s' invalid response. %s", self.full_name, err)
+            raise RpcException(ERR_INVALID_RESP, msg, { "path" : err.path })
 
-    def _validate_param(self, expected, param):
+    def _validate_param(self, index, expected, param):
         """
         Validates a single param against its expected type.
         Raises RpcException if the param is invalid
         
         :Parameters:
+          index
+            Position of the param in the params list
           expected
             Type instance
           param
             Parameter value to validate
         """
-        ok, msg = self.contract.validate(expected, expected.is_array, param)
+        ok, err = expected.validator(param)
         if not ok:
-            vals = (self.full_name, expected.name, msg)
-            msg = "Function '%s' invalid param '%s'. %s" % vals
-            raise RpcException(ERR_INVALID_PARAMS, msg)
+            err.at(index).at("params")
+            msg = LazyMessage("Function '%s' invalid param '%s'. %s", 
+                              self.full_name, expected.name, err)
+            raise RpcException(ERR_INVALID_PARAMS, msg, { "path" : err.path })
 
 class Type(object):
 
+    __slots__ = ("name", "optional", "validator", "type", "is_array")
+
     def __init__(self, type_dict):
         self.name = ""
         self.optional = False
+        self.validator = None
         if "name" in type_dict:
             self.name = type_dict["name"]
         self.type = type_dict["type"]
@@ -12,9 +12,15 @@ import unittest
 
 from .runtime_test import RuntimeTest
 from .parser_test import ParserTest
+from .wsgi_test import WsgiTest
+from .httpd_test import HttpdTest
+from .aio_test import AioTest
 
 def all_tests():
     s = [ ]
     s.append(unittest.TestLoader().loadTestsFromTestCase(ParserTest))
     s.append(unittest.TestLoader().loadTestsFromTestCase(RuntimeTest))
+    s.append(unittest.TestLoader().loadTestsFromTestCase(WsgiTest))
+    s.append(unittest.TestLoader().loadTestsFromTestCase(HttpdTest))
+    s.append(unittest.TestLoader().loadTestsFromTestCase(AioTest))
     return unittest.TestSuite(s)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+"""
+    barrister
+    ~~~~~~~~~
+
+    A RPC toolkit for building lightweight reliable services.  Ideal for
+    both static and dynamic languages.
+
+    :copyright: (c) 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+
+import asyncio
+import json
+import unittest
+import barrister
+from barrister.parser import parse
+from barrister.test.runtime_test import idl, newUser, UserServiceImpl
+
+class AsyncUserServiceImpl(UserServiceImpl):
+
+    def __init__(self):
+        UserServiceImpl.__init__(self)
+        self.running = 0
+        self.max_running = 0
+        self.delay = 0.01
+
+    async def get(self, userId):
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return UserServiceImpl.get(self, userId)
+
+class AsyncFilter(barrister.Filter):
+
+    def __init__(self):
+        self.calls = [ ]
+
+    async def pre(self, context):
+        self.calls.append("pre")
+        if context.get_prop("deny"):
+            context.set_error(1000, "denied")
+
+    async def post(self, context):
+        self.calls.append("post")
+
+def req(method, params, reqid="1"):
+    return { "jsonrpc" : "2.0", "id" : reqid, "method" : method, "params" : params }
+
+class AioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.user_svc = AsyncUserServiceImpl()
+        self.server = barrister.AsyncServer(barrister.Contract(parse(idl)))
+        self.server.add_handler("UserService", self.user_svc)
+
+    def test_async_handler(self):
+        resp = asyncio.run(self.server.call(req("UserService.create", [ newUser(email="a@b.com") ])))
+        user_id = resp["result"]["userId"]
+        resp = asyncio.run(self.server.call(req("UserService.get", [ user_id ])))
+        self.assertEqual("a@b.com", resp["result"]["user"]["email"])
+
+        self.user_svc.users[user_id] = { }
+        resp = asyncio.run(self.server.call(req("UserService.get", [ user_id ])))
+        self.assertEqual(barrister.runtime.ERR_INVALID_RESP, resp["error"]["code"])
+
+    def test_batch_runs_concurrently(self):
+        for i in range(5):
+            self.user_svc.users[str(i)] = newUser(userId=str(i), email="a@b.com")
+        batch = [ req("UserService.get", [ str(i) ], str(i)) for i in range(5) ]
+        batch.append(req("UserService.get", [ 1 ], "bad"))
+        resp = asyncio.run(self.server.call(batch))
+        self.assertEqual([ "0", "1", "2", "3", "4", "bad" ], [ r["id"] for r in resp ])
+        self.assertEqual("3", resp[3]["result"]["user"]["userId"])
+        self.assertEqual(barrister.runtime.ERR_INVALID_PARAMS, resp[5]["error"]["code"])
+        self.assertEqual(5, self.user_svc.max_running)
+
+    def test_batch_concurrency(self):
+        for i in range(5):
+            self.user_svc.users[str(i)] = newUser(userId=str(i), email="a@b.com")
+        server = barrister.AsyncServer(self.server.contract, batch_concurrency=2)
+        server.add_handler("UserService", self.user_svc)
+        batch = [ req("UserService.get", [ str(i) ], str(i)) for i in range(5) ]
+        resp = asyncio.run(server.call(batch))
+        self.assertEqual([ "0", "1", "2", "3", "4" ], [ r["id"] for r in resp ])
+        self.assertEqual(2, self.user_svc.max_running)
+
+        async def stream():
+            return [ r async for r in server.call_stream(batch) ]
+        self.user_svc.max_running = 0
+        self.assertEqual(5, len(asyncio.run(stream())))
+        self.assertEqual(2, self.user_svc.max_running)
+
+        self.assertRaises(ValueError, barrister.AsyncServer, self.server.contract, 
+                          batch_executor=2)
+
+    def test_singleflight(self):
+        for i in range(5):
+            self.user_svc.users[str(i)] = newUser(userId=str(i), email="a@b.com")
+        self.server.singleflight = barrister.Singleflight([ "UserService.get" ])
+        batch = [ req("UserService.get", [ "1" ], str(i)) for i in range(5) ]
+        batch.append(req("UserService.get", [ "2" ], "2"))
+        resp = asyncio.run(self.server.call(batch))
+        self.assertEqual([ "1" ] * 5 + [ "2" ], [ r["result"]["user"]["userId"] for r in resp ])
+        self.assertEqual({ "leaders" : 2, "followers" : 4 }, self.server.singleflight.stats())
+
+        # callers waiting on another call do not take a bulkhead slot
+        self.server.bulkheads = barrister.Bulkheads({ "UserService" : (1, 0) })
+        resp = asyncio.run(self.server.call(batch[:5]))
+        self.assertEqual([ "1" ] * 5, [ r["result"]["user"]["userId"] for r in resp ])
+
+    def test_bulkheads(self):
+        for i in range(5):
+            self.user_svc.users[str(i)] = newUser(userId=str(i), email="a@b.com")
+        self.server.bulkheads = barrister.Bulkheads({ "UserService" : (2, 2) })
+        batch = [ req("UserService.get", [ str(i) ], str(i)) for i in range(5) ]
+        resp = asyncio.run(self.server.call(batch))
+        self.assertEqual([ "0", "1", "2", "3" ], [ r["result"]["user"]["userId"] for r in resp[:4] ])
+        self.assertEqual(barrister.runtime.ERR_OVERLOADED, resp[4]["error"]["code"])
+        self.assertEqual(2, self.user_svc.max_running)
+        stats = self.server.bulkheads.stats()["UserService"]
+        self.assertEqual((0, 0, 4, 2, 1), (stats["running"], stats["queue_depth"], 
+                                           stats["admitted"], stats["queued"], 
+                                           stats["rejected"]))
+
+        self.server.bulkheads.set("UserService", 0, max_queue=1)
+        props = { "deadline" : barrister.deadline_after(0.01) }
+        resp = asyncio.run(self.server.call(req("UserService.get", [ "1" ]), props))
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, resp["error"]["code"])
+
+    def test_deadline_cancels_call(self):
+        self.user_svc.users["1"] = newUser(userId="1", email="a@b.com")
+        async def call(timeout):
+            props = { "deadline" : barrister.deadline_after(timeout) }
+            return await self.server.call(req("UserService.get", [ "1" ]), props)
+        self.user_svc.delay = 5
+        resp = asyncio.run(call(0.05))
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, resp["error"]["code"])
+        # the handler was cancelled while sleeping
+        self.assertEqual(1, self.user_svc.running)
+        self.user_svc.delay = 0.01
+        self.assertEqual("1", asyncio.run(call(5))["result"]["user"]["userId"])
+
+    def test_notifications(self):
+        notification = req("UserService.create", [ newUser(email="a@b.com") ])
+        del notification["id"]
+        self.assertEqual(b"", asyncio.run(self.server.call_bytes(json.dumps([ notification ]))))
+        resp = asyncio.run(self.server.call([ notification, req("UserService.countUsers", [ ]) ]))
+        self.assertEqual([ 2 ], [ r["result"]["count"] for r in resp ])
+
+    def test_call_stream(self):
+        for i in range(3):
+            self.user_svc.users[str(i)] = newUser(userId=str(i), email="a@b.com")
+        async def stream():
+            batch = [ req("UserService.get", [ "0" ], "slow"), req("UserService.countUsers", [ ], "fast") ]
+            return [ r["id"] async for r in self.server.call_stream(batch) ]
+        self.assertEqual([ "fast", "slow" ], asyncio.run(stream()))
+
+    def test_singleflight_leader_cancelled(self):
+        self.user_svc.users["1"] = newUser(userId="1", email="a@b.com")
+        self.server.singleflight = barrister.Singleflight([ "UserService.get" ])
+        async def run():
+            leader = self.server.call(req("UserService.get", [ "1" ], "leader"),
+                                      { "deadline" : barrister.deadline_after(0.001) })
+            follower = self.server.call([ req("UserService.get", [ "1" ], "follower"),
+                                          req("UserService.countUsers", [ ], "other") ])
+            return await asyncio.gather(leader, follower)
+        leader, follower = asyncio.run(run())
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, leader["error"]["code"])
+        self.assertEqual("1", follower[0]["result"]["user"]["userId"])
+        self.assertEqual(1, follower[1]["result"]["count"])
+        self.assertEqual({ "leaders" : 2, "followers" : 0 }, self.server.singleflight.stats())
+
+    def test_async_filters(self):
+        f = AsyncFilter()
+        self.server.set_filters(f)
+        resp = asyncio.run(self.server.call(req("UserService.countUsers", [ ])))
+        self.assertEqual(0, resp["result"]["count"])
+        resp = asyncio.run(self.server.call(req("UserService.countUsers", [ ]), { "deny" : True }))
+        self.assertEqual(1000, resp["error"]["code"])
+        self.assertEqual([ "pre", "post", "pre" ], f.calls)
+
+    def test_asgi_app(self):
+        app = barrister.make_asgi_app(self.server, max_body_size=1000)
+
+        def run(method, chunks):
+            messages = [ { "type" : "http.request", "body" : c, "more_body" : True }
+                         for c in chunks ]
+            messages[-1]["more_body"] = False
+            sent = [ ]
+            async def receive():
+                return messages.pop(0)
+            async def send(message):
+                sent.append(message)
+            asyncio.run(app({ "type" : "http", "method" : method }, receive, send))
+            return sent[0]["status"], sent[1]["body"]
+
+        body = json.dumps(req("UserService.countUsers", [ ])).encode("utf-8")
+        status, resp = run("POST", [ body[:10], body[10:] ])
+        self.assertEqual(200, status)
+        self.assertEqual(0, json.loads(resp.decode("utf-8"))["result"]["count"])
+
+        status, resp = run("POST", [ b"{bad json" ])
+        self.assertEqual(barrister.runtime.ERR_PARSE, json.loads(resp.decode("utf-8"))["error"]["code"])
+
+        self.assertEqual(413, run("POST", [ b" " * 1001 ])[0])
+        self.assertEqual(405, run("GET", [ b"" ])[0])
+
+    def test_asgi_stream(self):
+        self.user_svc.users["1"] = newUser(userId="1", email="a@b.com")
+        app = barrister.make_asgi_app(self.server)
+        body = json.dumps([ req("UserService.get", [ "1" ], "slow"), 
+                            req("UserService.countUsers", [ ], "fast") ]).encode("utf-8")
+        messages = [ { "type" : "http.request", "body" : body } ]
+        sent = [ ]
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message)
+        scope = { "type" : "http", "method" : "POST", 
+                  "headers" : [ (b"accept", b"application/x-ndjson") ] }
+        asyncio.run(app(scope, receive, send))
+        self.assertEqual(200, sent[0]["status"])
+        self.assertEqual([ "fast", "slow" ], [ json.loads(m["body"])["id"] for m in sent[1:3] ])
+        self.assertEqual([ True, True, False ], [ m.get("more_body", False) for m in sent[1:] ])
+
+    def test_asgi_disconnect_cancels_call(self):
+        self.user_svc.users["1"] = newUser(userId="1", email="a@b.com")
+        app = barrister.make_asgi_app(self.server)
+        body = json.dumps(req("UserService.get", [ "1" ])).encode("utf-8")
+        messages = [ { "type" : "http.request", "body" : body },
+                     { "type" : "http.disconnect" } ]
+        sent = [ ]
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message)
+        asyncio.run(app({ "type" : "http", "method" : "POST", "headers" : [ ] }, receive, send))
+        self.assertEqual([ ], sent)
+        self.assertEqual(1, self.user_svc.running)
+
+if __name__ == "__main__":
+    unittest.main()
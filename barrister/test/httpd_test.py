@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+    barrister
+    ~~~~~~~~~
+
+    A RPC toolkit for building lightweight reliable services.  Ideal for
+    both static and dynamic languages.
+
+    :copyright: (c) 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+
+import concurrent.futures
+import http.client
+import json
+import threading
+import time
+import unittest
+import barrister
+from barrister.httpd import HttpServer
+from barrister.parser import parse
+from barrister.test.runtime_test import idl, newUser, UserServiceImpl
+
+class HttpdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = barrister.Server(barrister.Contract(parse(idl)))
+        self.server.add_handler("UserService", UserServiceImpl())
+        self.httpd = HttpServer(self.server, "127.0.0.1", 0, threads=4, max_body_size=10000)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+        self.port = self.httpd.server_address[1]
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def test_keepalive(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        for i in range(3):
+            body = json.dumps({ "jsonrpc" : "2.0", "id" : str(i), "method" : "UserService.countUsers",
+                                "params" : [ ] })
+            conn.request("POST", "/", body, { "Content-Type" : "application/json" })
+            resp = conn.getresponse()
+            self.assertEqual(200, resp.status)
+            self.assertEqual(str(i), json.loads(resp.read().decode("utf-8"))["id"])
+        sock = conn.sock
+        conn.request("GET", "/")
+        resp = conn.getresponse()
+        self.assertEqual(200, resp.status)
+        self.assertTrue(resp.getheader("ETag"))
+        resp.read()
+        self.assertTrue(sock is conn.sock)
+
+        conn.request("POST", "/", "x" * 10001)
+        resp = conn.getresponse()
+        self.assertEqual(413, resp.status)
+        resp.read()
+        conn.close()
+
+    def test_idle_connections_release_threads(self):
+        httpd = HttpServer(self.server, "127.0.0.1", 0, threads=2, keepalive_timeout=0.5)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        body = json.dumps({ "jsonrpc" : "2.0", "id" : "1", "method" : "UserService.countUsers" })
+        try:
+            conns = [ ]
+            for i in range(4):
+                conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+                start = time.monotonic()
+                conn.request("POST", "/", body)
+                resp = conn.getresponse()
+                self.assertEqual(200, resp.status)
+                resp.read()
+                self.assertTrue(time.monotonic() - start < 0.4)
+                conns.append(conn)
+
+            # idle connections are reused, then closed after keepalive_timeout
+            sock = conns[0].sock
+            conns[0].request("POST", "/", body)
+            conns[0].getresponse().read()
+            self.assertTrue(sock is conns[0].sock)
+            time.sleep(0.8)
+            self.assertEqual(b"", sock.recv(1))
+            for conn in conns:
+                conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+    def test_max_pending(self):
+        httpd = HttpServer(self.server, "127.0.0.1", 0, threads=1, max_pending=0)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+            conn.request("GET", "/")
+            self.assertEqual(503, conn.getresponse().status)
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+    def test_client(self):
+        client = barrister.Client(barrister.HttpTransport("http://127.0.0.1:%d/" % self.port))
+        resp = client.UserService.create(newUser(email="foo@bar.com"))
+        self.assertEqual("ok", resp["status"])
+        self.assertEqual(1, client.UserService.countUsers()["count"])
+
+    def test_notify(self):
+        client = barrister.Client(barrister.HttpTransport("http://127.0.0.1:%d/" % self.port))
+        self.assertEqual(None, client.notify("UserService", "create", [ newUser(email="a@b.com") ]))
+        self.assertEqual(1, client.UserService.countUsers()["count"])
+
+    def test_stream(self):
+        svc = self.server.handlers["UserService"]
+        def validateEmail(userId):
+            time.sleep(float(userId))
+            return { "status" : "ok", "message" : userId }
+        svc.validateEmail = validateEmail
+        self.server.add_handler("UserService", svc)
+        self.server.batch_executor = concurrent.futures.ThreadPoolExecutor(4)
+
+        client = barrister.Client(barrister.HttpTransport("http://127.0.0.1:%d/" % self.port))
+        batch = client.start_batch()
+        batch.UserService.validateEmail("0.2")
+        batch.UserService.validateEmail("0")
+        batch.UserService.validateEmail("0.1")
+        results = batch.send_stream()
+        self.assertEqual("0", next(results).result["message"])
+        self.assertEqual([ "0.1", "0.2" ], [ r.result["message"] for r in results ])
+
+        # the connection can be reused after a chunked response
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        body = json.dumps([ { "jsonrpc" : "2.0", "id" : 1, "method" : "UserService.countUsers" } ])
+        for i in range(2):
+            conn.request("POST", "/", body, { "Accept" : "application/x-ndjson" })
+            resp = conn.getresponse()
+            self.assertEqual("chunked", resp.getheader("Transfer-Encoding"))
+            self.assertEqual(1, json.loads(resp.read().decode("utf-8"))["id"])
+        conn.close()
+        self.server.batch_executor.shutdown()
+
+    def test_client_timeout(self):
+        svc = self.server.handlers["UserService"]
+        remaining = [ ]
+        def countUsers():
+            remaining.append(barrister.current_context().remaining())
+            time.sleep(0.3)
+            return { "status" : "ok", "message" : "ok", "count" : 0 }
+        svc.countUsers = countUsers
+        self.server.add_handler("UserService", svc)
+
+        transport = barrister.HttpTransport("http://127.0.0.1:%d/" % self.port, timeout=0.1)
+        client = barrister.Client(transport)
+        try:
+            client.UserService.countUsers()
+            self.fail("expected timeout")
+        except barrister.RpcException as e:
+            self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, e.code)
+        self.assertTrue(0 < remaining[0] <= 0.1)
+        self.assertEqual(0, client.call("UserService", "countUsers", [ ], timeout=5)["count"])
+
+if __name__ == "__main__":
+    unittest.main()
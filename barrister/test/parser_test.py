@@ -459,6 +459,30 @@ interface FooService {
                            "returns" : ret_field("string", optional=True) } ] } ]
         self.assertEqual(expected, parse(idl, add_meta=False))
 
+    def test_cache_return_type_opt(self):
+        idl = """interface FooService {
+   sayHi() string [optional, cache=30]
+   sayBye() string [cache]
+}"""
+        expected = [ { "name": "FooService", "type": "interface", "comment": "",
+                       "functions" : 
+                       [ { "name" : "sayHi", "comment" : "", "params" : [ ], "cache" : { "ttl" : 30 },
+                           "returns" : ret_field("string", optional=True) },
+                         { "name" : "sayBye", "comment" : "", "params" : [ ], "cache" : { },
+                           "returns" : ret_field("string") } ] } ]
+        self.assertEqual(expected, parse(idl, add_meta=False))
+
+        idl = """struct Foo {
+   name string [cache]
+}"""
+        self.assertRaises(Exception, parse, idl)
+
+        def checksum(opts):
+            idl = "interface FooService {\n  sayHi() string %s\n}" % opts
+            return [ e for e in parse(idl) if e["type"] == "meta" ][0]["checksum"]
+        checksums = [ checksum(opts) for opts in [ "", "[cache]", "[cache=30]", "[cache=60]" ] ]
+        self.assertEqual(4, len(set(checksums)))
+
     def test_prefix_namespace_if_present(self):
       idl = """
       namespace common
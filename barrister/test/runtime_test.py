@@ -11,8 +11,13 @@
     :license: MIT, see LICENSE for more details.
 """
 
+import os
 import uuid
+import shutil
+import tempfile
+import threading
 import time
+import json
 import unittest
 import barrister
 from barrister.parser import parse
@@ -112,6 +117,13 @@ class UserServiceImpl(object):
     def _resp(self, status, message):
         return { "status" : status, "message" : message }
 
+class PidUserServiceImpl(UserServiceImpl):
+
+    def validateEmail(self, userId):
+        if userId == "bad":
+            raise barrister.RpcException(100, "bad user")
+        return self._resp("ok", str(os.getpid()))
+
 class RuntimeTest(unittest.TestCase):
 
     def setUp(self):
@@ -126,6 +138,21 @@ class RuntimeTest(unittest.TestCase):
     def test_add_handler_invalid(self):
         self.assertRaises(barrister.RpcException, self.server.add_handler, "foo", self.user_svc)
 
+        class PartialImpl(object):
+            def get(self, userId):
+                return { }
+        self.assertRaises(barrister.RpcException, self.server.add_handler, "UserService", PartialImpl())
+
+    def test_dispatch_table(self):
+        func, function, pre_hook = self.server.dispatch["UserService.countUsers"]
+        self.assertEqual(self.user_svc.countUsers, func)
+        self.assertTrue(function is self.server.contract.interface("UserService").function("countUsers"))
+        self.assertEqual(None, pre_hook)
+        resp = self.server.call({ "jsonrpc" : "2.0", "id" : "1", "method" : "UserService.nope" })
+        self.assertEqual(barrister.runtime.ERR_METHOD_NOT_FOUND, resp["error"]["code"])
+        resp = self.server.call({ "jsonrpc" : "2.0", "id" : "1", "method" : "Other.nope" })
+        self.assertEqual("No implementation of 'Other' found", resp["error"]["message"])
+
     def test_user_crud(self):
         svc = self.client.UserService
         user = newUser(email="foo@example.com")
@@ -181,12 +208,723 @@ class RuntimeTest(unittest.TestCase):
             ]
         for resp in responses:
             self.user_svc.get = lambda id: resp
+            self.server.add_handler("UserService", self.user_svc)
             try:
                 svc.get("123")
                 self.fail("Expected RpcException for response: %s" % str(resp))
             except barrister.RpcException:
                 pass
 
+    def test_compiled_validators(self):
+        contract = self.server.contract
+        func = contract.interface("UserService").function("create")
+        self.assertTrue(func.params[0].validator)
+        self.assertTrue(func.returns.validator)
+        user_type = func.params[0]
+        self.assertTrue(contract.validator(user_type, False) is user_type.validator)
+        ok, msg = contract.validate(user_type, False, newUser(email="foo@bar.com"))
+        self.assertTrue(ok)
+        self.assertEqual(None, msg)
+        bad = newUser(email="foo@bar.com")
+        bad["dateCreated"] = "x"
+        ok, msg = contract.validate(user_type, False, bad)
+        self.assertFalse(ok)
+        self.assertEqual("dateCreated: 'x' is of type <class 'str'>, expected int", str(msg))
+        self.assertEqual("dateCreated", msg.path)
+
+    def test_struct_flattened_fields(self):
+        s = self.server.contract.struct("CountResponse")
+        self.assertEqual(set(["status", "message", "count"]), set(s.all_fields.keys()))
+        self.assertEqual(frozenset(["status", "message", "count"]), s.required_fields)
+        self.assertEqual("status", s.field("status").name)
+        self.assertEqual(None, s.field("userId"))
+        ok, msg = s.validate({ "status" : "ok", "count" : 1 })
+        self.assertFalse(ok)
+        self.assertTrue(str(msg).startswith("field 'message' missing"))
+        self.assertEqual((True, None), s.validate({ "status" : "ok", "message" : "hi", "count" : 1 }))
+
+    def test_validate_primitive_arrays(self):
+        contract = self.server.contract
+        float_arr = barrister.runtime.Type({ "type" : "float", "is_array" : True })
+        nums = [ 1.5 ] * 1000 + [ 2, True ]
+        self.assertEqual((True, None), contract.validate(float_arr, True, nums))
+        nums[500] = "x"
+        ok, msg = contract.validate(float_arr, True, nums)
+        self.assertFalse(ok)
+        self.assertEqual("[500]: 'x' is of type <class 'str'>, expected float", str(msg))
+        ok, msg = contract.validate(float_arr, True, [ 1.0, None ])
+        self.assertEqual("[1]: Value cannot be null", str(msg))
+
+        status_arr = barrister.runtime.Type({ "type" : "Status", "is_array" : True })
+        self.assertEqual((True, None), contract.validate(status_arr, True, [ "ok", "error" ] * 100))
+        for bad in ([ "ok", "blah" ], [ "ok", { } ], [ "ok", None ]):
+            ok, msg = contract.validate(status_arr, True, bad)
+            self.assertFalse(ok)
+
+    def test_validation_error_path_and_preview(self):
+        svc = self.client.UserService
+        users = [ newUser(email="foo@example.com") for i in range(20) ]
+        users[12]["age"] = "x" * 100000
+        resp = { "status" : "ok", "message" : "good", "users" : users }
+        self.user_svc.getAll = lambda userIds: resp
+        self.server.add_handler("UserService", self.user_svc)
+        try:
+            svc.getAll([])
+            self.fail("Expected RpcException")
+        except barrister.RpcException as e:
+            self.assertEqual(barrister.runtime.ERR_INVALID_RESP, e.code)
+            self.assertEqual({ "path" : "result.users[12].age" }, e.data)
+            self.assertTrue(e.msg.startswith("Function 'UserService.getAll' invalid response. " +
+                                             "result.users[12].age: 'xxx"))
+            self.assertTrue(len(e.msg) < 300)
+
+        try:
+            svc.create({ "userId" : 1 })
+            self.fail("Expected RpcException")
+        except barrister.RpcException as e:
+            self.assertEqual(barrister.runtime.ERR_INVALID_PARAMS, e.code)
+            self.assertEqual({ "path" : "params[0].userId" }, e.data)
+
+    def test_validation_policy(self):
+        policy = barrister.ValidationPolicy(collect_stats=True)
+        policy.set("UserService", response=False)
+        policy.set("UserService.get", response=True)
+        self.assertEqual((True, False), policy.mode("UserService", "create"))
+        self.assertEqual((True, True), policy.mode("UserService", "get"))
+
+        self.user_svc.countUsers = lambda: { "status" : "bogus" }
+        self.user_svc.get = lambda userId: { "status" : "bogus" }
+        server = barrister.Server(self.server.contract, validation_policy=policy)
+        server.add_handler("UserService", self.user_svc)
+        client = barrister.Client(barrister.InProcTransport(server), validate_request=False,
+                                  validate_response=False)
+        self.assertEqual({ "status" : "bogus" }, client.UserService.countUsers())
+        self.assertRaises(barrister.RpcException, client.UserService.get, "1")
+        self.assertRaises(barrister.RpcException, client.UserService.get, 1)
+
+        stats = policy.get_stats("UserService.get")
+        self.assertEqual(2, stats.request_checked)
+        self.assertEqual(1, stats.request_failed)
+        self.assertEqual(1, stats.response_checked)
+        self.assertEqual(1, stats.response_failed)
+        self.assertTrue(stats.response_seconds > 0)
+        self.assertEqual(1, policy.get_stats("UserService.countUsers").response_skipped)
+
+        # stats are only collected when enabled
+        self.client.UserService.countUsers()
+        self.assertEqual(None, self.server.validation.get_stats("UserService.countUsers"))
+
+    def test_validation_policy_sampling(self):
+        policy = barrister.ValidationPolicy(request=0, response=50, collect_stats=True)
+        func = self.server.contract.interface("UserService").function("countUsers")
+        for i in range(200):
+            policy.validate_request(func, [ ])
+            policy.validate_response(func, { "status" : "ok", "message" : "hi", "count" : 1 })
+        stats = policy.get_stats("UserService.countUsers")
+        self.assertEqual(0, stats.request_checked)
+        self.assertEqual(200, stats.request_skipped)
+        self.assertEqual(200, stats.response_checked + stats.response_skipped)
+        self.assertTrue(0 < stats.response_checked < 200)
+
+        # the int 1 is the old True flag, while the float 1.0 is 1%
+        policy = barrister.ValidationPolicy(request=1, response=1.0, collect_stats=True)
+        for i in range(200):
+            policy.validate_request(func, [ ])
+            policy.validate_response(func, { "status" : "ok", "message" : "hi", "count" : 1 })
+        stats = policy.get_stats("UserService.countUsers")
+        self.assertEqual(200, stats.request_checked)
+        self.assertTrue(stats.response_skipped > 150)
+        server = barrister.Server(self.server.contract, validate_request=1)
+        server.add_handler("UserService", self.user_svc)
+        req = { "jsonrpc" : "2.0", "id" : 1, "method" : "UserService.get", "params" : [ 1 ] }
+        for i in range(20):
+            self.assertEqual(barrister.runtime.ERR_INVALID_PARAMS, server.call(req)["error"]["code"])
+
+    def test_streaming_decode(self):
+        server = barrister.Server(self.server.contract, streaming_decode=True)
+        server.add_handler("UserService", self.user_svc)
+        user = newUser(email="foo@bar.com")
+
+        req = '{"params": [%s], "id": "1", "method": "UserService.create"}' % json.dumps(user)
+        resp = json.loads(server.call_json(req))
+        self.assertEqual("user created", resp["result"]["message"])
+
+        req = '[{"jsonrpc": "2.0", "id": 1, "method": "UserService.countUsers", "params": []},' + \
+              ' {"jsonrpc": "2.0", "id": 2, "method": "UserService.get", "params": [1, 2]}]'
+        resp = json.loads(server.call_json(req))
+        self.assertEqual(1, resp[0]["result"]["count"])
+        self.assertEqual(barrister.runtime.ERR_INVALID_PARAMS, resp[1]["error"]["code"])
+
+        # rejected requests are skipped without being decoded, so an invalid
+        # JSON number in the skipped params does not produce a parse error
+        bad_params = '[{"big": [1, 2, 3, "]"]}, 01]'
+        for method, code in (("Nope.create", barrister.runtime.ERR_METHOD_NOT_FOUND),
+                             ("UserService.nope", barrister.runtime.ERR_METHOD_NOT_FOUND),
+                             ("UserService.create", barrister.runtime.ERR_INVALID_PARAMS)):
+            req = '{"method": "%s", "params": %s, "id": 5}' % (method, bad_params)
+            resp = json.loads(server.call_json(req))
+            self.assertEqual(5, resp["id"])
+            self.assertEqual(code, resp["error"]["code"])
+
+        # a second method member must not inherit the checked params of the first
+        req = '{"id": 6, "method": "UserService.get", "params": ["1"], "method": "UserService.create"}'
+        resp = json.loads(server.call_json(req))
+        self.assertEqual(6, resp["id"])
+        self.assertEqual(barrister.runtime.ERR_INVALID_REQ, resp["error"]["code"])
+
+        resp = json.loads(server.call_json('{"method": "UserService.get", "params": ['))
+        self.assertEqual(barrister.runtime.ERR_PARSE, resp["error"]["code"])
+
+    def test_struct_classes(self):
+        contract = self.server.contract
+        User = contract.struct_class("User")
+        UserResponse = contract.struct_class("UserResponse")
+        self.assertTrue(issubclass(User, barrister.StructObject))
+        self.assertEqual(set(["status", "message", "user"]), set(UserResponse.__slots__))
+
+        received = [ ]
+        def create(user):
+            received.append(user)
+            return { "status" : "ok", "message" : "created", "userId" : user.userId }
+        def get(userId):
+            return UserResponse(status="ok", message="hi", user=received[0])
+        self.user_svc.create = create
+        self.user_svc.get = get
+        server = barrister.Server(contract, struct_classes=True)
+        server.add_handler("UserService", self.user_svc)
+        client = barrister.Client(barrister.InProcTransport(server), struct_classes=True)
+
+        resp = client.UserService.create(newUser(userId="u1", email="foo@bar.com"))
+        self.assertEqual("u1", resp.userId)
+        self.assertTrue(isinstance(received[0], User))
+        self.assertEqual(3.3, received[0].age)
+
+        resp = client.UserService.get("u1")
+        self.assertEqual("foo@bar.com", resp.user.email)
+        self.assertEqual(json.loads(json.dumps(newUser(userId="u1", email="foo@bar.com"))),
+                         json.loads(json.dumps(resp.user, default=barrister.runtime.struct_to_dict)))
+
+        self.user_svc.get = lambda userId: UserResponse(status="ok", message="hi")
+        server.add_handler("UserService", self.user_svc)
+        self.assertRaises(barrister.RpcException, client.UserService.get, "u1")
+
+    def test_to_python(self):
+        ns = { }
+        source = barrister.to_python(parse(idl), "1.0")
+        exec(compile(source, "generated.py", "exec"), ns)
+        contract = ns["contract"]()
+        self.assertTrue(contract is ns["contract"]())
+        user_type = contract.struct("UserResponse").field("user")
+        self.assertTrue(contract.validator(user_type, False) is ns["VALIDATORS"][("User", False, False)])
+
+        server = ns["new_server"]({ "UserService" : self.user_svc })
+        stub = ns["UserServiceClient"](ns["new_client"](barrister.InProcTransport(server)))
+        self.assertEqual("ok", stub.create(newUser(email="foo@bar.com"))["status"])
+        self.assertEqual(1, stub.countUsers()["count"])
+        self.assertEqual([ ], stub.getAll([ "abc123" ])["users"])
+        self.assertRaises(barrister.RpcException, stub.create, newUser())
+        self.assertRaises(barrister.RpcException, stub.getAll, [ "abc123", 1 ])
+        try:
+            stub.create(newUser())
+            self.fail("expected RpcException")
+        except barrister.RpcException as e:
+            self.assertTrue(e.msg.endswith("params[0].email: Value cannot be null"))
+
+        # generated modules only depend on the public runtime API
+        imported = [ ]
+        for line in source.splitlines():
+            if line.startswith("from barrister"):
+                imported.extend([ name.strip() for name in line.split(" import ")[1].split(",") ])
+        self.assertTrue("ValidationError" in imported)
+        self.assertEqual([ ], [ name for name in imported if name.startswith("_") ])
+
+    def test_lazy_contract(self):
+        contract = barrister.Contract(parse(idl))
+        self.assertEqual({ }, contract.structs.built)
+        self.assertTrue("User" in contract.structs)
+        self.assertEqual(7, len(contract.interfaces["UserService"].functions))
+        self.assertEqual({ }, contract.structs.built)
+        func = contract.interface("UserService").function("getAll")
+        self.assertTrue(func.returns.validator)
+        self.assertEqual(set([ "UsersResponse", "Response", "User" ]), set(contract.structs.built.keys()))
+        self.assertRaises(KeyError, lambda: contract.structs["Nope"])
+
+        client = barrister.Client(barrister.InProcTransport(self.server))
+        self.assertFalse("UserService" in client.__dict__)
+        svc = client.UserService
+        self.assertTrue(svc is client.UserService)
+        self.assertTrue(svc.countUsers is svc.countUsers)
+        self.assertRaises(AttributeError, getattr, client, "Nope")
+        self.assertRaises(AttributeError, getattr, svc, "nope")
+
+        contract.compile()
+        self.assertEqual(len(contract.structs), len(contract.structs.built))
+
+    def test_contract_cache(self):
+        contract = self.server.contract
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for format in [ "pickle", "json" ]:
+                path = os.path.join(tmpdir, "contract." + format)
+                contract.save_cached(path, format)
+                loaded = barrister.Contract.load_cached(path, contract.checksum)
+                self.assertEqual(contract.idl_parsed, loaded.idl_parsed)
+                self.assertEqual(contract.checksum, loaded.checksum)
+                self.assertTrue(loaded.struct("User").all_fields)
+                self.assertRaises(ValueError, barrister.Contract.load_cached, path, "abc")
+            path = os.path.join(tmpdir, "bad")
+            f = open(path, "wb")
+            f.write(b"not a contract\n{}")
+            f.close()
+            self.assertRaises(ValueError, barrister.Contract.load_cached, path)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_batch_executor(self):
+        lock = threading.Lock()
+        running = [ 0, 0 ]
+        def get(userId):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            if userId == "boom":
+                raise ValueError("boom")
+            return { "status" : "ok", "message" : userId }
+        self.user_svc.get = get
+
+        class FailingFilter(barrister.Filter):
+            def pre(self, context):
+                if context.request["id"] == "f":
+                    raise ValueError("filter failed")
+
+        server = barrister.Server(self.server.contract, validate_response=False,
+                                  batch_executor=8, batch_concurrency=3)
+        server.add_handler("UserService", self.user_svc)
+        self.addCleanup(server.close)
+        server.set_filters(FailingFilter())
+        reqs = [ { "jsonrpc" : "2.0", "id" : str(i), "method" : "UserService.get", 
+                   "params" : [ str(i) ] } for i in range(6) ]
+        reqs.append({ "jsonrpc" : "2.0", "id" : "b", "method" : "UserService.get", "params" : [ "boom" ] })
+        reqs.append({ "jsonrpc" : "2.0", "id" : "f", "method" : "UserService.get", "params" : [ "x" ] })
+        resp = server.call(reqs)
+        self.assertEqual([ "0", "1", "2", "3", "4", "5", "b", "f" ], [ r["id"] for r in resp ])
+        self.assertEqual("4", resp[4]["result"]["message"])
+        self.assertEqual(barrister.runtime.ERR_UNKNOWN, resp[6]["error"]["code"])
+        self.assertEqual(barrister.runtime.ERR_UNKNOWN, resp[7]["error"]["code"])
+        self.assertEqual(3, running[1])
+
+    def test_cpu_bound(self):
+        server = barrister.Server(self.server.contract, cpu_workers=2)
+        server.add_handler("UserService", PidUserServiceImpl(), cpu_bound=[ "validateEmail" ])
+        self.assertTrue(isinstance(server.dispatch["UserService.validateEmail"][0], 
+                                   barrister.runtime.ProcessCall))
+        try:
+            server.start_cpu_workers()
+            client = barrister.Client(barrister.InProcTransport(server))
+            pid = client.UserService.validateEmail("1")["message"]
+            self.assertNotEqual(str(os.getpid()), pid)
+            self.assertEqual("ok", client.UserService.changePassword("1", "a", "b")["status"])
+            try:
+                client.UserService.validateEmail("bad")
+                self.fail("Expected RpcException")
+            except barrister.RpcException as e:
+                self.assertEqual(100, e.code)
+            self.assertRaises(barrister.RpcException, client.UserService.validateEmail, 1)
+        finally:
+            server.stop_cpu_workers()
+        self.assertRaises(barrister.RpcException, server.add_handler, "UserService", 
+                          self.user_svc, [ "nope" ])
+
+    def test_codecs(self):
+        codecs = [ barrister.JsonCodec(), barrister.runtime.fastest_codec() ]
+        try:
+            codecs.append(barrister.OrjsonCodec())
+        except ImportError:
+            pass
+        User = self.server.contract.struct_class("User")
+        for codec in codecs:
+            data = codec.dumps({ "a" : [ 1, "\u00e9" ], "u" : User(userId="x") })
+            self.assertTrue(isinstance(data, bytes))
+            self.assertEqual({ "a" : [ 1, "\u00e9" ], "u" : { "userId" : "x" } }, codec.loads(data))
+            self.assertEqual([ 1 ], codec.loads(bytearray(b"[1]")))
+            self.assertEqual([ 1 ], codec.loads("[1]"))
+
+            server = barrister.Server(self.server.contract, codec=codec)
+            server.add_handler("UserService", self.user_svc)
+            req = b'{"jsonrpc":"2.0","id":"1","method":"UserService.countUsers","params":[]}'
+            resp = server.call_bytes(req)
+            self.assertTrue(isinstance(resp, bytes))
+            self.assertEqual(0, codec.loads(resp)["result"]["count"])
+            self.assertEqual(barrister.runtime.ERR_PARSE, 
+                             json.loads(server.call_json(b"{ bad"))["error"]["code"])
+
+    def test_response_cache(self):
+        calls = [ ]
+        def countUsers():
+            calls.append(1)
+            return { "status" : "ok", "message" : "hi", "count" : len(calls) }
+        self.user_svc.countUsers = countUsers
+
+        idl_parsed = parse(idl.replace("countUsers() CountResponse", 
+                                       "countUsers() CountResponse [cache=60]"))
+        cache = barrister.ResponseCache(max_entries=2, functions={ "UserService.get" : 60 })
+        server = barrister.Server(barrister.Contract(idl_parsed), response_cache=cache)
+        server.add_handler("UserService", self.user_svc)
+        client = barrister.Client(barrister.InProcTransport(server))
+
+        self.assertEqual(1, client.UserService.countUsers()["count"])
+        self.assertEqual(1, client.UserService.countUsers()["count"])
+        self.assertEqual(1, len(calls))
+
+        self.user_svc.users["a"] = newUser("a", email="a@b.com")
+        self.user_svc.users["b"] = newUser("b", email="a@b.com")
+        client.UserService.get("a")
+        client.UserService.get("b")
+        self.assertEqual({ "hits" : 1, "misses" : 3, "evictions" : 1, "expirations" : 0, 
+                           "size" : 2 }, cache.stats())
+
+        client.UserService.changePassword("a", "b", "c")
+        self.assertEqual(2, cache.stats()["size"])
+
+        cache.set("UserService.countUsers", False)
+        self.assertEqual(2, client.UserService.countUsers()["count"])
+
+        cache.set("UserService.countUsers", 0.01)
+        client.UserService.countUsers()
+        time.sleep(0.02)
+        client.UserService.countUsers()
+        self.assertEqual(1, cache.stats()["expirations"])
+
+    def test_singleflight(self):
+        calls = [ ]
+        release = threading.Event()
+        def get(userId):
+            calls.append(userId)
+            release.wait(5)
+            if userId == "bad":
+                raise barrister.RpcException(100, "bad")
+            return { "status" : "ok", "message" : userId }
+        self.user_svc.get = get
+
+        # callers waiting on another call do not take a bulkhead slot
+        flight = barrister.Singleflight([ "UserService.get" ])
+        server = barrister.Server(self.server.contract, validate_response=False, 
+                                  singleflight=flight, batch_executor=8,
+                                  bulkheads=barrister.Bulkheads({ "UserService.get" : (2, 0) }))
+        server.add_handler("UserService", self.user_svc)
+        self.addCleanup(server.close)
+
+        def req(i, userId):
+            return { "jsonrpc" : "2.0", "id" : i, "method" : "UserService.get", "params" : [ userId ] }
+        batch = [ req(i, "a") for i in range(4) ] + [ req(i, "bad") for i in range(4, 6) ]
+        out = [ ]
+        t = threading.Thread(target=lambda: out.append(server.call(batch)))
+        t.start()
+        deadline = time.time() + 5
+        while flight.stats()["followers"] < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        t.join()
+
+        resp = out[0]
+        self.assertEqual([ "a" ] * 4, [ r["result"]["message"] for r in resp[:4] ])
+        self.assertEqual([ 100, 100 ], [ r["error"]["code"] for r in resp[4:] ])
+        self.assertEqual(sorted([ "a", "bad" ]), sorted(calls))
+        self.assertEqual({ "leaders" : 2, "followers" : 4 }, flight.stats())
+        self.assertEqual({ }, flight.flights)
+
+        # callers stop waiting when their deadline passes
+        release.clear()
+        t = threading.Thread(target=server.call, args=(req(6, "c"),))
+        t.start()
+        while flight.stats()["leaders"] < 3:
+            time.sleep(0.01)
+        start = time.monotonic()
+        resp = server.call(req(7, "c"), { "deadline" : barrister.deadline_after(0.05) })
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, resp["error"]["code"])
+        self.assertTrue(time.monotonic() - start < 1)
+        release.set()
+        t.join()
+        self.assertEqual({ "leaders" : 3, "followers" : 4 }, flight.stats())
+
+    def test_bulkheads(self):
+        release = threading.Event()
+        def get(userId):
+            release.wait(5)
+            return { "status" : "ok", "message" : userId }
+        self.user_svc.get = get
+
+        bulkheads = barrister.Bulkheads({ "UserService.get" : (2, 1) })
+        bulkheads.set("UserService", 10)
+        server = barrister.Server(self.server.contract, validate_response=False,
+                                  batch_executor=8, bulkheads=bulkheads)
+        server.add_handler("UserService", self.user_svc)
+        self.addCleanup(server.close)
+
+        def req(i, method="UserService.get", params=None):
+            if params is None:
+                params = [ str(i) ]
+            return { "jsonrpc" : "2.0", "id" : i, "method" : method, "params" : params }
+        out = [ ]
+        t = threading.Thread(target=lambda: out.append(server.call([ req(i) for i in range(5) ])))
+        t.start()
+        deadline = time.time() + 5
+        while bulkheads.stats()["UserService.get"]["rejected"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        # other functions of the interface are not held up
+        resp = server.call(req(9, "UserService.countUsers", [ ]))
+        self.assertEqual(0, resp["result"]["count"])
+        stats = bulkheads.stats()
+        self.assertEqual(2, stats["UserService.get"]["running"])
+        self.assertEqual(1, stats["UserService.get"]["queue_depth"])
+        self.assertEqual(2, stats["UserService"]["running"])
+        release.set()
+        t.join()
+
+        codes = [ r.get("error", { }).get("code") for r in out[0] ]
+        self.assertEqual(3, codes.count(None))
+        self.assertEqual(2, codes.count(barrister.runtime.ERR_OVERLOADED))
+        stats = bulkheads.stats()["UserService.get"]
+        self.assertEqual((0, 0, 3, 1, 2), (stats["running"], stats["queue_depth"], 
+                                           stats["admitted"], stats["queued"], 
+                                           stats["rejected"]))
+        self.assertEqual(0, bulkheads.stats()["UserService"]["running"])
+
+        # queued calls are rejected after queue_timeout
+        bulkheads.set("UserService.get", 0, max_queue=1, queue_timeout=0.01)
+        resp = server.call(req(1))
+        self.assertEqual(barrister.runtime.ERR_OVERLOADED, resp["error"]["code"])
+        self.assertEqual(1, bulkheads.stats()["UserService.get"]["timeouts"])
+
+        # queued calls give up at their deadline, even with no queue_timeout
+        bulkheads.set("UserService.get", 0, max_queue=1)
+        start = time.time()
+        resp = server.call(req(1), { "deadline" : barrister.deadline_after(0.05) })
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, resp["error"]["code"])
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(0, bulkheads.stats()["UserService.get"]["queue_depth"])
+
+    def test_deadlines(self):
+        remaining = [ ]
+        def countUsers():
+            remaining.append(barrister.current_context().remaining())
+            time.sleep(0.05)
+            return { "status" : "ok", "message" : "ok", "count" : 0 }
+        self.user_svc.countUsers = countUsers
+        self.server.add_handler("UserService", self.user_svc)
+
+        self.client.UserService.countUsers()
+        self.assertEqual([ None ], remaining)
+        client = barrister.Client(barrister.InProcTransport(self.server), timeout=5)
+        client.UserService.countUsers()
+        self.assertTrue(4 < remaining[1] <= 5)
+        self.assertEqual(None, barrister.current_context())
+
+        req = { "jsonrpc" : "2.0", "id" : 1, "method" : "UserService.countUsers", "params" : [ ] }
+        resp = self.server.call(req, { "deadline" : barrister.deadline_after(-1) })
+        self.assertEqual(barrister.runtime.ERR_DEADLINE_EXCEEDED, resp["error"]["code"])
+        self.assertEqual(2, len(remaining))
+
+        # batch entries that have not started when the deadline passes are dropped
+        batch = client.start_batch()
+        for i in range(3):
+            batch.UserService.countUsers()
+        results = batch.send(timeout=0.03)
+        self.assertEqual(0, results[0].result["count"])
+        self.assertEqual([ barrister.runtime.ERR_DEADLINE_EXCEEDED ] * 2,
+                         [ r.error.code for r in results[1:] ])
+        self.assertEqual(3, len(remaining))
+
+    def test_notifications(self):
+        def notification(method, params):
+            return { "jsonrpc" : "2.0", "method" : method, "params" : params }
+        self.assertEqual(None, self.server.call(notification("UserService.create", 
+                                                             [ newUser(email="a@b.com") ])))
+        self.assertEqual(1, len(self.user_svc.users))
+
+        # results are not validated and errors are not returned
+        self.user_svc.validateEmail = lambda userId: { "bogus" : True }
+        self.server.add_handler("UserService", self.user_svc)
+        self.assertEqual(None, self.server.call(notification("UserService.validateEmail", [ "1" ])))
+        self.assertEqual(None, self.server.call(notification("UserService.get", [ "missing" ])))
+        self.assertEqual(None, self.server.call(notification("UserService.nope", [ ])))
+        
+        batch = [ notification("UserService.countUsers", [ ]), 
+                  notification("UserService.get", [ 1 ]) ]
+        self.assertEqual(None, self.server.call(batch))
+        self.assertEqual(b"", self.server.call_bytes(json.dumps(batch)))
+        batch.append({ "jsonrpc" : "2.0", "id" : 3, "method" : "UserService.countUsers" })
+        resp = self.server.call(batch)
+        self.assertEqual([ 3 ], [ r["id"] for r in resp ])
+
+        with barrister.Server(self.server.contract, batch_executor=2) as server:
+            server.add_handler("UserService", self.user_svc)
+            executor = server.batch_executor
+            self.assertEqual(None, server.call(batch[:2]))
+            self.assertEqual(b"", server.call_bytes(json.dumps(batch[:2])))
+        # close() shuts down the executor the server created, and batches then run in order
+        self.assertRaises(RuntimeError, executor.submit, len, [ ])
+        self.assertEqual(None, server.batch_executor)
+        self.assertEqual([ 3 ], [ r["id"] for r in server.call(batch) ])
+
+        resp = self.server.call([ ])
+        self.assertEqual(barrister.runtime.ERR_INVALID_REQ, resp["error"]["code"])
+        resp = json.loads(self.server.call_json("[]"))
+        self.assertEqual(barrister.runtime.ERR_INVALID_REQ, resp["error"]["code"])
+
+        # a null id is not a notification
+        resp = self.server.call({ "jsonrpc" : "2.0", "id" : None, "method" : "UserService.countUsers" })
+        self.assertEqual(1, resp["result"]["count"])
+
+        self.assertEqual(None, self.client.notify("UserService", "create", [ newUser(email="b@b.com") ]))
+        self.assertEqual(2, len(self.user_svc.users))
+        batch = self.client.start_batch()
+        batch.notify("UserService", "create", [ newUser(email="c@b.com") ])
+        batch.UserService.countUsers()
+        results = batch.send()
+        self.assertEqual(1, len(results))
+        self.assertEqual(3, results[0].result["count"])
+        batch = self.client.start_batch()
+        batch.notify("UserService", "create", [ newUser(email="d@b.com") ])
+        self.assertEqual([ ], batch.send())
+        self.assertEqual(4, len(self.user_svc.users))
+
+    def test_call_stream(self):
+        def get(userId):
+            time.sleep(float(userId))
+            return { "status" : "ok", "message" : userId }
+        self.user_svc.get = get
+        server = barrister.Server(self.server.contract, validate_response=False, batch_executor=4)
+        server.add_handler("UserService", self.user_svc)
+        self.addCleanup(server.close)
+
+        def req(i, userId):
+            return { "jsonrpc" : "2.0", "id" : i, "method" : "UserService.get", "params" : [ userId ] }
+        batch = [ req(1, "0.2"), req(2, "0"), { "jsonrpc" : "2.0", "method" : "UserService.countUsers" },
+                  req(3, "0.1") ]
+        self.assertEqual([ 2, 3, 1 ], [ r["id"] for r in server.call_stream(batch) ])
+        self.assertEqual([ 1, 2, 3 ], [ r["id"] for r in server.call(batch) ])
+        self.assertEqual([ 2 ], [ r["id"] for r in server.call_stream(req(2, "0")) ])
+
+        lines = list(server.call_stream_bytes(json.dumps(batch[:2])))
+        self.assertEqual([ 2, 1 ], [ json.loads(line)["id"] for line in lines ])
+        self.assertTrue(all([ line.endswith(b"\n") for line in lines ]))
+        lines = list(server.call_stream_bytes("{ bad"))
+        self.assertEqual(barrister.runtime.ERR_PARSE, json.loads(lines[0])["error"]["code"])
+
+        client = barrister.Client(barrister.InProcTransport(server))
+        batch = client.start_batch()
+        batch.UserService.get("0.1")
+        batch.UserService.get("0")
+        batch.notify("UserService", "countUsers", [ ])
+        results = batch.send_stream()
+        self.assertRaises(Exception, batch.send_stream)
+        self.assertEqual([ "0", "0.1" ], [ r.result["message"] for r in results ])
+
+        # transports without request_stream return the whole batch
+        class PlainTransport(object):
+            def request(self, req):
+                return server.call(req)[1:]
+        client = barrister.Client(PlainTransport(), contract=server.contract)
+        batch = client.start_batch()
+        batch.UserService.get("0")
+        batch.UserService.get("0")
+        results = list(batch.send_stream())
+        self.assertEqual("0", results[0].result["message"])
+        self.assertEqual(barrister.runtime.ERR_INVALID_RESP, results[1].error.code)
+
+    def test_metrics(self):
+        metrics = barrister.Metrics(expose=True)
+        server = barrister.Server(self.server.contract, metrics=metrics, batch_executor=4)
+        server.add_handler("UserService", self.user_svc)
+        self.addCleanup(server.close)
+        self.user_svc.users["x"] = newUser(userId="x", email="a@b.com")
+
+        def req(method, params, reqid=1):
+            return { "jsonrpc" : "2.0", "id" : reqid, "method" : method, "params" : params }
+        body = json.dumps(req("UserService.countUsers", [ ])).encode("utf-8")
+        resp = server.call_bytes(body)
+        server.call_bytes(json.dumps(req("UserService.get", [ 1 ])))
+        server.call([ req("UserService.get", [ "x" ], i) for i in range(3) ])
+        server.call(req("UserService.nope", [ ]))
+        server.call_bytes(json.dumps(req("barrister-idl", [ ])))
+
+        snap = server.call(req("barrister-metrics", [ ]))["result"]
+        funcs = snap["functions"]
+        count = funcs["UserService.countUsers"]
+        self.assertEqual(1, count["calls"])
+        self.assertEqual({ }, count["errors"])
+        self.assertEqual(1, sum(count["latency"]))
+        self.assertEqual(len(snap["latency_buckets"]) + 1, len(count["latency"]))
+        self.assertEqual(len(body), count["request_bytes"])
+        self.assertEqual(len(resp), count["response_bytes"])
+        self.assertEqual(1, count["validation"]["request_checked"])
+
+        get = funcs["UserService.get"]
+        self.assertEqual(4, get["calls"])
+        self.assertEqual({ str(barrister.runtime.ERR_INVALID_PARAMS) : 1 }, get["errors"])
+        self.assertEqual(0, sum(get["latency"][-1:]))
+        self.assertEqual(1, funcs["(unknown)"]["calls"])
+        self.assertEqual(1, funcs["barrister-idl"]["calls"])
+        self.assertTrue(snap["request_bytes"] > len(body))
+
+        # results are combined across threads, and metrics are only served if exposed
+        self.assertEqual(4, server.metrics_snapshot()["functions"]["UserService.get"]["calls"])
+        self.assertTrue(len(metrics.shards) > 1)
+
+        # the counters of exited threads are folded together
+        for i in range(20):
+            t = threading.Thread(target=server.call, args=(req("UserService.countUsers", [ ]),))
+            t.start()
+            t.join()
+        server.call(req("UserService.countUsers", [ ]))
+        self.assertTrue(len(metrics.shards) <= 6)
+        self.assertEqual(22, server.metrics_snapshot()["functions"]["UserService.countUsers"]["calls"])
+        metrics.expose = False
+        resp = server.call(req("barrister-metrics", [ ]))
+        self.assertEqual(barrister.runtime.ERR_METHOD_NOT_FOUND, resp["error"]["code"])
+        self.assertEqual(None, self.server.metrics_snapshot())
+
+        server = barrister.Server(self.server.contract, metrics=barrister.Metrics(expose=True),
+                                  streaming_decode=True)
+        server.add_handler("UserService", self.user_svc)
+        server.call_bytes(body)
+        resp = json.loads(server.call_bytes(json.dumps(req("barrister-metrics", [ ]))))
+        self.assertEqual(1, resp["result"]["functions"]["UserService.countUsers"]["calls"])
+
+    def test_idl_checksum(self):
+        contract = self.server.contract
+        req = { "jsonrpc" : "2.0", "id" : 5, "method" : "barrister-idl" }
+        resp = json.loads(self.server.call_bytes(json.dumps(req)))
+        self.assertEqual({ "jsonrpc" : "2.0", "id" : 5, "result" : contract.idl_parsed }, resp)
+        self.assertTrue(self.server.idl_bytes() is self.server.idl_bytes())
+
+        req["params"] = [ contract.checksum ]
+        resp = json.loads(self.server.call_bytes(json.dumps(req)))
+        self.assertEqual({ "checksum" : contract.checksum, "unchanged" : True }, resp["result"])
+        self.assertEqual(resp, self.server.call(req))
+        req["params"] = [ "old" ]
+        self.assertEqual(contract.idl_parsed, self.server.call(req)["result"])
+
+        requests = [ ]
+        class RecordingTransport(barrister.InProcTransport):
+            def request(self, req):
+                requests.append(req)
+                return barrister.InProcTransport.request(self, req)
+        transport = RecordingTransport(self.server)
+        local = barrister.Contract(parse(idl))
+        client = barrister.Client(transport, contract=local, check_contract=True)
+        self.assertTrue(client.contract is local)
+        self.assertEqual([ local.checksum ], requests[0]["params"])
+
+        stale = barrister.Contract(parse(idl + "\nstruct Extra {\n  a int\n}\n"))
+        client = barrister.Client(transport, contract=stale, check_contract=True)
+        self.assertEqual(contract.idl_parsed, client.contract.idl_parsed)
+
     def test_batch(self):
         batch = self.client.start_batch()
         batch.UserService.create(newUser(userId="1", email="foo@bar.com"))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+    barrister
+    ~~~~~~~~~
+
+    A RPC toolkit for building lightweight reliable services.  Ideal for
+    both static and dynamic languages.
+
+    :copyright: (c) 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+
+import io
+import json
+import unittest
+import barrister
+import barrister.wsgi
+from barrister.parser import parse
+from barrister.test.runtime_test import idl, UserServiceImpl
+
+class ChunkedInput(object):
+
+    def __init__(self, data, chunk_size):
+        self.data = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def readinto(self, buf):
+        return self.data.readinto(buf[:self.chunk_size])
+
+class WsgiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = barrister.Server(barrister.Contract(parse(idl)))
+        self.server.add_handler("UserService", UserServiceImpl())
+        self.app = barrister.wsgi.make_app(self.server, max_body_size=1000, idl_max_age=60)
+
+    def request(self, method, body=b"", headers=None, stream=None):
+        environ = { "REQUEST_METHOD" : method, "CONTENT_LENGTH" : str(len(body)),
+                    "wsgi.input" : stream or io.BytesIO(body) }
+        if headers:
+            environ.update(headers)
+        started = [ ]
+        def start_response(status, headers):
+            started.append((status, dict(headers)))
+        body = b"".join(self.app(environ, start_response))
+        return started[0][0], started[0][1], body
+
+    def test_post(self):
+        req = json.dumps({ "jsonrpc" : "2.0", "id" : "1", "method" : "UserService.countUsers",
+                           "params" : [ ] }).encode("utf-8")
+        for stream in [ None, ChunkedInput(req, 7) ]:
+            status, headers, body = self.request("POST", req, stream=stream)
+            self.assertEqual("200 OK", status)
+            self.assertEqual("application/json", headers["Content-Type"])
+            self.assertEqual(str(len(body)), headers["Content-Length"])
+            self.assertEqual(0, json.loads(body.decode("utf-8"))["result"]["count"])
+
+        status, headers, body = self.request("POST", b"{ bad")
+        self.assertEqual(barrister.runtime.ERR_PARSE, json.loads(body.decode("utf-8"))["error"]["code"])
+        self.assertEqual("413 Request Entity Too Large", self.request("POST", b" " * 1001)[0])
+        self.assertEqual("400 Bad Request", 
+                         self.request("POST", b"{}", stream=io.BytesIO(b"{"))[0])
+        self.assertEqual("411 Length Required", 
+                         self.request("POST", headers={ "CONTENT_LENGTH" : "" })[0])
+        self.assertEqual("405 Method Not Allowed", self.request("PUT")[0])
+
+    def test_notification(self):
+        req = json.dumps({ "jsonrpc" : "2.0", "method" : "UserService.countUsers",
+                           "params" : [ ] }).encode("utf-8")
+        status, headers, body = self.request("POST", req)
+        self.assertEqual("204 No Content", status)
+        self.assertEqual(b"", body)
+
+    def test_stream(self):
+        reqs = [ { "jsonrpc" : "2.0", "id" : i, "method" : "UserService.countUsers", "params" : [ ] }
+                 for i in range(3) ]
+        status, headers, body = self.request("POST", json.dumps(reqs).encode("utf-8"),
+                                             { "HTTP_ACCEPT" : "application/x-ndjson" })
+        self.assertEqual("200 OK", status)
+        self.assertEqual("application/x-ndjson", headers["Content-Type"])
+        self.assertFalse("Content-Length" in headers)
+        lines = body.decode("utf-8").splitlines()
+        self.assertEqual([ 0, 1, 2 ], [ json.loads(line)["id"] for line in lines ])
+
+    def test_timeout_header(self):
+        req = json.dumps({ "jsonrpc" : "2.0", "id" : "1", "method" : "UserService.countUsers",
+                           "params" : [ ] }).encode("utf-8")
+        for timeout, code in [ ("-1", barrister.runtime.ERR_DEADLINE_EXCEEDED), 
+                               ("10", None), ("bogus", None) ]:
+            status, headers, body = self.request("POST", req, 
+                                                 { "HTTP_X_BARRISTER_TIMEOUT" : timeout })
+            self.assertEqual(code, json.loads(body.decode("utf-8")).get("error", { }).get("code"))
+
+    def test_get_idl(self):
+        status, headers, body = self.request("GET")
+        self.assertEqual("200 OK", status)
+        self.assertEqual(self.server.contract.idl_parsed, json.loads(body.decode("utf-8")))
+        self.assertEqual("public, max-age=60", headers["Cache-Control"])
+        etag = headers["ETag"]
+        self.assertEqual('"%s"' % self.server.contract.checksum, etag)
+
+        status, headers, body = self.request("GET", headers={ "HTTP_IF_NONE_MATCH" : etag })
+        self.assertEqual("304 Not Modified", status)
+        self.assertEqual(b"", body)
+
+if __name__ == "__main__":
+    unittest.main()
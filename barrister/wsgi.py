@@ -0,0 +1,119 @@
+"""
+    WSGI application for serving a Barrister Server without a web framework.
+
+    :copyright: 2012 by James Cooper.
+    :license: MIT, see LICENSE for more details.
+"""
+
+from barrister.runtime import TIMEOUT_HEADER, STREAM_CONTENT_TYPE, deadline_after
+
+_timeout_key = "HTTP_" + TIMEOUT_HEADER.upper().replace("-", "_")
+
+_status_text = {
+    200 : "200 OK",
+    204 : "204 No Content",
+    304 : "304 Not Modified",
+    400 : "400 Bad Request",
+    405 : "405 Method Not Allowed",
+    411 : "411 Length Required",
+    413 : "413 Request Entity Too Large"
+}
+
+def make_app(server, max_body_size=10*1024*1024, idl_max_age=0):
+    """
+    Returns a WSGI application that serves the given Server.
+
+    * POST requests are JSON-RPC requests.  The body is read into a buffer sized from
+      the Content-Length header and decoded from bytes, and the response is encoded
+      once with an exact Content-Length.  The WSGI environ is passed to filters as the
+      `environ` property on the RequestContext, and the X-Barrister-Timeout header sets
+      the request's deadline.  Requests that only contain notifications get an empty
+      204 response.
+    * If a POST request's Accept header contains application/x-ndjson, the responses
+      to a batch are returned as newline delimited JSON in the order they complete,
+      without a Content-Length.  See Server.call_stream()
+    * GET requests return the IDL JSON (the same as the `barrister-idl` method) with an
+      ETag based on the IDL checksum, and return 304 if the client already has it.
+
+    :Parameters:
+      server
+        Server to dispatch requests to
+      max_body_size
+        Maximum request body size in bytes.  Larger requests are rejected with a 413
+        response.  None for no limit.
+      idl_max_age
+        Seconds that clients and proxies may cache the IDL for without revalidating
+    """
+    idl_headers = [ ("Content-Type", "application/json"),
+                    ("Cache-Control", "public, max-age=%d" % idl_max_age) ]
+    etag = None
+    if server.contract.checksum:
+        etag = '"%s"' % server.contract.checksum
+        idl_headers.append(("ETag", etag))
+
+    def app(environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        if method == "POST":
+            try:
+                length = int(environ.get("CONTENT_LENGTH") or "")
+            except ValueError:
+                return _respond(start_response, 411, b"Content-Length required")
+            if length < 0:
+                return _respond(start_response, 400, b"Invalid Content-Length")
+            if max_body_size is not None and length > max_body_size:
+                return _respond(start_response, 413, b"Request body too large")
+            body = _read_body(environ["wsgi.input"], length)
+            if body is None:
+                return _respond(start_response, 400, b"Incomplete request body")
+            props = { "environ" : environ }
+            if _timeout_key in environ:
+                props["deadline"] = deadline_after(environ[_timeout_key])
+            if STREAM_CONTENT_TYPE in environ.get("HTTP_ACCEPT", ""):
+                start_response(_status_text[200], [ ("Content-Type", STREAM_CONTENT_TYPE) ])
+                return server.call_stream_bytes(body, props)
+            resp = server.call_bytes(body, props)
+            if not resp:
+                # the request only contained notifications
+                start_response(_status_text[204], [ ])
+                return [ ]
+            return _respond(start_response, 200, resp, "application/json")
+        elif method == "GET" or method == "HEAD":
+            if etag and etag in environ.get("HTTP_IF_NONE_MATCH", ""):
+                start_response(_status_text[304], idl_headers[1:])
+                return [ ]
+            idl_body = server.idl_bytes()
+            start_response(_status_text[200],
+                           idl_headers + [ ("Content-Length", str(len(idl_body))) ])
+            if method == "HEAD":
+                return [ ]
+            return [ idl_body ]
+        else:
+            start_response(_status_text[405], [ ("Allow", "GET, HEAD, POST"),
+                                                ("Content-Length", "0") ])
+            return [ ]
+    return app
+
+def _read_body(stream, length):
+    """
+    Reads exactly length bytes from stream into a single buffer.  Returns None if the
+    stream ends first.
+    """
+    if not hasattr(stream, "readinto"):
+        data = stream.read(length)
+        if len(data) != length:
+            return None
+        return data
+    buf = bytearray(length)
+    view = memoryview(buf)
+    pos = 0
+    while pos < length:
+        n = stream.readinto(view[pos:])
+        if not n:
+            return None
+        pos += n
+    return buf
+
+def _respond(start_response, status, body, content_type="text/plain"):
+    start_response(_status_text[status], [ ("Content-Type", content_type),
+                                           ("Content-Length", str(len(body))) ])
+    return [ body ]
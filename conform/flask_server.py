@@ -67,7 +67,7 @@ server.add_handler("B", B())
 
 @app.route("/", methods=["POST"])
 def rpc():
-    resp_json = server.call_json(request.data)
+    resp_json = server.call_bytes(request.data)
     resp = make_response(resp_json)
     resp.headers['Content-Type'] = 'application/json'
     return resp
@@ -13,6 +13,12 @@ class UserService(object):
                  "kindleEmail" : "", "nookEmail" : "", "emailOptIn" : False }
         return { "status" : "success", "message" : "here's your user", "user" : user}
 
+    def createIfNew(self, userId, name):
+        raise runtime.RpcException(1, "Not implemented")
+
+    def update(self, user):
+        raise runtime.RpcException(1, "Not implemented")
+
 logging.basicConfig(level=logging.WARN)
 app = Flask(__name__)
 